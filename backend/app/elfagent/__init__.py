@@ -1,3 +1,15 @@
-from .agent import root_agent
+from .agent import build_agents
+from .fastpath import extract_fast_query
+from .batch import batch_jobs, run_batch
+from .handoff import ProductHandoffPlugin, handoff_stats
+from .gifts import Gift, extract_gifts, gift_stats
 
-__all__ = ["root_agent"]
+__all__ = ["root_agent", "fast_agent", "build_agents", "extract_fast_query", "batch_jobs", "run_batch",
+           "ProductHandoffPlugin", "handoff_stats", "Gift", "extract_gifts", "gift_stats"]
+
+
+def __getattr__(name: str):
+    # The agent graphs are built on first access, see build_agents
+    if name in ("root_agent", "fast_agent"):
+        return build_agents()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,51 +1,99 @@
+import functools
+
+from typing import Any
 from google.adk.agents import Agent, SequentialAgent, ParallelAgent
 from google.adk.tools import AgentTool, google_search
 from google.adk.tools.function_tool import FunctionTool
 from app.tools import get_amazon_deals_by_product, \
-      get_alibaba_deals_by_product, ask_confirmation
-from app.utils import google_model, llm_model
+      get_alibaba_deals_by_product, ask_confirmation, MARKETPLACES, MarketplaceAdapter, \
+      marketplace_tools, search_marketplaces, search_deal_index
+from app.utils import model_for
+from app.utils.const import FAST_PATH_LLM_RANKING, DIRECTOR_MODE, PRODUCT_ID_HANDOFF
+from .aggregator import ProductAggregatorAgent
+from .fastpath import FastPathAgent
+from .handoff import hand_over_tool_result, shortlist_products
+from .speculative import SpeculativeDirectorAgent
+
+# With the product id handoff the marketplace agents end on their tool result
+# and the ranking agents answer with product ids, expanded by the server
+handoff_instruction = "Answer only with the number of deals found."
+ids_format = """{ "gifts": ["<id>", "<id>"] } using the id of each selected deal"""
 
-def build_amazon_agent():
+def build_amazon_agent(compact: bool = PRODUCT_ID_HANDOFF):
+    collect = handoff_instruction if compact else \
+        "Collect the best ten deals and provide back the list of products with product_title, product_price," \
+        "product_original_price, product_star_rating, product_url, prdouct_photo."
     amazon = Agent(name="amazon_agent",
-                   model=google_model,
+                   model=model_for("extraction"),
                    tools=[get_amazon_deals_by_product],
                    description="Agent looks for the best Christmas gift deals over Amazon marketplace",
                    instruction="You are getting the name of product to look for into Amazon as a Christmas gift." \
-                   "Collect the best ten deals and provide back the list of products with product_title, product_price," \
-                   "product_original_price, product_star_rating, product_url, prdouct_photo." \
+                   f"{collect}" \
                    "Use the tool get_amazon_deals_by_product for performing the search and" \
-                   "if you recieve max_price or sort_by use them to in the request.",
+                   "if you recieve max_price or sort_by use them to in the request." \
+                   "If the tool answers with error rate_limited or circuit_open, do not call it again and report no deals.",
+                   after_tool_callback=hand_over_tool_result if compact else None,
                    output_key="amazon")
     return amazon
 
-def build_alibaba_agent():
+def build_alibaba_agent(compact: bool = PRODUCT_ID_HANDOFF):
+    collect = handoff_instruction if compact else \
+        "Collect the best ten deals and provide back the list of products available" \
+        "into field resultList. For each product collect title, itemUrl, image. " \
+        "The price is inside sku.def together with promotionPrice."  \
+        "All information about product must be provided back as " \
+        "product_original_price, product_star_rating, product_url, prdouct_photo."
     alibaba = Agent(name="AlibabaAgent",
-                   model=google_model,
+                   model=model_for("extraction"),
                    tools=[get_alibaba_deals_by_product],
                    description="Agent looks for the best Christmas gift deals over Alibaba marketplace",
                    instruction="You are getting the name of product to look for into Alibaba as a Christmas gift." \
-                   "Collect the best ten deals and provide back the list of products available" \
-                   "into field resultList. For each product collect title, itemUrl, image. " \
-                   "The price is inside sku.def together with promotionPrice."  \
-                   "All information about product must be provided back as " \
-                   "product_original_price, product_star_rating, product_url, prdouct_photo." \
+                   f"{collect}" \
                    "Use the tool get_alibaba_deals_by_product for performing the search and" \
-                   "if you recieve max_price use it in the request.",
+                   "if you recieve max_price use it in the request." \
+                   "If the tool answers with error rate_limited or circuit_open, do not call it again and report no deals.",
+                   after_tool_callback=hand_over_tool_result if compact else None,
                    output_key="alibaba")
     return alibaba
 
-def build_root_agent(agents: dict[str, Agent], output_key: str):
-    workflow = SequentialAgent(
-       name="DirectorAgent",
-       sub_agents=agents.values(),
-       description="Coordinates the worflow among specialized agents to find the best Christmas gift deals"
-    )
-    output_field="{"+output_key+"}"
-    json_format="""{ gifts: [ { name: sample1, description: sample_description, original_price: 10, current_price: 5, 
+def build_adapter_agent(adapter: MarketplaceAdapter, compact: bool = PRODUCT_ID_HANDOFF):
+    tool = adapter.tool
+    return Agent(name=f"{adapter.name}Agent",
+                 model=model_for("extraction"),
+                 tools=[tool],
+                 description=f"Agent looks for the best Christmas gift deals over {adapter.name} marketplace",
+                 instruction=f"You are getting the name of product to look for into {adapter.name} as a Christmas gift." \
+                 f"Use the tool {tool.__name__} for performing the search and if you recieve max_price use it " \
+                 "in the request. " \
+                 f"{handoff_instruction if compact else 'Collect the best ten deals and provide back the list of products.'}" \
+                 "If the tool answers with error rate_limited or circuit_open, do not call it again and report no deals.",
+                 after_tool_callback=hand_over_tool_result if compact else None,
+                 output_key=adapter.key)
+
+json_format="""{ gifts: [ { name: sample1, description: sample_description, original_price: 10, current_price: 5, 
       marketplace: Amazon, rating: 5, order_url:https://amazon.com/sample, image_url:https://amazon.com/sample.png}]}"""
+
+def build_root_agent(agents: dict[str, Agent], output_key: str, mode: str = DIRECTOR_MODE,
+                     compact: bool = PRODUCT_ID_HANDOFF):
+    if mode == "speculative":
+        # Searches the product named by the user while the research runs
+        workflow = SpeculativeDirectorAgent(
+           name="DirectorAgent",
+           sub_agents=list(agents.values()),
+           description="Coordinates the worflow among specialized agents to find the best Christmas gift deals",
+           output_key=output_key,
+           compact=compact
+        )
+    else:
+        workflow = SequentialAgent(
+           name="DirectorAgent",
+           sub_agents=agents.values(),
+           description="Coordinates the worflow among specialized agents to find the best Christmas gift deals"
+        )
+    output_field="{"+output_key+"}"
     elf_agent = Agent(
         name="ElfAgent",
-        model=llm_model,
+        model=model_for("reasoning"),
         tools=[AgentTool(workflow)],
         description="""ElfAgent is an expert Christmas gift advisor that finds the best deals on the web for 
          Christmas gifts, whether for a specific product or a category of products""",
@@ -56,11 +104,20 @@ def build_root_agent(agents: dict[str, Agent], output_key: str):
             The list of best deals will be available in {output_key}. 
             Select only the top 10 deals based on the user needs and sort them by the best
             relationship between quality and price, keeping in mind they are intended as Christmas gifts.
-            Provide the results as json document such as: {json_format} """
+            Provide the results as json document such as: {ids_format if compact else json_format} """
     )
     return elf_agent
 
-def build_markeplace_agent(agents: list[Agent], input_key: str):
+def build_aggregator_agent(compact: bool = PRODUCT_ID_HANDOFF):
+    aggregator = ProductAggregatorAgent(
+        name="ProductAggregatorAgent",
+        description="Merges, deduplicates and ranks by discount the marketplace deals",
+        tool_sources={tool.__name__: name for name, tool in marketplace_tools().items()},
+        output_key="products",
+        compact=compact)
+    return aggregator
+
+def build_markeplace_agent(agents: list[Agent], input_key: str, compact: bool = PRODUCT_ID_HANDOFF):
     input_field ="{"+input_key+"}"
     marketplaceSearchTeam = ParallelAgent(
         name="MarketplaceSearchTeam",
@@ -68,29 +125,7 @@ def build_markeplace_agent(agents: list[Agent], input_key: str):
           different online marketplaces""",
         sub_agents=agents
     )
-    aggregator_agent = Agent(
-        name="ProductAggregatorAgent",
-        model=llm_model,
-        instruction="""Collect the list of Christmas gift products from the different marketplaces agents
-        and combine them into a single list removing duplicates, sort them by the best 
-        discount available and gift suitability. Each deal must contain product_title, product_description, product_original_price,
-           product_price, product_star_rating, product_url, product_image, marketplace_source
-        Provide back the final list of products as json file:
-        {
-          "products": [
-            {
-              "product_title": "...",
-              "product_description": "...",
-              "product_original_price": "...",
-              "product_price": "...",
-              "product_star_rating": "...",
-              "product_url": "...",
-              "product_image": "...",
-              "marketplace_source": "Amazon | Alibaba"
-            }
-          ]
-        }"""
-    )
+    aggregator_agent = build_aggregator_agent(compact)
     maketplaceCoordinator = SequentialAgent(
         name="MarketplaceCoordinator",
         sub_agents=[marketplaceSearchTeam, aggregator_agent],
@@ -99,29 +134,59 @@ def build_markeplace_agent(agents: list[Agent], input_key: str):
 
     marketplaceAgent = Agent(
         name="MarketplaceAgent",
-        model=llm_model,
-        tools=[AgentTool(maketplaceCoordinator)],
+        model=model_for("reasoning"),
+        tools=[AgentTool(maketplaceCoordinator), search_marketplaces, search_deal_index],
         description="Agent that looks for the best Christmas gift deals for a specific product or a category of products",
         instruction=f"""You are an expert in finding the best Christmas gift deals online for a specific product or a 
           category of products. Collect the list of products available in the field query of {input_field}.
+          Popular gift categories are kept in a local index: first look each product_name up with
+          search_deal_index and only search the marketplaces for the products it has no deals for.
           According to the amount of products, use the MarketplaceSearchTeam to find the best gift deals over
           multiple maketplaces in two different ways:
             1. If there is only a single product, use the product_name to find the best deals available 
             for that product as a Christmas gift.
-            2. If there are multiple products, use a list of product_name to find the
-            find only the best products suitable as Christmas gifts.
-        Provide back to the user only the top 20 deals based on the best relationship between quality and discount""",
+            2. If there are multiple products, call search_marketplaces once with the whole list of
+            product_name, instead of searching them one by one, and keep only the best products
+            suitable as Christmas gifts.
+        Provide back to the user only the top 20 deals based on the best relationship between quality and discount""" +
+        ("""
+        Answer only with their ids as json document such as: { "ids": ["<id>", "<id>"] }""" if compact else ""),
+        after_agent_callback=shortlist_products if compact else None,
         output_key="deals"
     )
     return marketplaceAgent
 
 
+def build_fast_agent(rank_with_llm: bool = FAST_PATH_LLM_RANKING, compact: bool = PRODUCT_ID_HANDOFF):
+    sub_agents = []
+    if rank_with_llm:
+        sub_agents.append(Agent(
+            name="FastRankerAgent",
+            model=model_for("reasoning"),
+            include_contents="none",
+            description="Ranks and summarizes the aggregated deals of a direct product query",
+            instruction=f"""You are a helpful Christmas Elf expert in finding the best gift deals online.
+            The user asked: {{fast_query}}
+            These deals were found on the marketplaces: {{{"shortlist" if compact else "products"}}}
+            Select only the top 10 deals based on the user needs and sort them by the best
+            relationship between quality and price, keeping in mind they are intended as Christmas gifts.
+            Provide the results as json document such as: {ids_format if compact else json_format} """))
+    fast_agent = FastPathAgent(
+        name="FastPathAgent",
+        description="Searches the marketplaces directly for a product name and price cap",
+        marketplace_tools=marketplace_tools(),
+        sub_agents=sub_agents,
+        output_key="products",
+        compact=compact)
+    return fast_agent
+
+
 def build_verification_agent(input_key):
    input_field ="{"+input_key+"}"
    print(f"VerifierAgent Input in {input_field}")
    verifier_agent = Agent(
       name="VerificationAgent",
-      model=llm_model,
+      model=model_for("reasoning"),
       instruction=f"""Collect the products in {input_field} and use the ask_confirmation tool to show them
       to the user and ask for his approval. Provide back the products if the user approved otherwise
       stop the conversation.""",
@@ -132,7 +197,7 @@ def build_verification_agent(input_key):
 
 def google_agent():
     google = Agent(name="ProductSearchAgent",
-                   model=google_model,
+                   model=model_for("search"),
                    tools=[google_search],
                    description="An agent that collects information about Christmas gift ideas for a specific product"
                    "or a category of products.",
@@ -157,12 +222,31 @@ def google_agent():
                    output_key="google_results")
     return google
 
-search_agent = google_agent()
-amazon_agent = build_amazon_agent()
-alibaba_agent = build_alibaba_agent()
-#verifier_agent = build_verification_agent(search_agent.output_key)
-ecommerce_agents = [amazon_agent, alibaba_agent]
-marketplace_agent = build_markeplace_agent(ecommerce_agents, search_agent.output_key)
-agents = [search_agent, marketplace_agent]
-root_agent = build_root_agent(agents={agent.name: agent for agent in agents}, output_key=marketplace_agent.output_key)
-#root_agent = search_agent
+AGENT_NAMES = ("search_agent", "amazon_agent", "alibaba_agent", "ecommerce_agents", "marketplace_agent",
+               "agents", "root_agent", "fast_agent")
+
+
+@functools.cache
+def build_agents() -> dict[str, Any]:
+    """Build the agent graphs once, on first use rather than at import time."""
+    search_agent = google_agent()
+    amazon_agent = build_amazon_agent()
+    alibaba_agent = build_alibaba_agent()
+    #verifier_agent = build_verification_agent(search_agent.output_key)
+    # Marketplaces registered without a dedicated agent get the generic one
+    ecommerce_agents = [amazon_agent, alibaba_agent] + \
+        [build_adapter_agent(adapter) for name, adapter in MARKETPLACES.items() if name not in ("Amazon", "Alibaba")]
+    marketplace_agent = build_markeplace_agent(ecommerce_agents, search_agent.output_key)
+    agents = [search_agent, marketplace_agent]
+    root_agent = build_root_agent(agents={agent.name: agent for agent in agents},
+                                  output_key=marketplace_agent.output_key)
+    #root_agent = search_agent
+    fast_agent = build_fast_agent()
+    return {name: value for name, value in locals().items() if name in AGENT_NAMES}
+
+
+def __getattr__(name: str):
+    # root_agent and friends stay importable from this module, built on first access
+    if name in AGENT_NAMES:
+        return build_agents()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
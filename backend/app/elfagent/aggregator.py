@@ -0,0 +1,56 @@
+import json
+import logging
+
+from typing import AsyncGenerator
+from typing_extensions import override
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from app.tools.aggregation import aggregate_products
+from app.tools.catalog import store_products
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class ProductAggregatorAgent(BaseAgent):
+    """Merges the marketplace tool results of the current invocation without any LLM call.
+
+    The raw payloads are read from the function responses recorded in the session,
+    normalized, deduplicated and ranked by discount, then returned in the products
+    JSON shape and stored under output_key. With compact, the records are also
+    stored one per product id and the agents only get the compact views.
+    """
+
+    tool_sources: dict[str, str]
+    output_key: str = "products"
+    limit: int = 20
+    compact: bool = False
+
+    @override
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        payloads = []
+        for event in ctx.session.events:
+            if event.invocation_id != ctx.invocation_id:
+                continue
+            for function_response in event.get_function_responses():
+                marketplace = self.tool_sources.get(function_response.name)
+                if marketplace:
+                    payloads.append((marketplace, function_response.response))
+        result = aggregate_products(payloads, limit=self.limit,
+                                    marketplaces=list(dict.fromkeys(self.tool_sources.values())))
+        logger.info(f"{self.name} > aggregated {len(result['products'])} products "
+                    f"from {len(payloads)} marketplace responses")
+        state_delta = {self.output_key: result}
+        answer = result
+        if self.compact:
+            answer = {**result, "products": store_products(state_delta, result["products"])}
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text=json.dumps(answer))]),
+            actions=EventActions(state_delta=state_delta),
+        )
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from typing import Any, AsyncIterator, Awaitable, Callable, NamedTuple, Optional
+
+from app.tools import MARKETPLACES
+from app.tools.cache import build_cache_backend
+from app.utils.admission import AdmissionRejected
+from app.utils.const import BATCH_CONCURRENCY, BATCH_JOB_TTL, BATCH_SQLITE_PATH, BATCH_STORE_MAX_BYTES
+from .fastpath import extract_fast_query
+
+logger = logging.getLogger("uvicorn.error")
+
+# Seconds between two snapshots of a running job in the job store
+SNAPSHOT_INTERVAL = 1.0
+
+
+class Lookup(NamedTuple):
+    product: str
+    max_price: Optional[float]
+
+
+def plan_lookups(queries: list[str]) -> dict[Lookup, list[int]]:
+    """Product lookups of the direct product queries of a batch, with the items needing each.
+
+    Queries naming the same product with the same price cap, whatever their
+    wording ("cheap LEGO Technic under 50€", "lego technic below 50"), share
+    one lookup.
+    """
+    plan: dict[Lookup, list[int]] = {}
+    for index, query in enumerate(queries):
+        fast_query = extract_fast_query(query)
+        if fast_query:
+            lookup = Lookup(" ".join(fast_query.product.lower().split()), fast_query.max_price)
+            plan.setdefault(lookup, []).append(index)
+    return plan
+
+
+async def prefetch_lookups(lookups: list[Lookup], concurrency: int = BATCH_CONCURRENCY) -> int:
+    """Search every lookup once on every marketplace, so the items find the deals cache warm."""
+    semaphore = asyncio.Semaphore(concurrency)
+    searches = [(adapter, lookup) for lookup in lookups for adapter in MARKETPLACES.values()]
+
+    async def search(adapter, lookup: Lookup):
+        async with semaphore:
+            await adapter.search(lookup.product, lookup.max_price)
+
+    results = await asyncio.gather(*(search(adapter, lookup) for adapter, lookup in searches),
+                                   return_exceptions=True)
+    for (adapter, lookup), result in zip(searches, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Batch prefetch > {adapter.name} search for {lookup.product!r} failed: {result}")
+    return len(searches)
+
+
+class BatchJob:
+    """Progress and per-item results of one batch, streamed as the items complete."""
+
+    def __init__(self, total: int, user_id: str, mode: str):
+        self.id = uuid.uuid4().hex
+        self.total = total
+        self.user_id = user_id
+        self.mode = mode
+        self.status = "running"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.completed = 0
+        self.failed = 0
+        self.lookups = {"direct_items": 0, "unique": 0, "searches": 0}
+        self.results: dict[int, dict] = {}
+        self.task: Optional[asyncio.Task] = None
+        self._updates: asyncio.Queue = asyncio.Queue()
+
+    def record(self, index: int, result: dict):
+        self.results[index] = result
+        if result["status"] == "completed":
+            self.completed += 1
+        else:
+            self.failed += 1
+        self._updates.put_nowait(result)
+
+    def finish(self, status: str = "completed"):
+        self.status = status
+        self.finished_at = time.time()
+        self._updates.put_nowait(None)
+
+    async def updates(self) -> AsyncIterator[dict]:
+        """Item results as they complete, until the job finishes. Only one consumer."""
+        while True:
+            result = await self._updates.get()
+            if result is None:
+                return
+            yield result
+
+    def snapshot(self, include_results: bool = True) -> dict:
+        snapshot = {
+            "job_id": self.id,
+            "status": self.status,
+            "mode": self.mode,
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "pending": self.total - self.completed - self.failed,
+            "lookups": self.lookups,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        if include_results:
+            snapshot["results"] = [self.results[index] for index in sorted(self.results)]
+        return snapshot
+
+
+class BatchJobs:
+    """Running jobs of this worker, with their snapshots in a store every worker can read.
+
+    With the sqlite backend a job can be polled through any worker while it
+    runs and for ttl seconds after it finished.
+    """
+
+    def __init__(self, store=None, ttl: int = BATCH_JOB_TTL):
+        self.store = store if store is not None else build_cache_backend(path=BATCH_SQLITE_PATH,
+                                                                         max_bytes=BATCH_STORE_MAX_BYTES)
+        self.ttl = ttl
+        self._running: dict[str, BatchJob] = {}
+        self._saved: dict[str, float] = {}
+
+    def create(self, total: int, user_id: str, mode: str) -> BatchJob:
+        job = BatchJob(total, user_id, mode)
+        self._running[job.id] = job
+        return job
+
+    async def save(self, job: BatchJob, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._saved.get(job.id, 0.0) < SNAPSHOT_INTERVAL:
+            return
+        self._saved[job.id] = now
+        await self.store.set(f"batch|{job.id}", json.dumps(job.snapshot()).encode(), self.ttl)
+
+    async def get(self, job_id: str, include_results: bool = True) -> Optional[dict]:
+        job = self._running.get(job_id)
+        if job is not None:
+            return job.snapshot(include_results)
+        stored = await self.store.get(f"batch|{job_id}")
+        if stored is None:
+            return None
+        snapshot = json.loads(stored)
+        if not include_results:
+            snapshot.pop("results", None)
+        return snapshot
+
+    def release(self, job: BatchJob):
+        self._running.pop(job.id, None)
+        self._saved.pop(job.id, None)
+
+    def cancel(self):
+        for job in self._running.values():
+            if job.task is not None:
+                job.task.cancel()
+
+    def stats(self) -> dict:
+        return {"running": len(self._running), **self.store.stats()}
+
+
+batch_jobs = BatchJobs()
+
+
+async def run_batch(job: BatchJob,
+                    queries: list[str],
+                    answer: Callable[[int, str], Awaitable[dict[str, Any]]],
+                    concurrency: int = BATCH_CONCURRENCY,
+                    jobs: BatchJobs = batch_jobs):
+    """Answer every query of the batch with answer(index, query), concurrency at a time.
+
+    The product lookups shared by several items are searched once, ahead of
+    and alongside the items, while the items themselves go through answer.
+    """
+    plan = plan_lookups(queries)
+    job.lookups = {"direct_items": sum(len(items) for items in plan.values()),
+                   "unique": len(plan),
+                   "searches": len(plan) * len(MARKETPLACES)}
+    prefetch = asyncio.create_task(prefetch_lookups(list(plan), concurrency)) if plan else None
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int, query: str):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = {"index": index, "query": query, "status": "completed", **await answer(index, query)}
+            except AdmissionRejected as e:
+                result = {"index": index, "query": query, "status": "failed",
+                          "error": f"Server busy: {e.reason}", "retry_after": e.retry_after}
+            except Exception as e:
+                result = {"index": index, "query": query, "status": "failed", "error": str(e)}
+            result["duration_s"] = round(time.perf_counter() - started, 3)
+        job.record(index, result)
+        await jobs.save(job)
+
+    try:
+        await asyncio.gather(*(one(index, query) for index, query in enumerate(queries)))
+        if prefetch:
+            await prefetch
+        job.finish()
+        logger.info(f"📦 Batch {job.id}: {job.completed}/{job.total} answered, {job.failed} failed, "
+                    f"{job.lookups['unique']} unique lookups for {job.lookups['direct_items']} direct items")
+    except asyncio.CancelledError:
+        if prefetch:
+            prefetch.cancel()
+        job.finish("cancelled")
+        raise
+    finally:
+        await jobs.save(job, force=True)
+        jobs.release(job)
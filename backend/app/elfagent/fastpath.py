@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+import re
+import time
+
+from typing import Any, AsyncGenerator, Awaitable, Callable, NamedTuple, Optional
+from typing_extensions import override
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from app.tools.aggregation import aggregate_products
+from app.tools.catalog import store_products
+from app.utils.metrics import TOOL_DURATION, current_timings
+
+logger = logging.getLogger("uvicorn.error")
+
+# Longest product name still considered a direct product query
+FAST_PATH_MAX_WORDS = 6
+
+_PRICE_CAP = re.compile(
+    r"(?:under|below|less\s+than|max(?:imum)?|up\s+to|within|budget(?:\s+of)?|sotto|entro|massimo|<=?|≤)"
+    r"\s*(?:€|eur\b|euro\b|\$|usd\b)?\s*(\d+(?:[.,]\d{1,2})?)\s*(?:€|eur(?:o|os)?\b|\$|usd\b|dollars?\b)?",
+    re.IGNORECASE)
+_LEADING_FILLER = re.compile(
+    r"^(?:(?:please|find|search|show|get|give|buy|want|need|looking|look|for|me|i|i'm|im|some|a|an|the|"
+    r"cheap|cheapest|best|good|deals?|offers?|on|of|gift|gifts|regalo|cerco|un|una)\s+)+",
+    re.IGNORECASE)
+_TRAILING_FILLER = re.compile(
+    r"(?:\s+(?:for|as)\s+(?:a\s+)?(?:christmas|xmas|gift|present|natale)(?:\s+(?:gift|present))?)+$",
+    re.IGNORECASE)
+_QUESTION_WORDS = re.compile(r"\b(?:what|which|who|how|why|ideas?|suggest\w*|recommend\w*)\b", re.IGNORECASE)
+
+
+class FastQuery(NamedTuple):
+    product: str
+    max_price: Optional[float]
+
+
+def extract_fast_query(query: str) -> Optional[FastQuery]:
+    """Extract product name and price cap from queries like "nintendo switch under 300€".
+
+    Returns None when the query is not a direct product query (open questions,
+    gift ideas for a person, long descriptions), which need the full pipeline.
+    """
+    text = " ".join(query.strip().rstrip("?!.").split())
+    if not text or _QUESTION_WORDS.search(text):
+        return None
+    max_price = None
+    match = _PRICE_CAP.search(text)
+    if match:
+        max_price = float(match.group(1).replace(",", "."))
+        text = f"{text[:match.start()]} {text[match.end():]}"
+    product = _TRAILING_FILLER.sub("", _LEADING_FILLER.sub("", " ".join(text.split())))
+    product = product.strip(" ,;:-")
+    if not product or len(product.split()) > FAST_PATH_MAX_WORDS:
+        return None
+    return FastQuery(product=product, max_price=max_price)
+
+
+def products_to_gifts(products: dict, limit: int = 10) -> dict:
+    """Map the products JSON into the gifts JSON returned by ElfAgent."""
+    return {"gifts": [
+        {
+            "name": product["product_title"],
+            "description": product["product_description"],
+            "original_price": product["product_original_price"],
+            "current_price": product["product_price"],
+            "marketplace": product["marketplace_source"],
+            "rating": product["product_star_rating"],
+            "order_url": product["product_url"],
+            "image_url": product["product_image"],
+        }
+        for product in products["products"][:limit]
+    ]}
+
+
+class FastPathAgent(BaseAgent):
+    """Answers direct product queries without the LLM orchestration layers.
+
+    The product name and price cap are parsed from the query, the marketplace
+    tools are called directly and in parallel, and their payloads aggregated
+    deterministically under output_key. The optional single sub agent does the
+    final ranking and summary; without it the top products are returned as is.
+    With compact, the ranking agent gets the compact views under shortlist_key
+    and the records are stored one per product id.
+    """
+
+    marketplace_tools: dict[str, Callable[..., Awaitable[Any]]]
+    output_key: str = "products"
+    query_key: str = "fast_query"
+    shortlist_key: str = "shortlist"
+    limit: int = 20
+    compact: bool = False
+
+    async def _call_tool(self, tool: Callable[..., Awaitable[Any]], fast_query: FastQuery) -> Any:
+        started = time.perf_counter()
+        try:
+            return await tool(fast_query.product, max_price=fast_query.max_price)
+        finally:
+            elapsed = time.perf_counter() - started
+            TOOL_DURATION.observe(elapsed, tool=tool.__name__)
+            timings = current_timings.get()
+            if timings is not None:
+                timings.add_tool(tool.__name__, elapsed, 0)
+
+    @override
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        query = " ".join(part.text for part in ctx.user_content.parts or [] if part.text) \
+            if ctx.user_content else ""
+        fast_query = extract_fast_query(query) or FastQuery(product=query, max_price=None)
+
+        marketplaces = list(self.marketplace_tools)
+        results = await asyncio.gather(
+            *(self._call_tool(self.marketplace_tools[marketplace], fast_query) for marketplace in marketplaces),
+            return_exceptions=True)
+        payloads = []
+        for marketplace, result in zip(marketplaces, results):
+            if isinstance(result, Exception):
+                logger.warning(f"{self.name} > {marketplace} search failed: {result}")
+                result = {"error": "error"}
+            payloads.append((marketplace, result))
+        products = aggregate_products(payloads, limit=self.limit, marketplaces=marketplaces)
+        logger.info(f"{self.name} > {fast_query.product!r} (max {fast_query.max_price}) -> "
+                    f"{len(products['products'])} products from {len(payloads)} marketplaces")
+
+        state_delta = {self.output_key: products, self.query_key: query}
+        if not self.sub_agents:
+            yield Event(
+                author=self.name,
+                invocation_id=ctx.invocation_id,
+                branch=ctx.branch,
+                content=types.Content(role="model",
+                                      parts=[types.Part(text=json.dumps(products_to_gifts(products)))]),
+                actions=EventActions(state_delta=state_delta),
+            )
+            return
+
+        if self.compact:
+            state_delta[self.shortlist_key] = {"products": store_products(state_delta, products["products"])}
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            branch=ctx.branch,
+            actions=EventActions(state_delta=state_delta),
+        )
+        async for event in self.sub_agents[0].run_async(ctx):
+            yield event
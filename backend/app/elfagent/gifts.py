@@ -0,0 +1,54 @@
+import logging
+
+from typing import Any, Optional
+from pydantic import BaseModel, ValidationError, field_validator
+
+from app.tools.aggregation import parse_price
+from app.utils.serialization import parse_json_document
+
+logger = logging.getLogger("uvicorn.error")
+
+gift_stats = {
+    "structured": 0,
+    "unstructured": 0,
+    "invalid_gifts": 0,
+}
+
+
+class Gift(BaseModel):
+    """One gift of the ElfAgent answer, in the gifts JSON the agents are asked for."""
+
+    name: str
+    description: Optional[str] = None
+    original_price: Optional[float] = None
+    current_price: Optional[float] = None
+    marketplace: Optional[str] = None
+    rating: Optional[float] = None
+    order_url: Optional[str] = None
+    image_url: Optional[str] = None
+
+    @field_validator("original_price", "current_price", "rating", mode="before")
+    @classmethod
+    def parse_number(cls, value: Any) -> Optional[float]:
+        # Models write prices as "19,99 €" or "N/A" as often as numbers
+        return parse_price(value)[0] if isinstance(value, str) else value
+
+
+def extract_gifts(response: Any) -> Optional[list[Gift]]:
+    """The validated gifts of an agent answer, None when it holds no gifts JSON.
+
+    Gifts failing validation are dropped, the others kept in order.
+    """
+    document = parse_json_document(response) if isinstance(response, str) else response
+    items = document.get("gifts") if isinstance(document, dict) else None
+    if not isinstance(items, list):
+        gift_stats["unstructured"] += 1
+        return None
+    gifts = []
+    for item in items:
+        try:
+            gifts.append(Gift.model_validate(item))
+        except ValidationError:
+            gift_stats["invalid_gifts"] += 1
+    gift_stats["structured"] += 1
+    return gifts
@@ -0,0 +1,85 @@
+import json
+import logging
+
+from typing import Optional
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+
+from app.tools import load_products, parse_product_ids, product_view
+from .fastpath import products_to_gifts
+
+logger = logging.getLogger("uvicorn.error")
+
+# Agents whose final answer is the list of gift ids returned to the user
+GIFT_AUTHORS = ("ElfAgent", "FastRankerAgent")
+
+handoff_stats = {
+    "expanded": 0,
+    "unknown_ids": 0,
+}
+
+
+def _content(value: dict) -> types.Content:
+    return types.Content(role="model", parts=[types.Part(text=json.dumps(value))])
+
+
+def hand_over_tool_result(tool, args: dict, tool_context: ToolContext, tool_response) -> None:
+    """after_tool_callback of the marketplace agents: end the turn on the tool result.
+
+    The aggregator reads the payloads from the function responses, so the
+    model does not have to write the products out again.
+    """
+    tool_context.actions.skip_summarization = True
+    return None
+
+
+def shortlist_products(callback_context: CallbackContext) -> Optional[types.Content]:
+    """after_agent_callback of the MarketplaceAgent: answer its caller with the views of its ids.
+
+    The agent answers with the ids of the best deals only; the DirectorAgent
+    result read by ElfAgent still needs their titles and prices to rank them.
+    """
+    state = callback_context.state
+    records = load_products(state, parse_product_ids(state.get("deals")))
+    if not records:
+        products = state.get("products")
+        records = products.get("products", [])[:20] if isinstance(products, dict) else []
+    if not records:
+        return None
+    return _content({"products": [product_view(record) for record in records]})
+
+
+class ProductHandoffPlugin(BasePlugin):
+    """Expands the gift ids answered by the final agents into the gifts JSON.
+
+    The product records were stored in the session state by the tools and the
+    aggregating agents, so the answer keeps the contract of the API while the
+    models only write ids. Registered after the other plugins: the first plugin
+    returning an event ends the on_event callbacks.
+    """
+
+    def __init__(self, authors: tuple[str, ...] = GIFT_AUTHORS, limit: int = 10):
+        super().__init__(name="elf_product_handoff")
+        self.authors = authors
+        self.limit = limit
+
+    async def on_event_callback(self, *, invocation_context, event):
+        if event.author not in self.authors or event.partial or not event.is_final_response():
+            return None
+        if not event.content or not event.content.parts:
+            return None
+        text = "".join(part.text for part in event.content.parts if part.text)
+        ids = parse_product_ids(text)
+        if not ids:
+            return None
+        records = load_products(invocation_context.session.state, ids)
+        handoff_stats["unknown_ids"] += len(ids) - len(records)
+        if not records:
+            logger.warning(f"{event.author} > none of the {len(ids)} answered ids is a known product")
+            return None
+        handoff_stats["expanded"] += 1
+        gifts = products_to_gifts({"products": records}, limit=self.limit)
+        return event.model_copy(update={"content": _content(gifts)})
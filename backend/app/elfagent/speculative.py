@@ -0,0 +1,121 @@
+import asyncio
+import json
+import logging
+import re
+import time
+
+from typing import Any, AsyncGenerator, Optional
+from typing_extensions import override
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.genai import types
+
+from app.tools import MARKETPLACES, search_payloads
+from app.tools.aggregation import aggregate_products
+from app.tools.catalog import store_products
+from app.utils.metrics import TOOL_DURATION, current_timings
+from .fastpath import extract_fast_query
+
+logger = logging.getLogger("uvicorn.error")
+
+# The research answer is JSON-like text, not always valid JSON (trailing commas, code fences)
+_PRODUCT_NAME = re.compile(r'"product_name"\s*:\s*"((?:[^"\\]|\\.)+)"')
+
+
+def product_key(name: str) -> str:
+    """Comparable form of a product name, without the price cap and filler words."""
+    fast_query = extract_fast_query(name)
+    return " ".join((fast_query.product if fast_query else name).lower().split())
+
+
+def research_product_names(research: Any) -> list[str]:
+    """Product names found by the research step, in order and without duplicates."""
+    text = research if isinstance(research, str) else json.dumps(research or {})
+    names: dict[str, str] = {}
+    for match in _PRODUCT_NAME.finditer(text):
+        name = " ".join(match.group(1).split())
+        if name and name != "...":
+            names.setdefault(product_key(name), name)
+    return list(names.values())
+
+
+class SpeculativeDirectorAgent(BaseAgent):
+    """DirectorAgent that overlaps the product research with the marketplace searches.
+
+    When the user names a product, its marketplace searches start right away
+    while the research sub agent runs. The product names found by the research
+    are then reconciled with the speculation: matching products reuse the
+    speculative payloads, only new products are searched, and everything is
+    aggregated deterministically under output_key. When the research names no
+    product, the speculative payloads are used alone or, without speculation,
+    the marketplace sub agent runs as in the sequential DirectorAgent. With
+    compact, the records are stored one per product id and output_key gets
+    the compact views.
+    """
+
+    research_key: str = "google_results"
+    output_key: str = "deals"
+    products_key: str = "products"
+    limit: int = 20
+    compact: bool = False
+
+    async def _search(self, products: list[str], max_price: Optional[float], tool: str) -> list[tuple[str, Any]]:
+        started = time.perf_counter()
+        try:
+            return await search_payloads(products, max_price)
+        finally:
+            elapsed = time.perf_counter() - started
+            TOOL_DURATION.observe(elapsed, tool=tool)
+            timings = current_timings.get()
+            if timings is not None:
+                timings.add_tool(tool, elapsed, 0)
+
+    @override
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        research_agent, marketplace_agent = self.sub_agents
+        query = " ".join(part.text for part in ctx.user_content.parts or [] if part.text) \
+            if ctx.user_content else ""
+        fast_query = extract_fast_query(query)
+        max_price = fast_query.max_price if fast_query else None
+        speculation = None
+        if fast_query:
+            speculation = asyncio.create_task(
+                self._search([fast_query.product], max_price, "speculative_search"))
+
+        try:
+            async for event in research_agent.run_async(ctx):
+                yield event
+
+            names = research_product_names(ctx.session.state.get(self.research_key))
+            if not names and speculation is None:
+                async for event in marketplace_agent.run_async(ctx):
+                    yield event
+                return
+
+            speculated = product_key(fast_query.product) if fast_query else None
+            reused = speculation is not None and (not names or speculated in map(product_key, names))
+            payloads = await speculation if reused else []
+            new_products = [name for name in names if product_key(name) != speculated]
+            if new_products:
+                payloads += await self._search(new_products, max_price, "follow_up_search")
+        finally:
+            if speculation is not None and not speculation.done():
+                speculation.cancel()
+
+        result = aggregate_products(payloads, limit=self.limit, marketplaces=list(MARKETPLACES))
+        logger.info(f"{self.name} > speculative {speculated!r} {'reused' if reused else 'discarded'}, "
+                    f"{len(new_products)} follow-up products -> {len(result['products'])} products")
+        state_delta = {self.products_key: result}
+        deals = result
+        if self.compact:
+            deals = {**result, "products": store_products(state_delta, result["products"])}
+        state_delta[self.output_key] = deals
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(text=json.dumps(deals))]),
+            actions=EventActions(state_delta=state_delta),
+        )
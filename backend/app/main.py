@@ -1,40 +1,92 @@
 import os
 import uuid
+import asyncio
+import time
 import logging
-import json
 
 from contextlib import asynccontextmanager
-from typing import Optional
+from typing import Literal, Optional
 
 from dotenv import load_dotenv
 load_dotenv()
 
 
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 
 from google.adk.apps import App, ResumabilityConfig
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.genai import types
-
-from app.elfagent import root_agent
-from app.utils import run_session
+from google.adk.sessions import BaseSessionService
+
+from app.elfagent import build_agents, extract_fast_query, batch_jobs, run_batch, ProductHandoffPlugin, \
+    handoff_stats, Gift, extract_gifts, gift_stats
+from app.tools import http_pool, deals_cache, pruning_stats, rate_limiter, run_quota_flusher, marketplace_latency, \
+    circuit_breakers, stale_store, deal_index, run_deal_index_refresher, parse_categories, \
+    image_proxy, ImageProxyError, AMAZON_API_URL, ALIBABA_API_URL
+from app.tools.images import IMAGE_PROXY_PATH
+from app.utils import run_session, stream_session, StreamingPlugin, \
+    build_session_service, run_session_janitor, query_cache, record_turn, ContextBudgetPlugin, \
+    context_budget_stats, warm_up_models, model_router
+from app.utils.const import SESSION_SWEEP_INTERVAL, QUERY_CACHE_ENABLED, REQUEST_DEADLINE, \
+    CONTEXT_BUDGET_ENABLED, BATCH_MAX_ITEMS, BATCH_CONCURRENCY, PRODUCT_ID_HANDOFF, \
+    RESPONSE_COMPRESS_MIN_BYTES, RESPONSE_COMPRESS_LEVEL, IMAGE_CACHE_TTL
+from app.utils.admission import admission, upstream_limits, AdmissionRejected, current_deadline
+from app.utils.serialization import FastJSONResponse, dumps_text
+from app.utils.metrics import MetricsPlugin, RequestTimings, current_timings, \
+    render_metrics, REQUEST_DURATION
 
 
 
 # Global state
-session_service: Optional[InMemorySessionService] = None
+session_service: Optional[BaseSessionService] = None
 runner: Optional[Runner] = None
-#elf_app: Optional[App] = None
+fast_runner: Optional[Runner] = None
+elf_app: Optional[App] = None
+# Set once this worker is warm; until then /health answers 503 and queries wait
+ready: Optional[asyncio.Event] = None
 
 logger = logging.getLogger("uvicorn.info")
 
+def build_plugins() -> list:
+    plugins = [StreamingPlugin(), MetricsPlugin()]
+    if CONTEXT_BUDGET_ENABLED:
+        plugins.append(ContextBudgetPlugin())
+    if PRODUCT_ID_HANDOFF:
+        # Last: it replaces the final events the other plugins already saw
+        plugins.append(ProductHandoffPlugin())
+    return plugins
+
+
+async def warm_up():
+    """Build the model clients and open the upstream connections of this worker."""
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(warm_up_models)
+        await http_pool.open([AMAZON_API_URL, ALIBABA_API_URL])
+        await asyncio.to_thread(deal_index.open)
+    except Exception as e:
+        logger.error(f"❌ Warm-up failed, the first requests will pay for it: {e}")
+    ready.set()
+    logger.info(f"🔥 Worker {os.getpid()} ready in {time.perf_counter() - started:.1f}s")
+
+
+async def wait_until_ready(deadline: float):
+    if ready is None or ready.is_set():
+        return
+    try:
+        await asyncio.wait_for(ready.wait(), max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        raise AdmissionRejected("warming up", 1)
+
+
 @asynccontextmanager
 async def lifespan(fastapi_app: FastAPI):
     """Initialize app on startup"""
-    global session_service, runner, root_agent
+    global session_service, runner, fast_runner, elf_app, ready
     
     if not os.getenv("GOOGLE_API_KEY"):
         raise ValueError("GOOGLE_API_KEY not found in environment variables")
@@ -48,19 +100,43 @@ async def lifespan(fastapi_app: FastAPI):
     if not os.getenv("RAPIDAPI_KEY"):
         raise ValueError("RAPIDAPI_KEY not found in environment variables")
     
-    #elf_app = App(
-    #    name="elfagent",
-    #    root_agent=root_agent,
-    #    resumability_config=ResumabilityConfig(is_resumable=True)
-    #)
+    agents = build_agents()
+    elf_app = App(
+        name="elfagent",
+        root_agent=agents["root_agent"],
+        plugins=build_plugins()
+    )
     
-    session_service = InMemorySessionService()
-    runner = Runner(app_name="elfagent", agent=root_agent, session_service=session_service)
+    session_service = build_session_service()
+    runner = Runner(app=elf_app, session_service=session_service)
+    # Same app name, so a session can mix fast and full queries
+    fast_runner = Runner(
+        app=App(name=elf_app.name, root_agent=agents["fast_agent"], plugins=build_plugins()),
+        session_service=session_service)
+    janitor = asyncio.create_task(
+        run_session_janitor(session_service, elf_app.name, SESSION_SWEEP_INTERVAL))
+    quota_flusher = asyncio.create_task(run_quota_flusher(rate_limiter.quota))
+    ready = asyncio.Event()
+    warmer = asyncio.create_task(warm_up())
+    categories = parse_categories()
+    indexer = None
+    if categories and deal_index.claim_refresh():
+        indexer = asyncio.create_task(run_deal_index_refresher(deal_index, categories))
     
     logger.info("✅ ElfAgent API initialized")
     yield
     
     logger.info("🛑 Shutting down ElfAgent API")
+    janitor.cancel()
+    quota_flusher.cancel()
+    warmer.cancel()
+    batch_jobs.cancel()
+    if indexer:
+        indexer.cancel()
+    deal_index.close()
+    await http_pool.close()
+    await image_proxy.close()
+    rate_limiter.close()
 
 
 app = FastAPI(
@@ -71,6 +147,8 @@ app = FastAPI(
 )
 
 # CORS middleware for frontend
+# Websocket frames are compressed by app.utils.compression, see app.serve
+app.add_middleware(GZipMiddleware, minimum_size=RESPONSE_COMPRESS_MIN_BYTES, compresslevel=RESPONSE_COMPRESS_LEVEL)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -89,13 +167,29 @@ class QueryRequest(BaseModel):
     query: str
     user_id: Optional[str] = None
     session_id: Optional[str] = None
+    include_timings: bool = False
+    mode: Literal["full", "fast"] = "full"
+    deadline_ms: Optional[int] = None
 
 
 class QueryResponse(BaseModel):
     session_id: str
     user_id: str
     response: str
+    gifts: Optional[list[Gift]] = None
     status: str
+    mode: str = "full"
+    cached: bool = False
+    marketplace_status: Optional[dict] = None
+    timings: Optional[dict] = None
+
+
+class BatchRequest(BaseModel):
+    queries: list[str]
+    user_id: Optional[str] = None
+    mode: Literal["full", "fast"] = "full"
+    concurrency: Optional[int] = None
+    deadline_ms: Optional[int] = None
 
 
 class SessionInfo(BaseModel):
@@ -104,6 +198,13 @@ class SessionInfo(BaseModel):
     app_name: str
 
 
+def select_runner(mode: str, query: str) -> tuple[Runner, str]:
+    """Fast mode only applies to direct product queries, anything else runs the full pipeline"""
+    if mode == "fast" and fast_runner and extract_fast_query(query):
+        return fast_runner, "fast"
+    return runner, "full"
+
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -114,16 +215,94 @@ async def root():
     }
 
 
-@app.get("/health")
+@app.get("/health", response_class=FastJSONResponse)
 async def health():
     """Detailed health check"""
+    if ready is not None and not ready.is_set():
+        return JSONResponse(status_code=503, content={"status": "starting", "worker_pid": os.getpid()})
     return {
         "status": "healthy",
+        "worker_pid": os.getpid(),
         "runner_initialized": runner is not None,
-        "session_service_initialized": session_service is not None
+        "session_service_initialized": session_service is not None,
+        "session_backend": type(session_service).__name__ if session_service else None,
+        "http_pool": http_pool.stats(),
+        "cache": deals_cache.stats(),
+        "payload_pruning": pruning_stats,
+        "context_budget": context_budget_stats,
+        "gifts": gift_stats,
+        "product_handoff": handoff_stats,
+        "rate_limits": rate_limiter.stats(),
+        "marketplace_latency": marketplace_latency.stats(),
+        "circuit_breakers": circuit_breakers.stats(),
+        "stale_store": stale_store.stats(),
+        "deal_index": await asyncio.to_thread(deal_index.stats),
+        "query_cache": query_cache.stats() if QUERY_CACHE_ENABLED else None,
+        "admission": admission.stats(),
+        "batch_jobs": batch_jobs.stats(),
+        "upstreams": upstream_limits.stats(),
+        "model_router": model_router.stats(),
+        "images": await asyncio.to_thread(image_proxy.stats)
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics for agents, tools, upstream HTTP calls and tokens"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+def request_deadline(deadline_ms: Optional[int]) -> float:
+    return time.monotonic() + (deadline_ms / 1000 if deadline_ms else REQUEST_DEADLINE)
+
+
+def busy_error(e: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"Server busy: {e.reason}",
+                         headers={"Retry-After": str(e.retry_after)})
+
+
+async def has_history(user_id: str, session_id: str) -> bool:
+    session = await session_service.get_session(app_name=runner.app_name, user_id=user_id,
+                                                session_id=session_id)
+    return session is not None and bool(session.events)
+
+
+async def get_marketplace_status(user_id: str, session_id: str) -> Optional[dict]:
+    """Which marketplaces answered in time for the last aggregated products"""
+    session = await session_service.get_session(app_name=runner.app_name, user_id=user_id,
+                                                session_id=session_id)
+    products = session.state.get("products") if session else None
+    return products.get("marketplace_status") if isinstance(products, dict) else None
+
+
+def complete_answer(marketplace_status: Optional[dict]) -> bool:
+    """Whether every marketplace contributed fresh deals; partial answers are not worth caching"""
+    return bool(marketplace_status) and all(status == "ok" for status in marketplace_status.values())
+
+
+async def answer_query(query_runner: Runner, mode: str, user_id: str, session_id: str, query: str,
+                       deadline: float) -> dict:
+    """Answer a query from the query cache or by running the agents under admission control"""
+    await wait_until_ready(deadline)
+    # Only a new conversation can reuse an answer, follow-ups depend on the session history
+    cacheable = QUERY_CACHE_ENABLED and not await has_history(user_id, session_id)
+    hit = query_cache.get(query, namespace=mode) if cacheable else None
+    cached = hit is not None
+    if cached:
+        response, marketplace_status = hit["response"], hit["marketplace_status"]
+        await record_turn(query_runner, session_service, user_id, query, response, session_id)
+    else:
+        async with admission.admit(user_id, deadline):
+            response = await run_session(query_runner, session_service, user_id, [query], session_id)
+        marketplace_status = await get_marketplace_status(user_id, session_id)
+        if cacheable and isinstance(response, str) and response.strip() and complete_answer(marketplace_status):
+            query_cache.set(query, {"response": response, "marketplace_status": marketplace_status},
+                            namespace=mode)
+    gifts = extract_gifts(response)
+    return {"response": response, "cached": cached, "marketplace_status": marketplace_status,
+            "gifts": [gift.model_dump() for gift in gifts] if gifts is not None else None}
+
+
 @app.post("/api/query", response_model=QueryResponse)
 async def process_query(request: QueryRequest):
     """Process a gift search query"""
@@ -134,19 +313,150 @@ async def process_query(request: QueryRequest):
     user_id = request.user_id or str(uuid.uuid4())
     session_id = request.session_id or str(uuid.uuid4())
     
-    logger.info(f"Processing query for user_id={user_id}, session_id={session_id}, model={runner.agent.model}")
+    query_runner, mode = select_runner(request.mode, request.query)
+    logger.info(f"Processing query for user_id={user_id}, session_id={session_id}, mode={mode}")
+    timings = RequestTimings()
+    current_timings.set(timings)
+    deadline = request_deadline(request.deadline_ms)
+    current_deadline.set(deadline)
+    status = "500"
     try:
-        response = await run_session(runner, session_service, user_id, [request.query], session_id)
+        answer = await answer_query(query_runner, mode, user_id, session_id, request.query, deadline)
+        status = "200"
 
         return QueryResponse(
             session_id=session_id,
             user_id=user_id,
-            response=response,
-            status="completed"
+            status="completed",
+            mode=mode,
+            timings=timings.to_dict() if request.include_timings else None,
+            **answer
         )
     
+    except AdmissionRejected as e:
+        status = "503"
+        raise busy_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+    finally:
+        REQUEST_DURATION.observe(time.perf_counter() - timings.started, endpoint="/api/query", status=status)
+
+
+def format_sse(message: dict) -> str:
+    return f"event: {message['type']}\ndata: {dumps_text(message)}\n\n"
+
+
+@app.post("/api/query/stream")
+async def process_query_stream(request: QueryRequest):
+    """Process a gift search query streaming progress as Server-Sent Events"""
+    
+    if not runner or not session_service:
+        raise HTTPException(status_code=503, detail="Service not initialized")
+    
+    user_id = request.user_id or str(uuid.uuid4())
+    session_id = request.session_id or str(uuid.uuid4())
+    
+    query_runner, mode = select_runner(request.mode, request.query)
+    logger.info(f"Streaming query for user_id={user_id}, session_id={session_id}, mode={mode}")
+    deadline = request_deadline(request.deadline_ms)
+    try:
+        await wait_until_ready(deadline)
+        await admission.acquire(user_id, deadline)
+    except AdmissionRejected as e:
+        raise busy_error(e)
+    started = time.monotonic()
+    released = False
+
+    def release():
+        # Called by the stream and, if it never started, by the response background task
+        nonlocal released
+        if not released:
+            released = True
+            admission.release(time.monotonic() - started)
+
+    async def event_source():
+        current_deadline.set(deadline)
+        try:
+            yield format_sse({"type": "session_info", "user_id": user_id, "session_id": session_id, "mode": mode})
+            async for message in stream_session(query_runner, session_service, user_id, request.query, session_id):
+                yield format_sse(message)
+        finally:
+            release()
+
+    return StreamingResponse(event_source(),
+                             media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                             background=BackgroundTask(release))
+
+
+@app.post("/api/batch")
+async def process_batch(request: BatchRequest):
+    """Answer many queries with bounded concurrency, streaming each result as NDJSON when it completes"""
+
+    if not runner or not session_service:
+        raise HTTPException(status_code=503, detail="Service not initialized")
+    if not request.queries or len(request.queries) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch holds 1 to {BATCH_MAX_ITEMS} queries")
+
+    user_id = request.user_id or str(uuid.uuid4())
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY))
+    job = batch_jobs.create(len(request.queries), user_id, request.mode)
+    logger.info(f"Batch {job.id} of {job.total} queries for user_id={user_id}, concurrency={concurrency}")
+
+    async def answer(index: int, query: str) -> dict:
+        query_runner, mode = select_runner(request.mode, query)
+        # Every item gets its own session and deadline
+        session_id = f"{job.id}-{index}"
+        deadline = request_deadline(request.deadline_ms)
+        current_deadline.set(deadline)
+        started = time.perf_counter()
+        status = "500"
+        try:
+            answer = await answer_query(query_runner, mode, user_id, session_id, query, deadline)
+            status = "200"
+        except AdmissionRejected:
+            status = "503"
+            raise
+        finally:
+            REQUEST_DURATION.observe(time.perf_counter() - started, endpoint="/api/batch", status=status)
+        return {"session_id": session_id, "mode": mode, **answer}
+
+    # The job outlives the stream: a client that disconnects can still poll it
+    job.task = asyncio.create_task(run_batch(job, request.queries, answer, concurrency))
+
+    async def lines():
+        yield dumps_text({"type": "job", **job.snapshot(include_results=False)}) + "\n"
+        async for result in job.updates():
+            yield dumps_text({"type": "item", **result}) + "\n"
+        yield dumps_text({"type": "complete", **job.snapshot(include_results=False)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Batch-Job-Id": job.id})
+
+
+@app.get("/api/batch/{job_id}", response_class=FastJSONResponse)
+async def get_batch(job_id: str, include_results: bool = True):
+    """Progress of a batch job and the results of its completed items"""
+    snapshot = await batch_jobs.get(job_id, include_results)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return snapshot
+
+
+@app.get(IMAGE_PROXY_PATH)
+async def get_image(request: Request, url: str, w: Optional[int] = None):
+    """Product photo of a marketplace CDN, resized to the next thumbnail width and cached"""
+    try:
+        image = await image_proxy.get(url, image_proxy.width(w))
+    except ImageProxyError as e:
+        raise HTTPException(status_code=e.status, detail=str(e))
+    # The URL names the photo and the ETag its content: browsers and CDNs never need to revalidate.
+    # Photos are compressed already, the identity encoding keeps them out of the gzip middleware.
+    headers = {"Cache-Control": f"public, max-age={IMAGE_CACHE_TTL}, immutable",
+               "ETag": image.etag,
+               "Content-Encoding": "identity"}
+    if image.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=image.data, media_type=image.content_type, headers=headers)
 
 
 @app.websocket("/ws/query")
@@ -162,8 +472,8 @@ async def websocket_query(websocket: WebSocket):
     try:
         # Receive initial connection data
         data = await websocket.receive_json()
-        user_id = data.get("user_id", str(uuid.uuid4()))
-        session_id = data.get("session_id", str(uuid.uuid4()))
+        user_id = data.get("user_id") or str(uuid.uuid4())
+        session_id = data.get("session_id") or str(uuid.uuid4())
         
         # Send session info
         await websocket.send_json({
@@ -172,20 +482,6 @@ async def websocket_query(websocket: WebSocket):
             "session_id": session_id
         })
         
-        # Get or create session
-        try:
-            session = await session_service.create_session(
-                app_name=elf_app.name,
-                user_id=user_id,
-                session_id=session_id
-            )
-        except:
-            session = await session_service.get_session(
-                app_name=elf_app.name,
-                user_id=user_id,
-                session_id=session_id
-            )
-        
         # Listen for queries
         while True:
             data = await websocket.receive_json()
@@ -195,23 +491,18 @@ async def websocket_query(websocket: WebSocket):
                 await websocket.send_json({"error": "No query provided"})
                 continue
             
-            # Process query and stream responses
-            query_content = types.Content(
-                role="user",
-                parts=[types.Part(text=query)]
-            )
-            
-            async for event in runner.run_async(
-                user_id=user_id,
-                session_id=session.id,
-                new_message=query_content
-            ):
-                if event.content and event.content.parts:
-                    if event.content.parts[0].text and event.content.parts[0].text != "None":
-                        await websocket.send_json({
-                            "type": "response",
-                            "content": event.content.parts[0].text
-                        })
+            query_runner, _ = select_runner(data.get("mode", "full"), query)
+            deadline = request_deadline(data.get("deadline_ms"))
+            current_deadline.set(deadline)
+            try:
+                await wait_until_ready(deadline)
+                async with admission.admit(user_id, deadline):
+                    # send_text waits for the socket write, so a slow client pauses the stream
+                    async for message in stream_session(query_runner, session_service, user_id, query, session_id):
+                        await websocket.send_text(dumps_text(message))
+            except AdmissionRejected as e:
+                await websocket.send_json({"type": "error", "error": f"Server busy: {e.reason}",
+                                           "retry_after": e.retry_after})
             
             await websocket.send_json({"type": "complete"})
     
@@ -229,15 +520,15 @@ async def get_user_sessions(user_id: str):
         raise HTTPException(status_code=503, detail="Service not initialized")
     
     try:
-        sessions = await session_service.list_sessions(
+        response = await session_service.list_sessions(
             app_name=elf_app.name,
             user_id=user_id
         )
-        return {"user_id": user_id, "sessions": sessions}
+        return {"user_id": user_id, "sessions": response.sessions}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    from app.serve import serve
+    serve()
@@ -0,0 +1,40 @@
+"""Production server: several uvicorn worker processes sharing caches and sessions.
+
+    python -m app.serve --workers 4
+
+Each worker builds its model clients and opens its upstream connections in
+the background after startup and answers /health with 503 until it is warm.
+With more than one worker the deals cache and the sessions default to the
+sqlite backends so the workers share them, the upstream request rates are
+split between the workers and only one of them refreshes the deal index.
+Websocket frames from RESPONSE_COMPRESS_MIN_BYTES on are sent compressed.
+"""
+import argparse
+import os
+
+import uvicorn
+
+# The supervisor process only forks the workers, it reads its options here
+# instead of importing the app (and app.utils.const) itself
+DEFAULT_WORKERS = int(os.getenv("WEB_WORKERS") or 1)
+
+
+def serve(argv=None):
+    parser = argparse.ArgumentParser(description="ElfAgent API production server")
+    parser.add_argument("--host", default=os.getenv("WEB_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("WEB_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Worker processes, WEB_WORKERS or 1 by default")
+    args = parser.parse_args(argv)
+    workers = max(1, args.workers)
+    if workers > 1:
+        # Per-process memory backends would give every worker its own cache and sessions
+        os.environ.setdefault("CACHE_BACKEND", "sqlite")
+        os.environ.setdefault("SESSION_BACKEND", "sqlite")
+    os.environ["WEB_WORKERS"] = str(workers)
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=workers,
+                ws="app.utils.compression:CompressedWebSocketProtocol")
+
+
+if __name__ == "__main__":
+    serve()
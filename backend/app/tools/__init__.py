@@ -1,9 +1,46 @@
-from .awstools import get_amazon_deals_by_product
-from .alibabatools import get_alibaba_deals_by_product
+from .awstools import get_amazon_deals_by_product, AMAZON_API_URL
+from .alibabatools import get_alibaba_deals_by_product, ALIBABA_API_URL
+from .marketplaces import MarketplaceAdapter, MARKETPLACES, register_marketplace, marketplace_tools, \
+    search_marketplaces, search_payloads
+from .dealindex import deal_index, search_deal_index, run_deal_index_refresher, parse_categories
 from .agenttools import ask_confirmation
+from .httpclient import http_pool
+from .cache import deals_cache, stale_store
+from .catalog import store_products, load_products, parse_product_ids, product_view
+from .pruning import pruning_stats
+from .ratelimit import rate_limiter, run_quota_flusher
+from .deadlines import marketplace_latency
+from .breaker import circuit_breakers
+from .images import image_proxy, ImageProxyError
 
 __all__ = [
     "get_amazon_deals_by_product",
     "get_alibaba_deals_by_product",
-    "ask_confirmation"
+    "MarketplaceAdapter",
+    "MARKETPLACES",
+    "register_marketplace",
+    "marketplace_tools",
+    "search_marketplaces",
+    "search_payloads",
+    "deal_index",
+    "search_deal_index",
+    "run_deal_index_refresher",
+    "parse_categories",
+    "ask_confirmation",
+    "http_pool",
+    "deals_cache",
+    "stale_store",
+    "store_products",
+    "load_products",
+    "parse_product_ids",
+    "product_view",
+    "circuit_breakers",
+    "image_proxy",
+    "ImageProxyError",
+    "pruning_stats",
+    "rate_limiter",
+    "run_quota_flusher",
+    "marketplace_latency",
+    "AMAZON_API_URL",
+    "ALIBABA_API_URL"
 ]
@@ -0,0 +1,243 @@
+import re
+
+from typing import Any, Callable, Optional
+from app.utils.const import IMAGE_PROXY_ENABLED
+from .images import image_proxy
+from .pruning import from_columnar
+
+# Static conversion table used to bring stray currencies back to EUR
+EUR_RATES = {
+    "EUR": 1.0,
+    "USD": 0.92,
+    "GBP": 1.17,
+    "CNY": 0.13,
+}
+
+CURRENCY_SYMBOLS = {
+    "€": "EUR",
+    "$": "USD",
+    "US$": "USD",
+    "£": "GBP",
+    "¥": "CNY",
+}
+
+DEDUP_SIMILARITY = 0.8
+
+_NUMBER = re.compile(r"\d[\d.,]*")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class Product:
+    """Normalized marketplace deal, serialized in the products schema."""
+
+    __slots__ = ("product_title", "product_description", "product_original_price",
+                 "product_price", "product_star_rating", "product_url",
+                 "product_image", "marketplace_source")
+
+    def __init__(self,
+                 product_title: str,
+                 product_price: Optional[float],
+                 product_original_price: Optional[float] = None,
+                 product_star_rating: Optional[float] = None,
+                 product_url: str = "",
+                 product_image: str = "",
+                 product_description: str = "",
+                 marketplace_source: str = ""):
+        self.product_title: str = product_title
+        self.product_description: str = product_description
+        self.product_price: Optional[float] = product_price
+        self.product_original_price: Optional[float] = product_original_price or product_price
+        self.product_star_rating: Optional[float] = product_star_rating
+        self.product_url: str = product_url
+        self.product_image: str = product_image
+        self.marketplace_source: str = marketplace_source
+
+    @property
+    def discount(self) -> float:
+        if not self.product_price or not self.product_original_price:
+            return 0.0
+        if self.product_original_price <= self.product_price:
+            return 0.0
+        return 1 - self.product_price / self.product_original_price
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def parse_price(value: Any, default_currency: str = "EUR") -> tuple[Optional[float], str]:
+    """Parse prices like "19,99 €", "€1.299,00", "$1,299.00" or 12.5 into (amount, currency)."""
+    if value is None or value == "":
+        return None, default_currency
+    if isinstance(value, (int, float)):
+        return float(value), default_currency
+    text = str(value).strip()
+    currency = default_currency
+    for symbol, code in CURRENCY_SYMBOLS.items():
+        if symbol in text:
+            currency = code
+    for code in EUR_RATES:
+        if code in text.upper():
+            currency = code
+    match = _NUMBER.search(text)
+    if not match:
+        return None, currency
+    number = match.group().rstrip(".,")
+    if "," in number and "." in number:
+        # The right-most separator is the decimal one
+        if number.rfind(",") > number.rfind("."):
+            number = number.replace(".", "").replace(",", ".")
+        else:
+            number = number.replace(",", "")
+    elif "," in number:
+        head, _, tail = number.rpartition(",")
+        number = f"{head.replace(',', '')}.{tail}" if len(tail) != 3 else number.replace(",", "")
+    elif number.count(".") > 1 or (len(number.rpartition(".")[2]) == 3 and "." in number):
+        number = number.replace(".", "")
+    try:
+        return float(number), currency
+    except ValueError:
+        return None, currency
+
+
+def to_eur(amount: Optional[float], currency: str) -> Optional[float]:
+    if amount is None:
+        return None
+    return round(amount * EUR_RATES.get(currency.upper(), 1.0), 2)
+
+
+def _parse_rating(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _absolute_url(url: Optional[str]) -> str:
+    if not url:
+        return ""
+    return f"https:{url}" if url.startswith("//") else url
+
+
+def map_amazon_products(payload: dict) -> list[Product]:
+    """Map the Real-Time Amazon Data /search payload to products."""
+    data = payload.get("data") or {}
+    products = []
+    for item in data.get("products") or []:
+        currency = item.get("currency") or "EUR"
+        price, price_currency = parse_price(item.get("product_price"), currency)
+        original, original_currency = parse_price(item.get("product_original_price"), currency)
+        if not item.get("product_title") or price is None:
+            continue
+        products.append(Product(
+            product_title=item["product_title"],
+            product_description=item.get("product_byline") or "",
+            product_price=to_eur(price, price_currency),
+            product_original_price=to_eur(original, original_currency),
+            product_star_rating=_parse_rating(item.get("product_star_rating")),
+            product_url=item.get("product_url") or "",
+            product_image=item.get("product_photo") or "",
+            marketplace_source="Amazon"))
+    return products
+
+
+def map_alibaba_products(payload: dict) -> list[Product]:
+    """Map the AliExpress DataHub item_search_4 payload to products."""
+    result = payload.get("result") or {}
+    currency = (result.get("settings") or {}).get("currency") or "EUR"
+    products = []
+    for entry in result.get("resultList") or []:
+        item = entry.get("item") or {}
+        sku = (item.get("sku") or {}).get("def") or {}
+        price, price_currency = parse_price(sku.get("promotionPrice") or sku.get("price"), currency)
+        original, original_currency = parse_price(sku.get("price"), currency)
+        if not item.get("title") or price is None:
+            continue
+        products.append(Product(
+            product_title=item["title"],
+            product_price=to_eur(price, price_currency),
+            product_original_price=to_eur(original, original_currency),
+            product_star_rating=_parse_rating(item.get("averageStarRate")),
+            product_url=_absolute_url(item.get("itemUrl")),
+            product_image=_absolute_url(item.get("image")),
+            marketplace_source="Alibaba"))
+    return products
+
+
+MARKETPLACE_MAPPERS: dict[str, Callable[[dict], list[Product]]] = {
+    "Amazon": map_amazon_products,
+    "Alibaba": map_alibaba_products,
+}
+
+
+def _title_tokens(title: str) -> frozenset[str]:
+    return frozenset(_WORD.findall(title.lower()))
+
+
+def _similarity(left: frozenset[str], right: frozenset[str]) -> float:
+    if not left or not right:
+        return 0.0
+    return len(left & right) / len(left | right)
+
+
+def dedup_products(products: list[Product], threshold: float = DEDUP_SIMILARITY) -> list[Product]:
+    """Drop near-identical titles, keeping the cheapest offer of each group."""
+    kept: list[tuple[frozenset[str], Product]] = []
+    seen_urls = set()
+    for product in sorted(products, key=lambda p: p.product_price or 0):
+        if product.product_url and product.product_url in seen_urls:
+            continue
+        tokens = _title_tokens(product.product_title)
+        if any(_similarity(tokens, other) >= threshold for other, _ in kept):
+            continue
+        seen_urls.add(product.product_url)
+        kept.append((tokens, product))
+    return [product for _, product in kept]
+
+
+def rank_products(products: list[Product]) -> list[Product]:
+    """Sort by best discount, then rating, then lowest price."""
+    return sorted(products,
+                  key=lambda p: (-p.discount, -(p.product_star_rating or 0), p.product_price or 0))
+
+
+# When a marketplace is searched several times, its best outcome is reported
+STATUS_PRIORITY = {"ok": 0, "stale": 1, "empty": 1, "missing": 3}
+
+
+def payload_status(payload: Any) -> str:
+    """ok, stale (last known good deals), or why a marketplace tool result holds no products
+    (deadline_exceeded, rate_limited, circuit_open, error)."""
+    if isinstance(payload, dict) and payload.get("error"):
+        return str(payload["error"])
+    if not isinstance(payload, dict) or not payload or "msg" in payload:
+        return "error"
+    return "stale" if payload.get("stale") else "ok"
+
+
+def aggregate_products(payloads: list[tuple[str, Any]], limit: int = 20,
+                       marketplaces: Optional[list[str]] = None) -> dict:
+    """Merge (marketplace, payload) pairs into the products JSON shape.
+
+    marketplace_status tells, per marketplace, whether it contributed (ok),
+    contributed its last known good deals (stale), answered without deals
+    (empty), failed or missed its deadline, or never answered at all
+    (missing), so partial results can be told apart. Product photos of the
+    marketplace CDNs are given as URLs of the image proxy.
+    """
+    products = []
+    status = {marketplace: "missing" for marketplace in marketplaces or []}
+    for marketplace, payload in payloads:
+        outcome = payload_status(payload)
+        mapper = MARKETPLACE_MAPPERS.get(marketplace)
+        if outcome in ("ok", "stale") and mapper:
+            mapped = mapper(from_columnar(marketplace.lower(), payload))
+            products.extend(mapped)
+            outcome = outcome if mapped else "empty"
+        previous = status.get(marketplace, "missing")
+        if STATUS_PRIORITY.get(outcome, 2) <= STATUS_PRIORITY.get(previous, 2):
+            status[marketplace] = outcome
+    ranked = rank_products(dedup_products(products))[:limit]
+    if IMAGE_PROXY_ENABLED:
+        for product in ranked:
+            product.product_image = image_proxy.proxy_url(product.product_image)
+    return {"products": [product.to_dict() for product in ranked], "marketplace_status": status}
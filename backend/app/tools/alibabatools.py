@@ -1,47 +1,50 @@
-import asyncio
-import aiohttp
 import os
 
 from typing import Optional
-from app.utils import RAPIDAPI_API_KEY
+from app.utils.const import ALIBABA_CACHE_TTL
+from .aggregation import map_alibaba_products
+from .marketplaces import MarketplaceAdapter, register_marketplace
 
-ALIBABA_API_URL = "https://aliexpress-datahub.p.rapidapi.com"
+ALIBABA_API_URL = os.getenv("ALIBABA_API_URL", "https://aliexpress-datahub.p.rapidapi.com")
 
-async def get_alibaba_deals_by_product(
-        item: str,
-        max_price: Optional[float] = None,
-        sortby: Optional[str] = None):
-    headers = {
-        "X-RAPIDAPI-KEY": RAPIDAPI_API_KEY
-    }
-    if max_price:
-        params = {
-            "q": item,
-            "end_price": max_price,
-            "country": "IT",
-            "sort": "priceAsc",
-            "currency": "EUR",
-        }
-    else:
-        params = {
+
+class AlibabaMarketplace(MarketplaceAdapter):
+    """AliExpress DataHub item_search_4, cheapest first, prices in EUR."""
+
+    name = "Alibaba"
+    base_url = ALIBABA_API_URL
+    path = "/item_search_4"
+    cache_ttl = ALIBABA_CACHE_TTL
+    concurrency = 10
+    rate = 5
+    # sortby is not forwarded to the datahub API
+    forwards_sortby = False
+
+    def build_params(self, item: str, max_price: Optional[float], sortby: Optional[str]) -> dict:
+        if max_price:
+            return {
+                "q": item,
+                "end_price": max_price,
+                "country": "IT",
+                "sort": "priceAsc",
+                "currency": "EUR",
+            }
+        return {
             "q": item,
             "country": "IT",
             "sort": "priceAsc",
             "currency": "EUR",
         }
-    search_api = f"{ALIBABA_API_URL}/item_search_4"
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(search_api, 
-                                   headers=headers,
-                                   params=params,
-                                   timeout=20) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    error = await response.json()
-                    print(f"❌ Error Alibaba Search API: {error}")
-                    return { "msg": f"No deals has been found for {item}"}
-    except Exception as e:
-        print(f"❌ Error during call Alibaba Search API: {e}")
-        return {}
+
+    def normalize(self, payload: dict):
+        return map_alibaba_products(payload)
+
+
+async def get_alibaba_deals_by_product(
+        item: str,
+        max_price: Optional[float] = None,
+        sortby: Optional[str] = None):
+    return await alibaba_marketplace.search(item, max_price, sortby)
+
+
+alibaba_marketplace = register_marketplace(AlibabaMarketplace(), tool=get_alibaba_deals_by_product)
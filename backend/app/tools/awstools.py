@@ -1,51 +1,50 @@
-import asyncio
-import aiohttp
 import os
 
 from typing import Optional
-from app.utils import RAPIDAPI_API_KEY
+from app.utils.const import AMAZON_CACHE_TTL
+from .aggregation import map_amazon_products
+from .marketplaces import MarketplaceAdapter, register_marketplace
 
-AMAZON_API_URL = "https://real-time-amazon-data.p.rapidapi.com"
+AMAZON_API_URL = os.getenv("AMAZON_API_URL", "https://real-time-amazon-data.p.rapidapi.com")
 
-async def get_amazon_deals_by_product(
-        item: str,
-        max_price: Optional[float] = None,
-        sortby: Optional[str] = None):
-    headers = {
-        "X-RAPIDAPI-KEY": RAPIDAPI_API_KEY
-    }
-    print(f"RAPID_API_KEY {search_api} with params {params}")
-    if max_price:
-        params = {
-            "query": item,
-            "max_price": max_price,
-            "country": "IT",
-            "sort_by": sortby if sortby else "RELEVANCE",
-            "deals_and_discounts": "ALL_DISCOUNTS",
-            "language": "IT"
-        }
-    else:
-        params = {
+
+class AmazonMarketplace(MarketplaceAdapter):
+    """Real-Time Amazon Data /search on the Italian store."""
+
+    name = "Amazon"
+    base_url = AMAZON_API_URL
+    path = "/search"
+    cache_ttl = AMAZON_CACHE_TTL
+    concurrency = 10
+    rate = 5
+
+    def build_params(self, item: str, max_price: Optional[float], sortby: Optional[str]) -> dict:
+        if max_price:
+            return {
+                "query": item,
+                "max_price": max_price,
+                "country": "IT",
+                "sort_by": sortby if sortby else "RELEVANCE",
+                "deals_and_discounts": "ALL_DISCOUNTS",
+                "language": "IT"
+            }
+        return {
             "query": item,
             "country": "IT",
             "sort_by": sortby if sortby else "RELEVANCE",
             "deals_and_discounts": "ALL_DISCOUNTS",
             "language": "it_IT"
         }
-    search_api = f"{AMAZON_API_URL}/search"
-    print(f"call Search API at {search_api} with params {params}")
-    print(f"API-KEY {RAPIDAPI_API_KEY}")
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(search_api, 
-                                   headers=headers,
-                                   params=params,
-                                   timeout=20) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    print(f"❌ Error AWS Search API: {await response.json()}")
-                    return { "msg": f"No deals has been found for {item}"}
-    except Exception as e:
-        print(f"❌ Error during call at AWS Search API: {e}")
-        return {}
+
+    def normalize(self, payload: dict):
+        return map_amazon_products(payload)
+
+
+async def get_amazon_deals_by_product(
+        item: str,
+        max_price: Optional[float] = None,
+        sortby: Optional[str] = None):
+    return await amazon_marketplace.search(item, max_price, sortby)
+
+
+amazon_marketplace = register_marketplace(AmazonMarketplace(), tool=get_amazon_deals_by_product)
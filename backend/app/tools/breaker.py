@@ -0,0 +1,104 @@
+import logging
+import time
+
+from typing import Optional
+from app.utils.const import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RECOVERY_TIMEOUT, CIRCUIT_HALF_OPEN_CALLS
+
+logger = logging.getLogger("uvicorn.error")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def circuit_open_result(marketplace: str, item: str, retry_after: float) -> dict:
+    """Structured tool result telling the agent the marketplace is down."""
+    return {
+        "error": "circuit_open",
+        "marketplace": marketplace,
+        "retry_after": round(retry_after, 1),
+        "msg": f"Search for {item} not performed: {marketplace} is currently unavailable, do not retry",
+    }
+
+
+class CircuitBreaker:
+    """Stops calling an upstream after consecutive failures, then probes it again.
+
+    closed: requests go through, failure_threshold consecutive failures open it.
+    open: requests fail fast for recovery_timeout seconds.
+    half_open: up to half_open_calls probes go through; a success closes the
+    breaker, a failure opens it again.
+    """
+
+    def __init__(self,
+                 failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 recovery_timeout: float = CIRCUIT_RECOVERY_TIMEOUT,
+                 half_open_calls: int = CIRCUIT_HALF_OPEN_CALLS):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_calls = half_open_calls
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.trips = 0
+        self.rejected = 0
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + self.recovery_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == OPEN and not self.retry_after():
+            self.state = HALF_OPEN
+            self.probes = 0
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and self.probes < self.half_open_calls:
+            self.probes += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, healthy: Optional[bool]):
+        """Outcome of an allowed call; None when it did not tell (rate limited, cancelled)."""
+        if healthy is None:
+            if self.state == HALF_OPEN:
+                self.probes = max(0, self.probes - 1)
+        elif healthy:
+            self.state = CLOSED
+            self.failures = 0
+        else:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.trips += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state,
+                "failures": self.failures,
+                "retry_after": round(self.retry_after(), 1) if self.state == OPEN else 0,
+                "trips": self.trips,
+                "rejected": self.rejected}
+
+
+class CircuitBreakers:
+    """One breaker per upstream host."""
+
+    def __init__(self, **options):
+        self.options = options
+        self._breakers: dict[str, CircuitBreaker] = {}
+
+    def get(self, host: str) -> CircuitBreaker:
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(**self.options)
+            self._breakers[host] = breaker
+        return breaker
+
+    def stats(self) -> dict:
+        return {host: breaker.stats() for host, breaker in self._breakers.items()}
+
+
+circuit_breakers = CircuitBreakers()
@@ -0,0 +1,213 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+from app.utils.const import CACHE_BACKEND, CACHE_SQLITE_PATH, CACHE_MAX_BYTES, STALE_SQLITE_PATH, \
+    STALE_MAX_BYTES
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def make_cache_key(marketplace: str,
+                   item: str,
+                   max_price: Optional[float] = None,
+                   sortby: Optional[str] = None,
+                   country: str = "IT",
+                   currency: str = "EUR") -> str:
+    """Build a cache key from the normalized search parameters."""
+    normalized_item = " ".join(item.lower().split())
+    normalized_price = f"{float(max_price):.2f}" if max_price else ""
+    normalized_sort = sortby.upper() if sortby else ""
+    return "|".join([marketplace.lower(), normalized_item, normalized_price,
+                     normalized_sort, country.upper(), currency.upper()])
+
+
+def is_cacheable(result: Any) -> bool:
+    """Only successful marketplace payloads are worth caching."""
+    return isinstance(result, dict) and bool(result) and "msg" not in result
+
+
+class MemoryCacheBackend:
+    """In-process LRU store bounded by the serialized size of its entries."""
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._size = 0
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.time() + ttl, value)
+        self._size += len(value)
+        while self._size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key: str):
+        _, value = self._entries.pop(key)
+        self._size -= len(value)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self._size,
+                "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+
+class SqliteCacheBackend:
+    """On-disk LRU store, shareable between processes on the same host."""
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH, max_bytes: int = CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            last_access REAL NOT NULL)""")
+        self._conn.commit()
+
+    def _get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?",
+                                     (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def _set(self, key: str, value: bytes, ttl: float):
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                               (key, value, len(value), now + ttl, now))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            while total > self.max_bytes:
+                oldest = self._conn.execute(
+                    "SELECT key, size FROM cache ORDER BY last_access LIMIT 1").fetchone()
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (oldest[0],))
+                total -= oldest[1]
+                self.evictions += 1
+            self._conn.commit()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        return {"entries": entries, "bytes": size,
+                "max_bytes": self.max_bytes, "evictions": self.evictions}
+
+
+class ResponseCache:
+    """TTL cache with single-flight coalescing of concurrent identical misses.
+
+    When the request leading a fetch is cancelled (client gone, deadline
+    passed), the requests waiting on it retry instead of failing with it.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def get_or_fetch(self,
+                           key: str,
+                           ttl: float,
+                           fetch: Callable[[], Awaitable[Any]],
+                           cacheable: Callable[[Any], bool] = is_cacheable) -> Any:
+        cached = await self.backend.get(key)
+        if cached is not None:
+            self.hits += 1
+            return json.loads(cached)
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            try:
+                return json.loads(await asyncio.shield(inflight))
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The leading request was cancelled, not this one: lead a new fetch or join it
+                return await self.get_or_fetch(key, ttl, fetch, cacheable)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await fetch()
+            payload = json.dumps(result).encode()
+            if cacheable(result):
+                await self.backend.set(key, payload, ttl)
+            future.set_result(payload)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody is waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        return {"backend": type(self.backend).__name__,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                **self.backend.stats()}
+
+
+def build_cache_backend(kind: str = CACHE_BACKEND, path: str = CACHE_SQLITE_PATH,
+                        max_bytes: int = CACHE_MAX_BYTES):
+    if kind == "sqlite":
+        logger.info(f"✅ Marketplace cache on sqlite at {path}")
+        return SqliteCacheBackend(path, max_bytes)
+    return MemoryCacheBackend(max_bytes)
+
+
+deals_cache = ResponseCache(build_cache_backend())
+# Last known good payload per search, outliving the cache TTL, served while an upstream is down
+stale_store = build_cache_backend(path=STALE_SQLITE_PATH, max_bytes=STALE_MAX_BYTES)
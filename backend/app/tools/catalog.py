@@ -0,0 +1,60 @@
+import hashlib
+import re
+
+from typing import Any, Iterable
+
+# Session state key of a product record, followed by its id
+PRODUCT_KEY_PREFIX = "product:"
+
+# "p-", a decimal digit, then five base36 digits: no English word has that shape
+_PRODUCT_ID = re.compile(r"(?<![\w-])p-[0-9][0-9a-z]{5}(?![\w-])")
+_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def product_id(product: dict) -> str:
+    """Compact, stable id of a product record, e.g. "p-4k3x9a"."""
+    source = product.get("product_url") or f"{product.get('marketplace_source')}|{product.get('product_title')}"
+    number = int.from_bytes(hashlib.blake2b(source.encode(), digest_size=8).digest(), "big")
+    number, first = divmod(number, 10)
+    digits = [_ALPHABET[first]]
+    for _ in range(5):
+        number, digit = divmod(number, len(_ALPHABET))
+        digits.append(_ALPHABET[digit])
+    return "p-" + "".join(digits)
+
+
+def product_view(product: dict) -> dict:
+    """What the agents need to rank a product; urls, images and descriptions stay in the record."""
+    return {
+        "id": product_id(product),
+        "title": product.get("product_title"),
+        "price": product.get("product_price"),
+        "original_price": product.get("product_original_price"),
+        "rating": product.get("product_star_rating"),
+        "marketplace": product.get("marketplace_source"),
+    }
+
+
+def store_products(state: Any, products: Iterable[dict]) -> list[dict]:
+    """Write the product records into the session state (or a state delta), one key per product.
+
+    One key per record lets parallel tools and agents add products without
+    overwriting each other. Returns the compact views given to the agents.
+    """
+    views = []
+    for product in products:
+        view = product_view(product)
+        state[f"{PRODUCT_KEY_PREFIX}{view['id']}"] = product
+        views.append(view)
+    return views
+
+
+def parse_product_ids(text: Any) -> list[str]:
+    """Product ids in the order an agent wrote them, without duplicates."""
+    return list(dict.fromkeys(_PRODUCT_ID.findall(text if isinstance(text, str) else str(text or ""))))
+
+
+def load_products(state: Any, ids: Iterable[str]) -> list[dict]:
+    """The stored records of the ids, unknown ids skipped."""
+    keys = (f"{PRODUCT_KEY_PREFIX}{pid}" for pid in ids)
+    return [state[key] for key in keys if key in state]
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import time
+
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+from app.utils.admission import current_deadline
+from app.utils.const import HTTP_TOTAL_TIMEOUT, MARKETPLACE_DEADLINE_SHARE, HEDGE_REQUESTS, \
+    HEDGE_MIN_SAMPLES
+from .cache import is_cacheable
+
+logger = logging.getLogger("uvicorn.error")
+
+# Latency samples kept per marketplace to estimate the p95
+LATENCY_WINDOW = 200
+
+
+def _percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class MarketplaceLatency:
+    """Rolling latency window, deadline misses and hedges per marketplace."""
+
+    def __init__(self, window: int = LATENCY_WINDOW, min_samples: int = HEDGE_MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self.samples: dict[str, deque[float]] = {}
+        self.deadline_misses: dict[str, int] = {}
+        self.hedges: dict[str, int] = {}
+        self.hedge_wins: dict[str, int] = {}
+
+    def observe(self, marketplace: str, seconds: float):
+        self.samples.setdefault(marketplace, deque(maxlen=self.window)).append(seconds)
+
+    def p95(self, marketplace: str) -> Optional[float]:
+        samples = self.samples.get(marketplace)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        return _percentile(samples, 95)
+
+    @staticmethod
+    def count(bucket: dict[str, int], marketplace: str):
+        bucket[marketplace] = bucket.get(marketplace, 0) + 1
+
+    def stats(self) -> dict:
+        return {marketplace: {"samples": len(samples),
+                              "p50_s": round(_percentile(samples, 50), 3),
+                              "p95_s": round(_percentile(samples, 95), 3),
+                              "deadline_misses": self.deadline_misses.get(marketplace, 0),
+                              "hedges": self.hedges.get(marketplace, 0),
+                              "hedge_wins": self.hedge_wins.get(marketplace, 0)}
+                for marketplace, samples in self.samples.items() if samples}
+
+
+marketplace_latency = MarketplaceLatency()
+
+
+def marketplace_budget(share: float = MARKETPLACE_DEADLINE_SHARE) -> float:
+    """Seconds a marketplace search may take: a share of what is left of the request deadline."""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return HTTP_TOTAL_TIMEOUT
+    return max(0.0, min(HTTP_TOTAL_TIMEOUT, (deadline - time.monotonic()) * share))
+
+
+def deadline_result(marketplace: str, item: str, budget: float) -> dict:
+    return {
+        "error": "deadline_exceeded",
+        "marketplace": marketplace,
+        "budget_s": round(budget, 1),
+        "msg": f"Search for {item} on {marketplace} did not answer within {budget:.1f}s, "
+               f"continue with the other marketplaces",
+    }
+
+
+async def with_deadline(marketplace: str, item: str, call: Callable[[], Awaitable[Any]]) -> Any:
+    """Run call within the marketplace budget, returning a deadline result when it is missed.
+
+    The call itself is not cancelled: a late answer still fills the deals cache.
+    """
+    budget = marketplace_budget()
+    task = asyncio.ensure_future(call())
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), budget)
+    except asyncio.TimeoutError:
+        marketplace_latency.count(marketplace_latency.deadline_misses, marketplace)
+        logger.warning(f"⌛ {marketplace} missed its {budget:.1f}s budget for {item!r}")
+        return deadline_result(marketplace, item, budget)
+
+
+async def hedged(marketplace: str, call: Callable[[], Awaitable[Any]], enabled: bool = HEDGE_REQUESTS) -> Any:
+    """Send a second identical request when the first is slower than the marketplace p95.
+
+    The first successful answer wins and the other request is cancelled.
+    """
+    started = time.perf_counter()
+    delay = marketplace_latency.p95(marketplace) if enabled else None
+    first = asyncio.ensure_future(call())
+    pending = {first}
+    if delay is not None:
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if not done:
+            marketplace_latency.count(marketplace_latency.hedges, marketplace)
+            pending.add(asyncio.ensure_future(call()))
+        else:
+            pending = done
+    result = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if is_cacheable(result):
+                    if task is not first:
+                        marketplace_latency.count(marketplace_latency.hedge_wins, marketplace)
+                    marketplace_latency.observe(marketplace, time.perf_counter() - started)
+                    return result
+        return result
+    finally:
+        for task in pending:
+            task.cancel()
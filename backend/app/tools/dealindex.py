@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: every worker refreshes
+    fcntl = None
+
+from typing import Optional
+from google.adk.tools.tool_context import ToolContext
+from app.utils.const import PRODUCT_ID_HANDOFF, DEAL_INDEX_PATH, DEAL_INDEX_CATEGORIES, DEAL_INDEX_REFRESH_INTERVAL, \
+    DEAL_INDEX_MAX_AGE, DEAL_INDEX_PER_CATEGORY
+from .aggregation import Product, aggregate_products
+from .catalog import store_products
+from .marketplaces import MARKETPLACES
+
+logger = logging.getLogger("uvicorn.error")
+
+_WORD = re.compile(r"\w+")
+
+PRODUCT_COLUMNS = Product.__slots__
+
+
+def parse_categories(spec: str = DEAL_INDEX_CATEGORIES) -> list[str]:
+    return list(dict.fromkeys(" ".join(category.split()).lower() for category in spec.split(",")
+                              if category.strip()))
+
+
+class DealIndex:
+    """Normalized deals of popular categories in sqlite, searched with FTS5.
+
+    Each refresh replaces the deals of one category in a single transaction.
+    Lookups match every query word (as a prefix) against titles and category
+    names and return the deals in the products JSON shape, best discount first.
+    The connection is opened on first use.
+    """
+
+    def __init__(self, path: str = DEAL_INDEX_PATH, max_age: float = DEAL_INDEX_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.lookups = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._refresh_lock = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"""CREATE TABLE IF NOT EXISTS deals (
+                id INTEGER PRIMARY KEY,
+                category TEXT NOT NULL,
+                discount REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                {", ".join(PRODUCT_COLUMNS)})""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS deals_category ON deals (category)")
+            self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS deals_fts USING fts5(title, category)")
+            self._conn.commit()
+        return self._conn
+
+    def replace_category(self, category: str, products: list[dict]):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM deals_fts WHERE rowid IN (SELECT id FROM deals WHERE category = ?)",
+                             (category,))
+                conn.execute("DELETE FROM deals WHERE category = ?", (category,))
+                for product in products:
+                    price, original = product["product_price"], product["product_original_price"]
+                    discount = 1 - price / original if price and original and original > price else 0.0
+                    cursor = conn.execute(
+                        f"INSERT INTO deals (category, discount, updated_at, {', '.join(PRODUCT_COLUMNS)}) "
+                        f"VALUES (?, ?, ?, {', '.join('?' * len(PRODUCT_COLUMNS))})",
+                        (category, discount, now, *(product[column] for column in PRODUCT_COLUMNS)))
+                    conn.execute("INSERT INTO deals_fts (rowid, title, category) VALUES (?, ?, ?)",
+                                 (cursor.lastrowid, product["product_title"], category))
+
+    def search(self, query: str, max_price: Optional[float] = None, limit: int = 20) -> list[dict]:
+        words = _WORD.findall(query.lower())
+        self.lookups += 1
+        if not words:
+            return []
+        match = " ".join(f'"{word}"*' for word in words)
+        sql = f"""SELECT {", ".join(f"d.{column}" for column in PRODUCT_COLUMNS)}
+            FROM deals_fts JOIN deals d ON d.id = deals_fts.rowid
+            WHERE deals_fts MATCH ? AND d.updated_at >= ?"""
+        params: list = [match, time.time() - self.max_age]
+        if max_price:
+            sql += " AND d.product_price <= ?"
+            params.append(max_price)
+        sql += " ORDER BY d.discount DESC, d.product_star_rating DESC, d.product_price LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._connection().execute(sql, params).fetchall()
+        if rows:
+            self.hits += 1
+        return [dict(zip(PRODUCT_COLUMNS, row)) for row in rows]
+
+    def open(self):
+        """Open the index file now, so the first lookup does not pay for it."""
+        with self._lock:
+            self._connection()
+
+    def stats(self) -> dict:
+        """Counts of the open index; an index not opened yet reports none rather than creating its file."""
+        categories, deals, refreshed = 0, 0, None
+        with self._lock:
+            if self._conn is not None:
+                categories, deals, refreshed = self._conn.execute(
+                    "SELECT COUNT(DISTINCT category), COUNT(*), MAX(updated_at) FROM deals").fetchone()
+        return {"categories": categories,
+                "deals": deals,
+                "last_refresh": refreshed,
+                "lookups": self.lookups,
+                "hits": self.hits}
+
+    def claim_refresh(self) -> bool:
+        """With several workers on the same index file, only the first one to claim it refreshes."""
+        if fcntl is None or self.path == ":memory:":
+            return True
+        lock = open(f"{self.path}.lock", "w")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            return False
+        self._refresh_lock = lock
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        if self._refresh_lock is not None:
+            self._refresh_lock.close()
+            self._refresh_lock = None
+
+
+deal_index = DealIndex()
+
+
+async def refresh_category(index: DealIndex, category: str, limit: int = DEAL_INDEX_PER_CATEGORY) -> int:
+    """Search a category on every marketplace and replace its deals in the index."""
+    names = list(MARKETPLACES)
+    results = await asyncio.gather(*(MARKETPLACES[name].search(category) for name in names),
+                                   return_exceptions=True)
+    payloads = [(name, result) for name, result in zip(names, results) if not isinstance(result, Exception)]
+    merged = aggregate_products(payloads, limit=limit, marketplaces=names)
+    if not merged["products"]:
+        # Keep the previous deals rather than emptying the category
+        logger.warning(f"⚠️ No deals for {category!r} ({merged['marketplace_status']}), index not updated")
+        return 0
+    await asyncio.to_thread(index.replace_category, category, merged["products"])
+    return len(merged["products"])
+
+
+async def run_deal_index_refresher(index: DealIndex, categories: list[str],
+                                   interval: float = DEAL_INDEX_REFRESH_INTERVAL):
+    """Refresh every category, one at a time so live searches keep most of the upstream budget."""
+    while True:
+        started = time.perf_counter()
+        indexed = 0
+        for category in categories:
+            try:
+                indexed += await refresh_category(index, category)
+            except Exception as e:
+                logger.error(f"❌ Error while indexing {category!r}: {e}")
+        logger.info(f"🗂️ Deal index refreshed: {indexed} deals in {len(categories)} categories "
+                    f"in {time.perf_counter() - started:.1f}s")
+        await asyncio.sleep(interval)
+
+
+def search_deal_index(query: str, max_price: Optional[float] = None,
+                      tool_context: Optional[ToolContext] = None) -> dict:
+    """Look up precomputed deals of popular gift categories, best discount first.
+
+    Args:
+        query: Product or category name.
+        max_price: Optional price cap in EUR.
+
+    Returns:
+        The matching products, each with its id, or a msg when the index has no deals for the query.
+    """
+    products = deal_index.search(query, max_price)
+    if not products:
+        return {"msg": f"No indexed deals for {query}, search the marketplaces"}
+    if PRODUCT_ID_HANDOFF and tool_context is not None:
+        return {"products": store_products(tool_context.state, products)}
+    return {"products": products}
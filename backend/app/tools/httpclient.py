@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+import aiohttp
+
+from urllib.parse import urlsplit
+from app.utils.const import HTTP_LIMIT_PER_HOST, HTTP_DNS_CACHE_TTL, \
+    HTTP_KEEPALIVE_TIMEOUT, HTTP_TOTAL_TIMEOUT, HTTP_CONNECT_TIMEOUT
+from app.utils.metrics import record_http
+
+logger = logging.getLogger("uvicorn.error")
+
+
+async def _on_request_start(session, context, params):
+    context.started = time.perf_counter()
+
+
+async def _on_request_end(session, context, params):
+    record_http(params.url.host, str(params.response.status), time.perf_counter() - context.started)
+
+
+async def _on_request_exception(session, context, params):
+    record_http(params.url.host, type(params.exception).__name__, time.perf_counter() - context.started)
+
+
+def _build_trace_config() -> aiohttp.TraceConfig:
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_request_end.append(_on_request_end)
+    trace_config.on_request_exception.append(_on_request_exception)
+    return trace_config
+
+
+class HttpClientPool:
+    """Keeps one keep-alive aiohttp session per upstream host.
+
+    Sessions are bound to the event loop that created them, so a session is
+    rebuilt transparently when it is requested from a different loop
+    (e.g. between test cases); the stale one is closed, not leaked.
+    """
+
+    def __init__(self,
+                 limit_per_host: int = HTTP_LIMIT_PER_HOST,
+                 dns_cache_ttl: int = HTTP_DNS_CACHE_TTL,
+                 keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT,
+                 total_timeout: float = HTTP_TOTAL_TIMEOUT,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT):
+        self.limit_per_host = limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout,
+                                             connect=connect_timeout)
+        self._sessions: dict[str, tuple[asyncio.AbstractEventLoop, aiohttp.ClientSession]] = {}
+        self._closing: set[asyncio.Task] = set()
+
+    def _build_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(limit=0,
+                                         limit_per_host=self.limit_per_host,
+                                         use_dns_cache=True,
+                                         ttl_dns_cache=self.dns_cache_ttl,
+                                         keepalive_timeout=self.keepalive_timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                     trace_configs=[_build_trace_config()])
+
+    def session(self, base_url: str) -> aiohttp.ClientSession:
+        """Return the pooled session for the host of base_url."""
+        host = urlsplit(base_url).netloc or base_url
+        loop = asyncio.get_running_loop()
+        entry = self._sessions.get(host)
+        if entry is not None:
+            session_loop, session = entry
+            if session_loop is loop and not session.closed:
+                return session
+            self._close_stale(session_loop, session)
+        session = self._build_session()
+        self._sessions[host] = (loop, session)
+        logger.info(f"✅ HTTP pool opened for {host}")
+        return session
+
+    def _close_stale(self, session_loop: asyncio.AbstractEventLoop, session: aiohttp.ClientSession):
+        """Close a session of another event loop, it cannot be awaited from the running one."""
+        if session.closed:
+            return
+        if session_loop.is_running():
+            asyncio.run_coroutine_threadsafe(session.close(), session_loop)
+            return
+        if session_loop.is_closed():
+            # Nothing is left to wait for on a closed loop, the connector drops its connections right away
+            closing = session.close()
+        else:
+            # A stopped loop may never run again: run it just for the close, from a worker thread
+            closing = asyncio.to_thread(session_loop.run_until_complete, session.close())
+        task = asyncio.get_running_loop().create_task(closing)
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def open(self, base_urls: list[str]):
+        """Eagerly create the sessions for the given upstreams."""
+        for base_url in base_urls:
+            self.session(base_url)
+
+    async def close(self):
+        """Close every pooled session and its connector."""
+        loop = asyncio.get_running_loop()
+        sessions, self._sessions = self._sessions, {}
+        for host, (session_loop, session) in sessions.items():
+            if session_loop is loop and not session.closed:
+                await session.close()
+            else:
+                self._close_stale(session_loop, session)
+            logger.info(f"🛑 HTTP pool closed for {host}")
+
+    def stats(self) -> dict:
+        return {
+            "hosts": sorted(self._sessions.keys()),
+            "limit_per_host": self.limit_per_host,
+            "dns_cache_ttl": self.dns_cache_ttl,
+        }
+
+
+http_pool = HttpClientPool()
+
+
+def get_http_session(base_url: str) -> aiohttp.ClientSession:
+    return http_pool.session(base_url)
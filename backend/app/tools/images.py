@@ -0,0 +1,261 @@
+import asyncio
+import hashlib
+import io
+import logging
+
+from typing import NamedTuple, Optional
+from urllib.parse import quote, urljoin, urlsplit
+
+import aiohttp
+
+from PIL import Image
+
+from app.utils.const import IMAGE_PROXY_BASE_URL, IMAGE_ALLOWED_HOSTS, IMAGE_WIDTHS, IMAGE_DEFAULT_WIDTH, \
+    IMAGE_QUALITY, IMAGE_MAX_SOURCE_BYTES, IMAGE_CACHE_BACKEND, IMAGE_CACHE_PATH, IMAGE_CACHE_MAX_BYTES, \
+    IMAGE_CACHE_TTL, IMAGE_FETCH_TIMEOUT, IMAGE_FETCH_CONNECTIONS, HTTP_CONNECT_TIMEOUT, HTTP_DNS_CACHE_TTL, \
+    HTTP_KEEPALIVE_TIMEOUT
+from .cache import build_cache_backend
+
+logger = logging.getLogger("uvicorn.error")
+
+IMAGE_PROXY_PATH = "/api/images"
+REDIRECT_STATUS = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 3
+
+
+def parse_widths(spec: str) -> tuple[int, ...]:
+    """Parse "160,320,640" into the sorted thumbnail widths."""
+    return tuple(sorted({int(width) for width in spec.split(",") if width.strip()}))
+
+
+def parse_hosts(spec: str) -> tuple[str, ...]:
+    return tuple(host.strip().lower() for host in spec.split(",") if host.strip())
+
+
+class ImageProxyError(Exception):
+    """The photo cannot be served; status is the HTTP status answered to the client."""
+
+    def __init__(self, message: str, status: int = 502):
+        super().__init__(message)
+        self.status = status
+
+
+class CachedImage(NamedTuple):
+    data: bytes
+    content_type: str
+    etag: str
+
+
+def make_thumbnail(data: bytes, width: int, quality: int = IMAGE_QUALITY) -> Optional[tuple[bytes, str]]:
+    """The photo scaled down to width, as (bytes, content type); None when it is kept as is.
+
+    Photos already narrow enough and unreadable ones are served unchanged.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width <= width:
+                return None
+            # draft() lets the JPEG decoder downscale while decoding, the costly part for large photos
+            image.draft("RGB", (width, image.height * width // image.width))
+            height = max(1, round(image.height * width / image.width))
+            transparent = image.mode in ("RGBA", "LA") or "transparency" in image.info
+            thumbnail = image.convert("RGBA" if transparent else "RGB").resize((width, height), Image.LANCZOS)
+        output = io.BytesIO()
+        if transparent:
+            thumbnail.save(output, "PNG", optimize=True)
+            return output.getvalue(), "image/png"
+        thumbnail.save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+        return output.getvalue(), "image/jpeg"
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"⚠️ Product photo not resized: {e}")
+        return None
+
+
+class ImageProxy:
+    """Serves the marketplace product photos resized, from an on-disk LRU cache.
+
+    A photo is fetched once; the cache maps its URL to the hash of its
+    content, and each width is stored under that content hash, so the same
+    photo behind several URLs is stored once per width and its ETag never
+    changes. Only hosts of allowed_hosts and their subdomains are fetched,
+    redirects included: the proxy is not an open one. Concurrent requests
+    for a photo not cached yet share a single fetch. The CDNs spread their
+    photos over many subdomains, so they are all downloaded through one
+    session of their own, with max_connections connections at most and
+    fetch_timeout, rather than through the marketplace API pool. The cache
+    and the session are opened on first use.
+    """
+
+    def __init__(self,
+                 backend=None,
+                 allowed_hosts: tuple[str, ...] = parse_hosts(IMAGE_ALLOWED_HOSTS),
+                 widths: tuple[int, ...] = parse_widths(IMAGE_WIDTHS),
+                 default_width: int = IMAGE_DEFAULT_WIDTH,
+                 max_source_bytes: int = IMAGE_MAX_SOURCE_BYTES,
+                 ttl: float = IMAGE_CACHE_TTL,
+                 base_url: str = IMAGE_PROXY_BASE_URL,
+                 fetch_timeout: float = IMAGE_FETCH_TIMEOUT,
+                 max_connections: int = IMAGE_FETCH_CONNECTIONS):
+        self._backend = backend
+        self.allowed_hosts = allowed_hosts
+        self.widths = widths
+        self.default_width = default_width
+        self.max_source_bytes = max_source_bytes
+        self.ttl = ttl
+        self.base_url = base_url.rstrip("/")
+        self.timeout = aiohttp.ClientTimeout(total=fetch_timeout, connect=min(fetch_timeout, HTTP_CONNECT_TIMEOUT))
+        self.max_connections = max_connections
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.resized = 0
+        self.errors = 0
+        self._inflight: dict[tuple[str, int], asyncio.Future] = {}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = build_cache_backend(kind=IMAGE_CACHE_BACKEND, path=IMAGE_CACHE_PATH,
+                                                max_bytes=IMAGE_CACHE_MAX_BYTES)
+        return self._backend
+
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections,
+                                             ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+                                             keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def allowed(self, url: str) -> bool:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        return parts.scheme in ("http", "https") and \
+            any(host == allowed or host.endswith(f".{allowed}") for allowed in self.allowed_hosts)
+
+    def width(self, requested: Optional[int] = None) -> int:
+        """The served width for a requested one: the next configured width, so few variants get cached."""
+        requested = requested or self.default_width
+        return next((width for width in self.widths if width >= requested), self.widths[-1])
+
+    def proxy_url(self, url: str, width: Optional[int] = None) -> str:
+        """The proxied URL of a product photo; URLs of other hosts are returned unchanged."""
+        if not url or not self.allowed(url):
+            return url
+        return f"{self.base_url}{IMAGE_PROXY_PATH}?w={self.width(width)}&url={quote(url, safe=':/')}"
+
+    async def get(self, url: str, width: int) -> CachedImage:
+        if not self.allowed(url):
+            raise ImageProxyError(f"Host not allowed: {urlsplit(url).hostname}", status=403)
+        cached = await self._cached(url, width)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        key = (url, width)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The leading request was cancelled, not this one: lead a new fetch or join it
+                return await self.get(url, width)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            image = await self._fetch(url, width)
+            future.set_result(image)
+            return image
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.errors += 1
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody is waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    @staticmethod
+    def _source_key(url: str) -> str:
+        return f"image-source:{hashlib.blake2b(url.encode(), digest_size=16).hexdigest()}"
+
+    @staticmethod
+    def _image_key(digest: str, width: int) -> str:
+        return f"image:{digest}:{width}"
+
+    async def _cached(self, url: str, width: int) -> Optional[CachedImage]:
+        digest = await self.backend.get(self._source_key(url))
+        if digest is None:
+            return None
+        entry = await self.backend.get(self._image_key(digest.decode(), width))
+        if entry is None:
+            return None
+        content_type, _, data = entry.partition(b"\n")
+        return CachedImage(data, content_type.decode(), f'"{digest.decode()}-{width}"')
+
+    async def _download(self, url: str) -> tuple[bytes, str]:
+        """The photo and its content type, following redirects only towards allowed hosts."""
+        session = self.session()
+        for _ in range(MAX_REDIRECTS + 1):
+            try:
+                async with session.get(url, headers={"Accept": "image/*"}, allow_redirects=False) as response:
+                    if response.status in REDIRECT_STATUS and response.headers.get("Location"):
+                        url = urljoin(url, response.headers["Location"])
+                        if not self.allowed(url):
+                            raise ImageProxyError(f"Redirected to a host not allowed: {urlsplit(url).hostname}")
+                        continue
+                    if response.status != 200:
+                        raise ImageProxyError(f"Upstream answered {response.status}",
+                                              status=404 if response.status == 404 else 502)
+                    content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+                    if not content_type.startswith("image/"):
+                        raise ImageProxyError(f"Not an image: {content_type or 'no content type'}")
+                    if (response.content_length or 0) > self.max_source_bytes:
+                        raise ImageProxyError("Image too large")
+                    data = bytearray()
+                    async for chunk in response.content.iter_chunked(64 * 1024):
+                        data.extend(chunk)
+                        if len(data) > self.max_source_bytes:
+                            raise ImageProxyError("Image too large")
+                    return bytes(data), content_type
+            except asyncio.TimeoutError as e:
+                raise ImageProxyError("Upstream timed out", status=504) from e
+            except aiohttp.ClientError as e:
+                raise ImageProxyError(f"Upstream unreachable: {e}") from e
+        raise ImageProxyError("Too many redirects")
+
+    async def _fetch(self, url: str, width: int) -> CachedImage:
+        data, content_type = await self._download(url)
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        thumbnail = await asyncio.to_thread(make_thumbnail, data, width)
+        if thumbnail is not None:
+            self.resized += 1
+            data, content_type = thumbnail
+        await self.backend.set(self._image_key(digest, width), content_type.encode() + b"\n" + data, self.ttl)
+        await self.backend.set(self._source_key(url), digest.encode(), self.ttl)
+        return CachedImage(data, content_type, f'"{digest}-{width}"')
+
+    def stats(self) -> dict:
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "resized": self.resized,
+                "errors": self.errors,
+                **(self._backend.stats() if self._backend is not None else {})}
+
+
+image_proxy = ImageProxy()
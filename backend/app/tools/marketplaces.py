@@ -0,0 +1,208 @@
+import asyncio
+import json
+import logging
+import time
+
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Optional
+from urllib.parse import urlsplit
+from google.adk.tools.tool_context import ToolContext
+from app.utils import RAPIDAPI_API_KEY
+from app.utils.admission import upstream_limits
+from app.utils.const import STALE_TTL, PRODUCT_ID_HANDOFF
+from .aggregation import MARKETPLACE_MAPPERS, Product, aggregate_products
+from .breaker import circuit_breakers, circuit_open_result
+from .catalog import store_products
+from .cache import deals_cache, stale_store, make_cache_key, is_cacheable
+from .deadlines import with_deadline, hedged
+from .httpclient import get_http_session
+from .pruning import PAYLOAD_SPECS, prune_payload, format_payload
+from .ratelimit import rate_limiter
+
+logger = logging.getLogger("uvicorn.error")
+
+# Most product names searched by a single batch tool call
+BATCH_MAX_PRODUCTS = 10
+
+
+class MarketplaceAdapter(ABC):
+    """How to search one RapidAPI marketplace and read its answers.
+
+    A subclass declares the endpoint, maps the tool arguments to query
+    parameters (build_params) and normalizes the payload into products
+    (normalize). concurrency and rate are the defaults of the upstream
+    concurrency budget and of the requests per second of its host;
+    UPSTREAM_CONCURRENCY and RAPIDAPI_RATE_LIMITS still override them.
+    Requests share the deals cache, deadlines, rate limiter, circuit breaker
+    and HTTP pool; when a search fails, its last known good payload is served
+    marked as stale.
+    """
+
+    name: str = ""
+    base_url: str = ""
+    path: str = ""
+    cache_ttl: int = 900
+    concurrency: Optional[int] = None
+    rate: Optional[float] = None
+    # Items path and fields kept by payload pruning, see pruning.PAYLOAD_SPECS
+    payload_spec: Optional[dict] = None
+    # Whether sortby is sent upstream, otherwise it must not split the cache
+    forwards_sortby: bool = True
+
+    def __init__(self):
+        self.tool: Optional[Callable] = None
+
+    @property
+    def key(self) -> str:
+        return self.name.lower()
+
+    @property
+    def host(self) -> str:
+        return urlsplit(self.base_url).netloc or self.base_url
+
+    @abstractmethod
+    def build_params(self, item: str, max_price: Optional[float], sortby: Optional[str]) -> dict:
+        """The query parameters of a search."""
+
+    @abstractmethod
+    def normalize(self, payload: dict) -> list[Product]:
+        """The products of a (pruned) search payload."""
+
+    def headers(self) -> dict:
+        return {"X-RAPIDAPI-KEY": RAPIDAPI_API_KEY}
+
+    async def search(self, item: str, max_price: Optional[float] = None, sortby: Optional[str] = None) -> Any:
+        """Search deals for item, returning the payload in the shape given to the agents."""
+        params = self.build_params(item, max_price, sortby)
+        key = make_cache_key(self.key, item, max_price, sortby if self.forwards_sortby else None,
+                             country="IT", currency="EUR")
+        # A slow marketplace answers with a deadline result instead of holding the others back
+        result = await with_deadline(self.name, item, lambda: deals_cache.get_or_fetch(
+            key, self.cache_ttl, lambda: hedged(self.name, lambda: self.fetch(item, params, key))))
+        if not is_cacheable(result):
+            stale = await self.last_known_good(key)
+            if stale is not None:
+                logger.warning(f"🕰️ {self.name} unavailable ({result.get('error', 'error')}), "
+                               f"serving {stale['stale_age_s']}s old deals for {item!r}")
+                return stale
+        return format_payload(self.key, result)
+
+    async def last_known_good(self, key: str) -> Optional[dict]:
+        cached = await stale_store.get(key)
+        if cached is None:
+            return None
+        entry = json.loads(cached)
+        return {**format_payload(self.key, entry["payload"]),
+                "stale": True,
+                "stale_age_s": round(time.time() - entry["fetched_at"])}
+
+    async def fetch(self, item: str, params: dict, key: str) -> Any:
+        breaker = circuit_breakers.get(self.host)
+        if not breaker.allow():
+            return circuit_open_result(self.name, item, breaker.retry_after())
+        healthy = None
+        trips = breaker.trips
+        try:
+            limited = await rate_limiter.acquire(self.base_url, item)
+            if limited:
+                return limited
+            search_api = f"{self.base_url}{self.path}"
+            session = get_http_session(self.base_url)
+            async with upstream_limits.slot(self.base_url), \
+                    session.get(search_api, headers=self.headers(), params=params) as response:
+                limited = rate_limiter.update(self.base_url, response.status, response.headers, item)
+                if limited:
+                    return limited
+                healthy = response.status < 500
+                if response.status == 200:
+                    payload = prune_payload(self.key, await response.json())
+                    await stale_store.set(key, json.dumps({"fetched_at": time.time(), "payload": payload}).encode(),
+                                          STALE_TTL)
+                    return payload
+                else:
+                    logger.error(f"❌ Error {self.name} Search API: {await response.text()}")
+                    return {"msg": f"No deals has been found for {item}"}
+        except Exception as e:
+            healthy = False
+            logger.error(f"❌ Error during call at {self.name} Search API: {e}")
+            return {}
+        finally:
+            breaker.record(healthy)
+            if breaker.trips > trips:
+                logger.warning(f"🔌 {self.name} circuit open after {breaker.failures} failures")
+
+    def as_tool(self) -> Callable:
+        """Single product search tool for the agents, named get_<key>_deals_by_product."""
+        async def search_deals(item: str, max_price: Optional[float] = None, sortby: Optional[str] = None):
+            return await self.search(item, max_price, sortby)
+        search_deals.__name__ = f"get_{self.key}_deals_by_product"
+        search_deals.__doc__ = f"Search the best deals for a product on {self.name}."
+        return search_deals
+
+
+MARKETPLACES: dict[str, MarketplaceAdapter] = {}
+
+
+def register_marketplace(adapter: MarketplaceAdapter, tool: Optional[Callable] = None) -> MarketplaceAdapter:
+    """Make a marketplace available to the agents, the aggregation and the batch search."""
+    adapter.tool = tool or adapter.as_tool()
+    MARKETPLACES[adapter.name] = adapter
+    MARKETPLACE_MAPPERS[adapter.name] = adapter.normalize
+    if adapter.payload_spec:
+        PAYLOAD_SPECS.setdefault(adapter.key, adapter.payload_spec)
+    if adapter.concurrency:
+        upstream_limits.budgets.setdefault(adapter.host, adapter.concurrency)
+    if adapter.rate:
+        rate_limiter.rates.setdefault(adapter.host, adapter.rate)
+    return adapter
+
+
+def marketplace_tools() -> dict[str, Callable]:
+    """Single product search tool of every registered marketplace, by marketplace name."""
+    return {name: adapter.tool for name, adapter in MARKETPLACES.items()}
+
+
+async def search_payloads(products: list[str],
+                          max_price: Optional[float] = None,
+                          marketplaces: Optional[list[str]] = None) -> list[tuple[str, Any]]:
+    """Search every product on every marketplace at once, returning (marketplace, payload) pairs."""
+    names = [name for name in marketplaces or MARKETPLACES if name in MARKETPLACES] or list(MARKETPLACES)
+    items = list(dict.fromkeys(" ".join(product.split()) for product in products if product.strip()))
+    items = items[:BATCH_MAX_PRODUCTS]
+    searches = [(name, item) for item in items for name in names]
+    results = await asyncio.gather(
+        *(MARKETPLACES[name].search(item, max_price) for name, item in searches),
+        return_exceptions=True)
+    payloads = []
+    for (name, item), result in zip(searches, results):
+        if isinstance(result, Exception):
+            logger.warning(f"search_marketplaces > {name} search for {item!r} failed: {result}")
+            result = {"error": "error"}
+        payloads.append((name, result))
+    return payloads
+
+
+async def search_marketplaces(products: list[str],
+                              max_price: Optional[float] = None,
+                              marketplaces: Optional[list[str]] = None,
+                              tool_context: Optional[ToolContext] = None) -> dict:
+    """Search the best deals of several products on several marketplaces with a single call.
+
+    Args:
+        products: Product names to search.
+        max_price: Optional price cap in EUR applied to every product.
+        marketplaces: Marketplace names to search, all of them when omitted.
+
+    Returns:
+        The merged products ranked by discount, each with its id, and the status of each marketplace.
+    """
+    names = [name for name in marketplaces or MARKETPLACES if name in MARKETPLACES] or list(MARKETPLACES)
+    payloads = await search_payloads(products, max_price, names)
+    merged = aggregate_products(payloads, marketplaces=names)
+    logger.info(f"search_marketplaces > {len(payloads) // max(1, len(names))} products x {len(names)} marketplaces -> "
+                f"{len(merged['products'])} products")
+    if tool_context is not None:
+        tool_context.state["products"] = merged
+        if PRODUCT_ID_HANDOFF:
+            return {**merged, "products": store_products(tool_context.state, merged["products"])}
+    return merged
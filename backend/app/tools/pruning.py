@@ -0,0 +1,133 @@
+import json
+import logging
+
+from typing import Any
+from app.utils.const import PAYLOAD_PRUNING, PAYLOAD_TOP_N, PAYLOAD_COLUMNAR
+
+logger = logging.getLogger("uvicorn.error")
+
+# Rough ratio used to turn saved bytes into saved prompt tokens
+BYTES_PER_TOKEN = 4
+
+# Where the item list lives in each payload and which item fields the agents use
+PAYLOAD_SPECS = {
+    "amazon": {
+        "items": ("data", "products"),
+        "fields": [
+            ("asin",),
+            ("product_title",),
+            ("product_byline",),
+            ("product_price",),
+            ("product_original_price",),
+            ("currency",),
+            ("product_star_rating",),
+            ("product_num_ratings",),
+            ("product_url",),
+            ("product_photo",),
+        ],
+    },
+    "alibaba": {
+        "items": ("result", "resultList"),
+        "fields": [
+            ("item", "itemId"),
+            ("item", "title"),
+            ("item", "itemUrl"),
+            ("item", "image"),
+            ("item", "averageStarRate"),
+            ("item", "sku", "def", "price"),
+            ("item", "sku", "def", "promotionPrice"),
+        ],
+    },
+}
+
+pruning_stats = {
+    "calls": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "tokens_saved": 0,
+}
+
+
+def _get_path(data: Any, path: tuple[str, ...]) -> Any:
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def _set_path(data: dict, path: tuple[str, ...], value: Any) -> dict:
+    node = data
+    for key in path[:-1]:
+        node = node.setdefault(key, {})
+    node[path[-1]] = value
+    return data
+
+
+def _project(item: dict, fields: list[tuple[str, ...]]) -> dict:
+    projected = {}
+    for field in fields:
+        value = _get_path(item, field)
+        if value is not None:
+            _set_path(projected, field, value)
+    return projected
+
+
+def _size(payload: Any) -> int:
+    return len(json.dumps(payload, separators=(",", ":")))
+
+
+def prune_payload(marketplace: str, payload: Any, top_n: int = PAYLOAD_TOP_N) -> Any:
+    """Keep the top_n items and only the whitelisted fields of a marketplace payload."""
+    spec = PAYLOAD_SPECS.get(marketplace)
+    if not PAYLOAD_PRUNING or spec is None or not isinstance(payload, dict):
+        return payload
+    items = _get_path(payload, spec["items"])
+    if not isinstance(items, list):
+        return payload
+    pruned = _set_path({}, spec["items"],
+                       [_project(item, spec["fields"]) for item in items[:top_n]])
+
+    bytes_in, bytes_out = _size(payload), _size(pruned)
+    tokens_saved = (bytes_in - bytes_out) // BYTES_PER_TOKEN
+    pruning_stats["calls"] += 1
+    pruning_stats["bytes_in"] += bytes_in
+    pruning_stats["bytes_out"] += bytes_out
+    pruning_stats["tokens_saved"] += tokens_saved
+    logger.info(f"✂️ {marketplace} payload pruned {bytes_in}B -> {bytes_out}B "
+                f"(~{tokens_saved} tokens saved)")
+    return pruned
+
+
+def to_columnar(marketplace: str, payload: Any) -> Any:
+    """Encode a pruned payload as {"columns": [...], "rows": [[...]]}."""
+    spec = PAYLOAD_SPECS.get(marketplace)
+    items = _get_path(payload, spec["items"]) if spec else None
+    if not isinstance(items, list):
+        return payload
+    return {
+        "format": "columnar",
+        "columns": [".".join(field) for field in spec["fields"]],
+        "rows": [[_get_path(item, field) for field in spec["fields"]] for item in items],
+    }
+
+
+def from_columnar(marketplace: str, payload: Any) -> Any:
+    """Rebuild the nested marketplace shape from a columnar payload."""
+    spec = PAYLOAD_SPECS.get(marketplace)
+    if spec is None or not isinstance(payload, dict) or payload.get("format") != "columnar":
+        return payload
+    fields = [tuple(column.split(".")) for column in payload["columns"]]
+    items = []
+    for row in payload["rows"]:
+        item = {}
+        for field, value in zip(fields, row):
+            if value is not None:
+                _set_path(item, field, value)
+        items.append(item)
+    return _set_path({}, spec["items"], items)
+
+
+def format_payload(marketplace: str, payload: Any, columnar: bool = PAYLOAD_COLUMNAR) -> Any:
+    """Final shape returned to the agents by the marketplace tools."""
+    return to_columnar(marketplace, payload) if columnar else payload
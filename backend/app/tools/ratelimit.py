@@ -0,0 +1,326 @@
+import asyncio
+import calendar
+import copy
+import json
+import logging
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: the quota file is not shared between processes
+    fcntl = None
+
+from datetime import datetime, timezone
+from typing import Mapping, Optional
+from urllib.parse import urlsplit
+from app.utils.const import RAPIDAPI_RATE_LIMITS, RAPIDAPI_DEFAULT_RATE, RAPIDAPI_MONTHLY_QUOTAS, \
+    RATE_LIMIT_MAX_WAIT, QUOTA_STATE_PATH, WEB_WORKERS
+
+logger = logging.getLogger("uvicorn.error")
+
+# Seconds between two writes of the quota file by run_quota_flusher, it is always written on shutdown
+QUOTA_FLUSH_INTERVAL = 5
+# Pause applied on a 429 without Retry-After
+DEFAULT_RETRY_AFTER = 1.0
+
+
+def parse_host_values(spec: str) -> dict[str, float]:
+    """Parse "real-time-amazon-data.p.rapidapi.com=5,aliexpress-datahub.p.rapidapi.com=1"."""
+    values = {}
+    for item in spec.split(","):
+        host, _, value = item.partition("=")
+        if host.strip() and value.strip():
+            values[host.strip()] = float(value)
+    return values
+
+
+def _host(base_url: str) -> str:
+    return urlsplit(base_url).netloc or base_url
+
+
+def _month(now: float) -> str:
+    return datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m")
+
+
+def _next_month(now: float) -> float:
+    date = datetime.fromtimestamp(now, timezone.utc)
+    year, month = (date.year + 1, 1) if date.month == 12 else (date.year, date.month + 1)
+    return float(calendar.timegm((year, month, 1, 0, 0, 0)))
+
+
+def _merge_counters(stored: dict[str, dict], state: dict[str, dict],
+                    pending: dict[str, int], synced: set[str]) -> dict[str, dict]:
+    """Fold the counters written by the other processes into ours."""
+    merged = dict(state)
+    for host, entry in stored.items():
+        ours = state.get(host)
+        if ours is None or ours.get("month") != entry.get("month"):
+            if ours is None or (entry.get("month") or "") > (ours.get("month") or ""):
+                merged[host] = entry
+            continue
+        if host in synced:
+            continue
+        merged[host] = {**entry, **{key: value for key, value in ours.items() if key != "used"}}
+        merged[host]["used"] = entry.get("used", 0) + pending.get(host, 0)
+    return merged
+
+
+def rate_limited_result(host: str, item: str, retry_after: float, reason: str) -> dict:
+    """Structured tool result telling the agent the search was not performed."""
+    return {
+        "error": "rate_limited",
+        "marketplace_host": host,
+        "reason": reason,
+        "retry_after": round(retry_after, 1),
+        "msg": f"Search for {item} not performed: {host} is rate limited ({reason}), do not retry",
+    }
+
+
+class TokenBucket:
+    """Requests per second with bursts up to capacity, paused on upstream 429s."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        pause = max(0.0, self.paused_until - now)
+        missing = max(0.0, 1 - self.tokens)
+        return max(pause, missing / self.rate if self.rate > 0 else float("inf"))
+
+    async def acquire(self, max_wait: float) -> Optional[float]:
+        """Take a token, waiting up to max_wait; returns the needed wait if that is too long."""
+        while True:
+            wait = self.wait_time()
+            if wait <= 0:
+                self.tokens -= 1
+                return None
+            if wait > max_wait:
+                return wait
+            await asyncio.sleep(wait)
+            max_wait -= wait
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = min(self.tokens, 0.0)
+
+
+class QuotaStore:
+    """Monthly request counters per host, persisted in a small JSON file.
+
+    Several worker processes can share the file: each flush adds the requests
+    counted since the previous one to what the file holds, under a file lock,
+    unless the upstream headers reported the exact usage in the meantime.
+    Counting a request never touches the file; run_quota_flusher writes it
+    from a worker thread while serving, flush() on shutdown.
+    """
+
+    def __init__(self, path: str = QUOTA_STATE_PATH, limits: Optional[dict[str, float]] = None):
+        self.path = path
+        self.limits = limits if limits is not None else parse_host_values(RAPIDAPI_MONTHLY_QUOTAS)
+        self.state: dict[str, dict] = self._read()
+        self._pending: dict[str, int] = {}
+        self._synced: set[str] = set()
+        self._dirty = False
+        self._flushed = 0.0
+
+    def _read(self) -> dict[str, dict]:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable quota file {self.path}: {e}")
+            return {}
+
+    def _entry(self, host: str, now: float) -> dict:
+        entry = self.state.get(host)
+        if entry is None or entry.get("month") != _month(now):
+            entry = {"month": _month(now), "used": 0}
+            if host in self.limits:
+                entry["limit"] = int(self.limits[host])
+            self.state[host] = entry
+        return entry
+
+    def record(self, host: str):
+        self._entry(host, time.time())["used"] += 1
+        self._pending[host] = self._pending.get(host, 0) + 1
+        self._dirty = True
+
+    def sync(self, host: str, limit: Optional[int], remaining: Optional[int], reset_in: Optional[float]):
+        """Align the counter with the quota reported by the upstream headers."""
+        now = time.time()
+        entry = self._entry(host, now)
+        if limit is not None:
+            entry["limit"] = limit
+            if remaining is not None:
+                entry["used"] = max(0, limit - remaining)
+                self._synced.add(host)
+                self._pending.pop(host, None)
+        if reset_in is not None:
+            entry["reset_at"] = now + reset_in
+        self._dirty = True
+
+    def exhausted_for(self, host: str) -> float:
+        """Seconds until the quota resets when it is used up, 0 otherwise."""
+        now = time.time()
+        entry = self._entry(host, now)
+        limit = entry.get("limit")
+        if limit is None or entry["used"] < limit:
+            return 0.0
+        reset_at = entry.get("reset_at") or _next_month(now)
+        return max(1.0, reset_at - now)
+
+    def _take(self) -> tuple[dict[str, int], set[str]]:
+        """The changes to write, the next ones are counted from scratch."""
+        pending, synced = self._pending, self._synced
+        self._pending, self._synced = {}, set()
+        self._dirty = False
+        self._flushed = time.monotonic()
+        return pending, synced
+
+    def _write(self, state: dict[str, dict], pending: dict[str, int], synced: set[str]) -> dict[str, dict]:
+        """Merge the counters with the file and write them under the file lock; blocking.
+
+        Counters of past months are dropped, so the file only holds the hosts used this month.
+        """
+        month = _month(time.time())
+        with open(f"{self.path}.lock", "w") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            merged = _merge_counters(self._read(), state, pending, synced)
+            merged = {host: entry for host, entry in merged.items() if (entry.get("month") or "") >= month}
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(merged, f)
+            os.replace(temp_path, self.path)
+        return merged
+
+    def flush(self, force: bool = False):
+        if not self.path or not self._dirty:
+            return
+        if not force and time.monotonic() - self._flushed < QUOTA_FLUSH_INTERVAL:
+            return
+        self.state = self._write(self.state, *self._take())
+
+    async def flush_async(self):
+        """Write the counters from a thread, the file lock can be held by another worker for a while."""
+        if not self.path or not self._dirty:
+            return
+        state = copy.deepcopy(self.state)
+        pending, synced = self._take()
+        try:
+            written = await asyncio.to_thread(self._write, state, pending, synced)
+        except Exception:
+            for host, count in pending.items():
+                if host not in self._synced:
+                    self._pending[host] = self._pending.get(host, 0) + count
+            self._synced |= synced
+            self._dirty = True
+            raise
+        # Requests counted and headers synced while the file was written go to the next flush
+        self.state = _merge_counters(written, self.state, self._pending, self._synced)
+
+def _header_number(headers: Mapping[str, str], name: str) -> Optional[float]:
+    value = headers.get(name)
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RateLimiter:
+    """Client side rate limiting and quota tracking of the RapidAPI hosts."""
+
+    def __init__(self,
+                 rates: Optional[dict[str, float]] = None,
+                 default_rate: float = RAPIDAPI_DEFAULT_RATE,
+                 max_wait: float = RATE_LIMIT_MAX_WAIT,
+                 quota: Optional[QuotaStore] = None,
+                 workers: int = WEB_WORKERS):
+        self.rates = rates if rates is not None else parse_host_values(RAPIDAPI_RATE_LIMITS)
+        self.default_rate = default_rate
+        # The host limits apply to the whole deployment, each worker gets its share
+        self.workers = max(1, workers)
+        self.max_wait = max_wait
+        self.quota = quota if quota is not None else QuotaStore()
+        self.rejected: dict[str, int] = {}
+        self.throttled: dict[str, int] = {}
+        self._buckets: dict[str, TokenBucket] = {}
+
+    def bucket(self, host: str) -> TokenBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = TokenBucket(self.rates.get(host, self.default_rate) / self.workers)
+            self._buckets[host] = bucket
+        return bucket
+
+    def _reject(self, host: str, item: str, retry_after: float, reason: str) -> dict:
+        self.rejected[host] = self.rejected.get(host, 0) + 1
+        logger.warning(f"⏳ {host} rate limited ({reason}), retry after {retry_after:.1f}s")
+        return rate_limited_result(host, item, retry_after, reason)
+
+    async def acquire(self, base_url: str, item: str) -> Optional[dict]:
+        """Wait for the host budget; returns a rate limited result instead of a doomed request."""
+        host = _host(base_url)
+        reset_in = self.quota.exhausted_for(host)
+        if reset_in:
+            return self._reject(host, item, reset_in, "monthly quota exhausted")
+        wait = await self.bucket(host).acquire(self.max_wait)
+        if wait is not None:
+            return self._reject(host, item, wait, "requests per second")
+        self.quota.record(host)
+        return None
+
+    def update(self, base_url: str, status: int, headers: Mapping[str, str], item: str = "") -> Optional[dict]:
+        """Adapt to the RapidAPI rate limit headers; returns a rate limited result on 429."""
+        host = _host(base_url)
+        limit = _header_number(headers, "X-RateLimit-Requests-Limit")
+        remaining = _header_number(headers, "X-RateLimit-Requests-Remaining")
+        reset_in = _header_number(headers, "X-RateLimit-Requests-Reset")
+        if limit is not None or reset_in is not None:
+            self.quota.sync(host,
+                            int(limit) if limit is not None else None,
+                            int(remaining) if remaining is not None else None,
+                            reset_in)
+        if status != 429:
+            return None
+        self.throttled[host] = self.throttled.get(host, 0) + 1
+        retry_after = _header_number(headers, "Retry-After") or DEFAULT_RETRY_AFTER
+        self.bucket(host).pause(retry_after)
+        return self._reject(host, item, retry_after, "upstream returned 429")
+
+    def stats(self) -> dict:
+        return {host: {"rate": bucket.rate,
+                       "tokens": round(bucket.tokens, 2),
+                       "rejected": self.rejected.get(host, 0),
+                       "throttled": self.throttled.get(host, 0),
+                       "quota": self.quota.state.get(host)}
+                for host, bucket in self._buckets.items()}
+
+    def close(self):
+        self.quota.flush(force=True)
+
+
+async def run_quota_flusher(store: QuotaStore, interval: float = QUOTA_FLUSH_INTERVAL):
+    """Periodically write the quota counters, off the event loop."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await store.flush_async()
+        except Exception as e:
+            logger.error(f"❌ Error while writing the quota file {store.path}: {e}")
+
+
+rate_limiter = RateLimiter()
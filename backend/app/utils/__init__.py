@@ -1,10 +1,26 @@
 from .const import RAPIDAPI_API_KEY
-from .utility import google_model, llm_model, run_session, configure_retry
+from .utility import model_for, model_router, run_session, configure_retry, \
+    get_or_create_session, record_turn, warm_up_models
+from .streaming import StreamingPlugin, stream_session
+from .sessions import build_session_service, run_session_janitor
+from .querycache import SemanticQueryCache, query_cache
+from .budget import ContextBudgetPlugin, context_budget_stats
 
 __all__ = [
     "RAPIDAPI_API_KEY",
-    "google_model"
-    "llm_model",
+    "model_for",
+    "model_router",
     "run_session",
-    "configure_retry"
+    "configure_retry",
+    "get_or_create_session",
+    "record_turn",
+    "warm_up_models",
+    "StreamingPlugin",
+    "stream_session",
+    "build_session_service",
+    "run_session_janitor",
+    "SemanticQueryCache",
+    "query_cache",
+    "ContextBudgetPlugin",
+    "context_budget_stats"
 ]
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import math
+import time
+
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+from urllib.parse import urlparse
+from .const import ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE, UPSTREAM_CONCURRENCY, \
+    UPSTREAM_DEFAULT_CONCURRENCY
+
+logger = logging.getLogger("uvicorn.error")
+
+# time.monotonic() by which the current request must be answered
+current_deadline: ContextVar[Optional[float]] = ContextVar("elf_request_deadline", default=None)
+
+# Weight of the latest request in the moving average of the service time
+SERVICE_TIME_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """The request was shed; the client should come back after retry_after seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounds the agent runs in flight and queues the rest fairly between users.
+
+    Waiting requests are kept in one FIFO per user and slots are handed out
+    round-robin across users, so a single client sending many queries cannot
+    starve the others. A request is shed with AdmissionRejected when the queue
+    is full, when the expected wait plus a typical run would overrun its
+    deadline, or when its deadline passes while it is still queued.
+    """
+
+    def __init__(self, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT, max_queue: int = ADMISSION_MAX_QUEUE):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+        self.service_time = 0.0
+        self._queues: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+        self._queued = 0
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def expected_wait(self) -> float:
+        """Seconds before a request queued now would start, from the average run time."""
+        if self.in_flight < self.max_in_flight and not self._queued:
+            return 0.0
+        return (self._queued + 1) / self.max_in_flight * self.service_time
+
+    def _reject(self, reason: str):
+        self.shed += 1
+        retry_after = max(1, math.ceil(self.expected_wait() or self.service_time))
+        logger.warning(f"⛔ Request shed ({reason}), retry after {retry_after}s")
+        raise AdmissionRejected(reason, retry_after)
+
+    async def acquire(self, user_id: str, deadline: Optional[float] = None):
+        """Wait for a slot; deadline is a time.monotonic() value."""
+        if self.in_flight < self.max_in_flight and not self._queued:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if self._queued >= self.max_queue:
+            self._reject("queue full")
+        if deadline is not None and time.monotonic() + self.expected_wait() + self.service_time > deadline:
+            self._reject("deadline cannot be met")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user_id, deque()).append(waiter)
+        self._queued += 1
+        timeout = None
+        if deadline is not None:
+            # Leave time for a typical run once the slot is granted
+            timeout = max(0.0, deadline - time.monotonic() - self.service_time)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted while timing out, hand it to the next request
+                self.release()
+            else:
+                waiter.cancel()
+                self._discard(user_id, waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject("deadline expired in queue")
+        self.admitted += 1
+
+    def _discard(self, user_id: str, waiter: asyncio.Future):
+        queue = self._queues.get(user_id)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._queued -= 1
+            if not queue:
+                del self._queues[user_id]
+
+    def release(self, service_time: Optional[float] = None):
+        if service_time is not None:
+            self.service_time = service_time if not self.service_time else \
+                SERVICE_TIME_ALPHA * service_time + (1 - SERVICE_TIME_ALPHA) * self.service_time
+        # Round-robin: serve the first user in line, then move them to the back
+        while self._queues:
+            user_id, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            if not waiter.done():
+                # The in-flight slot passes straight to the waiter
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def admit(self, user_id: str, deadline: Optional[float] = None):
+        await self.acquire(user_id, deadline)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        return {"max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queued": self._queued,
+                "admitted": self.admitted,
+                "shed": self.shed,
+                "avg_service_s": round(self.service_time, 3)}
+
+
+def parse_budgets(spec: str) -> dict[str, int]:
+    """Parse "gemini=8,litellm=4,real-time-amazon-data.p.rapidapi.com=5"."""
+    budgets = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            budgets[name.strip()] = int(value)
+    return budgets
+
+
+class UpstreamLimits:
+    """Separate concurrency budget per upstream (model provider or RapidAPI host)."""
+
+    def __init__(self, budgets: Optional[dict[str, int]] = None, default: int = UPSTREAM_DEFAULT_CONCURRENCY):
+        self.budgets = budgets if budgets is not None else parse_budgets(UPSTREAM_CONCURRENCY)
+        self.default = default
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._waiting: dict[str, int] = {}
+
+    @staticmethod
+    def upstream_name(name_or_url: str) -> str:
+        return urlparse(name_or_url).netloc or name_or_url
+
+    def _semaphore(self, name: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(name)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.budgets.get(name, self.default))
+            self._semaphores[name] = semaphore
+        return semaphore
+
+    @asynccontextmanager
+    async def slot(self, name_or_url: str):
+        name = self.upstream_name(name_or_url)
+        semaphore = self._semaphore(name)
+        self._waiting[name] = self._waiting.get(name, 0) + 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._waiting[name] -= 1
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    def stats(self) -> dict:
+        return {name: {"limit": self.budgets.get(name, self.default),
+                       "in_use": self.budgets.get(name, self.default) - semaphore._value,
+                       "waiting": self._waiting.get(name, 0)}
+                for name, semaphore in self._semaphores.items()}
+
+
+admission = AdmissionController()
+upstream_limits = UpstreamLimits()
@@ -0,0 +1,179 @@
+import json
+import logging
+import re
+
+from typing import Any, Optional
+
+from google.adk.models.llm_request import LlmRequest
+from google.adk.plugins.base_plugin import BasePlugin
+from google.genai import types
+
+from .const import CONTEXT_STATE_BUDGET, CONTEXT_MAX_TURNS
+from .metrics import Counter
+
+logger = logging.getLogger("uvicorn.error")
+
+# Same rough ratio as the payload pruning, good enough to compare prompt sizes
+CHARS_PER_TOKEN = 4
+# Marker ADK puts in front of the events of other agents replayed as user content
+FOR_CONTEXT = "For context:"
+
+_CODE_FENCE = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*```\s*$", re.DOTALL)
+
+CONTEXT_TOKENS_SAVED = Counter("elfagent_context_tokens_saved_total",
+                               "Estimated prompt tokens removed by the context budget", ("agent", "kind"))
+
+context_budget_stats = {
+    "model_calls": 0,
+    "tokens_before": 0,
+    "tokens_after": 0,
+    "state_capped": 0,
+    "turns_pruned": 0,
+}
+
+
+def _content_chars(content: types.Content) -> int:
+    size = 0
+    for part in content.parts or []:
+        if part.text:
+            size += len(part.text)
+        if part.function_call:
+            size += len(json.dumps(part.function_call.args or {}, default=str))
+        if part.function_response:
+            size += len(json.dumps(part.function_response.response or {}, default=str))
+    return size
+
+
+def request_tokens(llm_request: LlmRequest) -> int:
+    """Estimated prompt tokens of the system instruction and the contents."""
+    instruction = llm_request.config.system_instruction if llm_request.config else None
+    chars = len(instruction) if isinstance(instruction, str) else 0
+    return (chars + sum(_content_chars(content) for content in llm_request.contents)) // CHARS_PER_TOKEN
+
+
+def _parse_json_text(text: str) -> Any:
+    match = _CODE_FENCE.match(text)
+    try:
+        return json.loads(match.group(1) if match else text)
+    except ValueError:
+        return None
+
+
+def _longest_list(value: Any) -> Optional[list]:
+    longest = None
+    stack = [value]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            if len(node) > 1 and (longest is None or len(node) > len(longest)):
+                longest = node
+            stack.extend(node)
+    return longest
+
+
+def compact_value(value: Any, max_chars: int) -> str:
+    """Render a state value in at most max_chars.
+
+    JSON values (dicts, lists or JSON text, code fences included) are written
+    without whitespace and their longest lists halved until they fit, so the
+    first, best ranked entries are kept whole. Anything else is truncated.
+    """
+    data = _parse_json_text(value) if isinstance(value, str) else value
+    if isinstance(data, (dict, list)):
+        data = json.loads(json.dumps(data, default=str))
+        text = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+        while len(text) > max_chars:
+            longest = _longest_list(data)
+            if longest is None:
+                break
+            del longest[(len(longest) + 1) // 2:]
+            text = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+    else:
+        text = str(value)
+    if len(text) > max_chars:
+        text = f"{text[:max_chars].rsplit(' ', 1)[0]} …[truncated {len(text) - max_chars} chars]"
+    return text
+
+
+def cap_injected_state(instruction: str, state: dict, max_chars: int) -> tuple[str, list[str]]:
+    """Replace the state values injected in the instruction by {key} placeholders with capped ones."""
+    capped = []
+    for key, value in state.items():
+        if value is None:
+            continue
+        injected = str(value)
+        if len(injected) <= max_chars or injected not in instruction:
+            continue
+        instruction = instruction.replace(injected, compact_value(value, max_chars))
+        capped.append(key)
+    return instruction, capped
+
+
+def _is_turn_start(content: types.Content) -> bool:
+    if content.role != "user" or not content.parts:
+        return False
+    if content.parts[0].text == FOR_CONTEXT:
+        return False
+    return any(part.text for part in content.parts)
+
+
+def prune_turns(contents: list[types.Content], max_turns: int) -> tuple[list[types.Content], int]:
+    """Keep the current user turn and the max_turns before it; returns (contents, turns dropped)."""
+    starts = [index for index, content in enumerate(contents) if _is_turn_start(content)]
+    if not max_turns or len(starts) <= max_turns + 1:
+        return contents, 0
+    first_kept = starts[-(max_turns + 1)]
+    return contents[first_kept:], len(starts) - max_turns - 1
+
+
+class ContextBudgetPlugin(BasePlugin):
+    """Caps what every model call of every (nested) agent sends as prompt.
+
+    State values injected in the instruction beyond state_budget tokens are
+    compacted, and only the last max_turns user turns of the history are kept.
+    Estimated prompt tokens are summed per agent invocation and logged with
+    the savings when the agent run ends.
+    """
+
+    def __init__(self, state_budget: int = CONTEXT_STATE_BUDGET, max_turns: int = CONTEXT_MAX_TURNS):
+        super().__init__(name="elf_context_budget")
+        self.max_chars = state_budget * CHARS_PER_TOKEN
+        self.max_turns = max_turns
+        self._invocations: dict[tuple[str, str], list[int]] = {}
+
+    async def before_model_callback(self, *, callback_context, llm_request: LlmRequest):
+        agent = callback_context.agent_name
+        before = request_tokens(llm_request)
+        capped = []
+        instruction = llm_request.config.system_instruction if llm_request.config else None
+        if isinstance(instruction, str):
+            llm_request.config.system_instruction, capped = cap_injected_state(
+                instruction, callback_context.state.to_dict(), self.max_chars)
+        after_state = request_tokens(llm_request)
+        llm_request.contents, pruned = prune_turns(llm_request.contents, self.max_turns)
+        after = request_tokens(llm_request)
+
+        context_budget_stats["model_calls"] += 1
+        context_budget_stats["tokens_before"] += before
+        context_budget_stats["tokens_after"] += after
+        context_budget_stats["state_capped"] += len(capped)
+        context_budget_stats["turns_pruned"] += pruned
+        CONTEXT_TOKENS_SAVED.inc(before - after_state, agent=agent, kind="state")
+        CONTEXT_TOKENS_SAVED.inc(after_state - after, agent=agent, kind="history")
+        totals = self._invocations.setdefault((callback_context.invocation_id, agent), [0, 0, 0])
+        totals[0] += 1
+        totals[1] += after
+        totals[2] += before - after
+        if capped or pruned:
+            logger.info(f"✂️ {agent} prompt ~{before} -> ~{after} tokens "
+                        f"(capped {capped or 'no state'}, {pruned} old turns pruned)")
+        return None
+
+    async def after_agent_callback(self, *, agent, callback_context):
+        totals = self._invocations.pop((callback_context.invocation_id, agent.name), None)
+        if totals:
+            calls, tokens, saved = totals
+            logger.info(f"📏 {agent.name}: {calls} model calls, ~{tokens} prompt tokens, ~{saved} saved")
+        return None
@@ -0,0 +1,58 @@
+from websockets.extensions import permessage_deflate
+from websockets.frames import OP_CONT, CTRL_OPCODES, Frame
+from uvicorn.protocols.websockets.websockets_sansio_impl import WebSocketsSansIOProtocol
+
+from .const import RESPONSE_COMPRESS_MIN_BYTES, RESPONSE_COMPRESS_LEVEL
+
+
+class ThresholdPerMessageDeflate(permessage_deflate.PerMessageDeflate):
+    """permessage-deflate sending the messages below min_size uncompressed.
+
+    RFC 7692 lets an endpoint send any message uncompressed; small frames
+    (heartbeats, token deltas) then skip the deflate cost, and since they are
+    not fed to the compressor its sliding window is left untouched.
+    """
+
+    def __init__(self, *args, min_size: int = RESPONSE_COMPRESS_MIN_BYTES, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+        self._compressing = True
+
+    def encode(self, frame: Frame) -> Frame:
+        if frame.opcode in CTRL_OPCODES:
+            return frame
+        if frame.opcode is not OP_CONT:
+            self._compressing = len(frame.data) >= self.min_size
+        return super().encode(frame) if self._compressing else frame
+
+
+class ThresholdPerMessageDeflateFactory(permessage_deflate.ServerPerMessageDeflateFactory):
+
+    def __init__(self, min_size: int = RESPONSE_COMPRESS_MIN_BYTES, level: int = RESPONSE_COMPRESS_LEVEL):
+        # Same windows as uvicorn's own permessage-deflate, to keep the memory per connection low
+        super().__init__(server_max_window_bits=12, client_max_window_bits=12,
+                         compress_settings={"memLevel": 5, "level": level})
+        self.min_size = min_size
+
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, ThresholdPerMessageDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            self.compress_settings,
+            min_size=self.min_size)
+
+
+class CompressedWebSocketProtocol(WebSocketsSansIOProtocol):
+    """uvicorn websockets protocol compressing the frames from RESPONSE_COMPRESS_MIN_BYTES on.
+
+    Selected with uvicorn --ws app.utils.compression:CompressedWebSocketProtocol,
+    as app.serve does.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.config.ws_per_message_deflate:
+            self.conn.available_extensions = [ThresholdPerMessageDeflateFactory()]
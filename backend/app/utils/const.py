@@ -1,3 +1,134 @@
 import os
 
 RAPIDAPI_API_KEY = os.getenv("RAPIDAPI_KEY")
+
+# Shared HTTP client pool used by the marketplace tools
+HTTP_LIMIT_PER_HOST = int(os.getenv("HTTP_LIMIT_PER_HOST", "20"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+HTTP_TOTAL_TIMEOUT = float(os.getenv("HTTP_TOTAL_TIMEOUT", "20"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+
+# Marketplace response cache
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")  # memory | sqlite
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "elfagent_cache.db")
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+AMAZON_CACHE_TTL = int(os.getenv("AMAZON_CACHE_TTL", "900"))
+ALIBABA_CACHE_TTL = int(os.getenv("ALIBABA_CACHE_TTL", "1800"))
+
+# Payload pruning of marketplace responses before they reach the LLM context
+PAYLOAD_PRUNING = os.getenv("PAYLOAD_PRUNING", "true").lower() == "true"
+PAYLOAD_TOP_N = int(os.getenv("PAYLOAD_TOP_N", "10"))
+PAYLOAD_COLUMNAR = os.getenv("PAYLOAD_COLUMNAR", "false").lower() == "true"
+
+# Streaming endpoints
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "256"))
+STREAM_HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT_INTERVAL", "15"))
+
+# Session store
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")  # memory | sqlite | database
+SESSION_DB_URL = os.getenv("SESSION_DB_URL", "sqlite:///elfagent_sessions.db")
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(24 * 3600)))
+SESSION_MAX_EVENTS = int(os.getenv("SESSION_MAX_EVENTS", "200"))
+SESSION_SWEEP_INTERVAL = int(os.getenv("SESSION_SWEEP_INTERVAL", "300"))
+
+# Deterministic fake model used by tests and benchmarks instead of Gemini/LiteLlm
+FAKE_LLM = os.getenv("FAKE_LLM", "false").lower() == "true"
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0"))
+FAKE_LLM_PROFILES = os.getenv("FAKE_LLM_PROFILES", "")  # model=latency:error_rate, e.g. to try the model routing
+
+# Semantic cache of final answers in front of /api/query
+QUERY_CACHE_ENABLED = os.getenv("QUERY_CACHE_ENABLED", "true").lower() == "true"
+QUERY_CACHE_THRESHOLD = float(os.getenv("QUERY_CACHE_THRESHOLD", "0.85"))
+# An answer is only as fresh as the deals it was built from
+QUERY_CACHE_TTL = int(os.getenv("QUERY_CACHE_TTL", str(min(AMAZON_CACHE_TTL, ALIBABA_CACHE_TTL))))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "5000"))
+QUERY_CACHE_DIMENSIONS = int(os.getenv("QUERY_CACHE_DIMENSIONS", "1024"))
+
+# Fast path for direct product queries (QueryRequest.mode = "fast")
+FAST_PATH_LLM_RANKING = os.getenv("FAST_PATH_LLM_RANKING", "true").lower() == "true"
+
+# Client side rate limiting of the RapidAPI hosts
+RAPIDAPI_RATE_LIMITS = os.getenv("RAPIDAPI_RATE_LIMITS", "")        # host=requests per second pairs
+RAPIDAPI_DEFAULT_RATE = float(os.getenv("RAPIDAPI_DEFAULT_RATE", "5"))
+RAPIDAPI_MONTHLY_QUOTAS = os.getenv("RAPIDAPI_MONTHLY_QUOTAS", "")  # host=requests per month pairs
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "5"))
+QUOTA_STATE_PATH = os.getenv("QUOTA_STATE_PATH", "elfagent_quota.json")
+
+# Admission control for the agent runs
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "16"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "60"))  # seconds, overridable per request
+# Concurrent calls per upstream, e.g. "gemini=8,litellm=8,real-time-amazon-data.p.rapidapi.com=5"
+UPSTREAM_CONCURRENCY = os.getenv("UPSTREAM_CONCURRENCY", "gemini=8,litellm=8")
+UPSTREAM_DEFAULT_CONCURRENCY = int(os.getenv("UPSTREAM_DEFAULT_CONCURRENCY", "10"))
+
+# Per-marketplace deadlines and hedged requests
+MARKETPLACE_DEADLINE_SHARE = float(os.getenv("MARKETPLACE_DEADLINE_SHARE", "0.5"))  # of the time left
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "false").lower() == "true"
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))  # latencies needed before hedging
+
+# Circuit breaker per marketplace host and last known good results served while it is open
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))   # consecutive failures
+CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv("CIRCUIT_RECOVERY_TIMEOUT", "30"))  # seconds open before a probe
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", "1"))       # probes allowed when half-open
+STALE_TTL = int(os.getenv("STALE_TTL", str(7 * 24 * 3600)))
+STALE_SQLITE_PATH = os.getenv("STALE_SQLITE_PATH", "elfagent_stale.db")
+STALE_MAX_BYTES = int(os.getenv("STALE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+# Precomputed deal index of popular gift categories, refreshed in the background
+DEAL_INDEX_PATH = os.getenv("DEAL_INDEX_PATH", "elfagent_deals.db")
+DEAL_INDEX_CATEGORIES = os.getenv("DEAL_INDEX_CATEGORIES", "")  # comma separated, empty disables the refresh
+DEAL_INDEX_REFRESH_INTERVAL = int(os.getenv("DEAL_INDEX_REFRESH_INTERVAL", "3600"))
+DEAL_INDEX_MAX_AGE = int(os.getenv("DEAL_INDEX_MAX_AGE", str(6 * 3600)))  # older deals are not served
+DEAL_INDEX_PER_CATEGORY = int(os.getenv("DEAL_INDEX_PER_CATEGORY", "50"))
+
+# Prompt budget of the agents: injected state and conversation history sent to the models
+CONTEXT_BUDGET_ENABLED = os.getenv("CONTEXT_BUDGET_ENABLED", "true").lower() == "true"
+CONTEXT_STATE_BUDGET = int(os.getenv("CONTEXT_STATE_BUDGET", "2000"))  # tokens per injected state value
+CONTEXT_MAX_TURNS = int(os.getenv("CONTEXT_MAX_TURNS", "4"))           # past user turns kept, 0 keeps all
+
+# Production run mode (python -m app.serve)
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))  # set by app.serve for its workers
+
+# Batch queries (POST /api/batch)
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))  # items of one batch answered at the same time
+BATCH_JOB_TTL = int(os.getenv("BATCH_JOB_TTL", "86400"))       # seconds a finished job can still be polled
+BATCH_SQLITE_PATH = os.getenv("BATCH_SQLITE_PATH", "elfagent_batches.db")
+BATCH_STORE_MAX_BYTES = int(os.getenv("BATCH_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# DirectorAgent: sequential runs the research then the marketplace agent, speculative overlaps them
+DIRECTOR_MODE = os.getenv("DIRECTOR_MODE", "sequential")  # sequential | speculative
+
+# Agents hand products over by id: records stay in the session state, the final ids are expanded server side
+PRODUCT_ID_HANDOFF = os.getenv("PRODUCT_ID_HANDOFF", "true").lower() == "true"
+
+# Model routing: agents declare a tier, each tier lists its candidate models, e.g.
+# "search=gemini-2.0-flash;extraction=gemini-2.0-flash-lite,openai/gpt-4o-mini;reasoning=openai/gpt-4o,gemini-2.5-pro"
+MODEL_TIERS = os.getenv("MODEL_TIERS", "")  # empty: GOOGLE_MODEL and LLM_MODEL as before, each other's fallback
+MODEL_COSTS = os.getenv("MODEL_COSTS", "")  # model=USD per 1M tokens, models without a cost come last
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "cost")  # cost: cheapest first | latency: fastest estimate first
+MODEL_FIRST_RESPONSE_TIMEOUT = float(os.getenv("MODEL_FIRST_RESPONSE_TIMEOUT", "20"))  # 0 never abandons a slow model
+MODEL_COOLDOWN = float(os.getenv("MODEL_COOLDOWN", "30"))  # seconds a failing or slow model is tried last
+MODEL_LATENCY_ALPHA = float(os.getenv("MODEL_LATENCY_ALPHA", "0.2"))  # weight of the last call in the estimates
+
+# Responses: HTTP bodies and websocket frames from this size on are compressed (gzip / permessage-deflate)
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+RESPONSE_COMPRESS_LEVEL = int(os.getenv("RESPONSE_COMPRESS_LEVEL", "6"))  # 1 fastest .. 9 smallest
+
+# Product photos served through GET /api/images: fetched once from the marketplace CDNs, resized and kept on disk
+IMAGE_PROXY_ENABLED = os.getenv("IMAGE_PROXY_ENABLED", "true").lower() == "true"
+IMAGE_PROXY_BASE_URL = os.getenv("IMAGE_PROXY_BASE_URL", "")  # public URL of this API, empty: relative image URLs
+IMAGE_ALLOWED_HOSTS = os.getenv("IMAGE_ALLOWED_HOSTS",
+                                "media-amazon.com,ssl-images-amazon.com,images-amazon.com,alicdn.com")  # and subdomains
+IMAGE_WIDTHS = os.getenv("IMAGE_WIDTHS", "160,320,640")  # thumbnail widths served, others round up
+IMAGE_DEFAULT_WIDTH = int(os.getenv("IMAGE_DEFAULT_WIDTH", "320"))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))  # JPEG/WebP quality of the thumbnails
+IMAGE_MAX_SOURCE_BYTES = int(os.getenv("IMAGE_MAX_SOURCE_BYTES", str(8 * 1024 * 1024)))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", "10"))  # seconds to download a source photo
+IMAGE_FETCH_CONNECTIONS = int(os.getenv("IMAGE_FETCH_CONNECTIONS", "32"))  # to all the CDN hosts together
+IMAGE_CACHE_BACKEND = os.getenv("IMAGE_CACHE_BACKEND", "sqlite")  # memory | sqlite
+IMAGE_CACHE_PATH = os.getenv("IMAGE_CACHE_PATH", "elfagent_images.db")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+IMAGE_CACHE_TTL = int(os.getenv("IMAGE_CACHE_TTL", str(30 * 24 * 3600)))  # also the browser max-age
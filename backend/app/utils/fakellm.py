@@ -0,0 +1,180 @@
+import ast
+import asyncio
+import json
+import re
+
+from typing import Any, AsyncGenerator, Optional
+
+from pydantic import PrivateAttr
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+# Rough ratio used to report token usage for the fake responses
+CHARS_PER_TOKEN = 4
+
+
+def _last_user_text(llm_request: LlmRequest) -> str:
+    """Latest user text, preferring the request over the "For context:" replays of other agents."""
+    fallback = ""
+    for content in reversed(llm_request.contents):
+        if content.role != "user":
+            continue
+        texts = [part.text for part in content.parts or [] if part.text]
+        own = [text for text in texts if not text.startswith("For context:")]
+        if own:
+            return " ".join(own)
+        fallback = fallback or " ".join(texts)
+    return fallback
+
+
+def _pending_function_responses(llm_request: LlmRequest) -> list[types.FunctionResponse]:
+    if not llm_request.contents:
+        return []
+    last = llm_request.contents[-1]
+    return [part.function_response for part in last.parts or [] if part.function_response]
+
+
+def _function_declarations(llm_request: LlmRequest) -> list[types.FunctionDeclaration]:
+    declarations = []
+    for tool in llm_request.config.tools or []:
+        declarations.extend(getattr(tool, "function_declarations", None) or [])
+    return declarations
+
+
+def _to_gift(product: dict) -> Any:
+    if "id" in product:
+        # Compact product view of the id handoff: answer with the id, as the agents are asked to
+        return product["id"]
+    return {
+        "name": product.get("product_title"),
+        "description": product.get("product_description"),
+        "original_price": product.get("product_original_price"),
+        "current_price": product.get("product_price"),
+        "marketplace": product.get("marketplace_source"),
+        "rating": product.get("product_star_rating"),
+        "order_url": product.get("product_url"),
+        "image_url": product.get("product_image"),
+    }
+
+
+def _find_gifts(value: Any) -> Optional[list]:
+    """Gifts from a products list or an already built gifts list found in a tool response."""
+    if isinstance(value, str):
+        start = value.find("{")
+        if start < 0:
+            return None
+        try:
+            value = json.loads(value[start:value.rfind("}") + 1])
+        except ValueError:
+            return None
+    if isinstance(value, dict):
+        if isinstance(value.get("gifts"), list):
+            return value["gifts"]
+        if isinstance(value.get("products"), list):
+            return [_to_gift(product) for product in value["products"] if isinstance(product, dict)]
+        for nested in value.values():
+            gifts = _find_gifts(nested)
+            if gifts is not None:
+                return gifts
+    return None
+
+
+def _instruction_gifts(llm_request: LlmRequest) -> Optional[list]:
+    """Gifts from a products dict injected in the system instruction, e.g. a ranking agent.
+
+    State values are injected with str(), so the dict may be in Python repr form,
+    or in compact JSON when the context budget capped it.
+    """
+    instruction = llm_request.config.system_instruction if llm_request.config else None
+    if not isinstance(instruction, str):
+        return None
+    match = re.search(r"\{\s*['\"]products['\"]", instruction)
+    if not match:
+        return None
+    depth = 0
+    for end in range(match.start(), len(instruction)):
+        depth += {"{": 1, "}": -1}.get(instruction[end], 0)
+        if depth == 0:
+            break
+    text = instruction[match.start():end + 1]
+    try:
+        value = json.loads(text)
+    except ValueError:
+        try:
+            value = ast.literal_eval(text)
+        except (ValueError, SyntaxError):
+            return None
+    return _find_gifts(value)
+
+
+class FakeLlmError(Exception):
+    """Provider error of the fake model, with the HTTP status like google.genai errors."""
+
+    def __init__(self, code: int):
+        super().__init__(f"{code} fake provider error")
+        self.code = code
+
+
+class FakeLlm(BaseLlm):
+    """Deterministic stand-in for Gemini/LiteLlm used by tests and benchmarks.
+
+    The first turn of an agent with function tools calls its first tool, with
+    "request"/"item" filled from the user text. Once the tool answered, the agent
+    replies with the gifts JSON built from any products (or gifts) found in the
+    responses. Agents without function tools rank the products injected in their
+    instruction, or answer with a canned summary (google_search). Compact product
+    views are answered with their ids. With error_rate, that share of the calls,
+    evenly spread, fails with error_code after the latency.
+    """
+
+    latency: float = 0.0
+    error_rate: float = 0.0
+    error_code: int = 503
+    _calls: int = PrivateAttr(default=0)
+
+    async def generate_content_async(self, llm_request: LlmRequest,
+                                     stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._calls += 1
+        if int(self._calls * self.error_rate) > int((self._calls - 1) * self.error_rate):
+            raise FakeLlmError(self.error_code)
+        user_text = _last_user_text(llm_request)
+        responses = _pending_function_responses(llm_request)
+        declarations = _function_declarations(llm_request)
+        instruction_gifts = None if declarations else _instruction_gifts(llm_request)
+
+        if declarations and not responses:
+            declaration = declarations[0]
+            properties = declaration.parameters.properties if declaration.parameters else {}
+            args = {name: user_text for name in (properties or {}) if name in ("request", "item", "query")}
+            part = types.Part(function_call=types.FunctionCall(name=declaration.name, args=args))
+        elif responses:
+            gifts = None
+            for response in responses:
+                gifts = _find_gifts(response.response)
+                if gifts:
+                    break
+            part = types.Part(text=json.dumps({"gifts": (gifts or [])[:10]}))
+        elif instruction_gifts is not None:
+            part = types.Part(text=json.dumps({"gifts": instruction_gifts[:10]}))
+        else:
+            part = types.Part(text=json.dumps({
+                "features": [{"feature_name": "gift suitability", "feature_value": "high",
+                              "pros": ["popular"], "cons": ["none"]}],
+                "price": "unknown",
+                "product_name": user_text,
+            }))
+
+        prompt_chars = sum(len(prompt_part.text or "") for content in llm_request.contents
+                           for prompt_part in content.parts or [])
+        yield LlmResponse(
+            model_version=self.model,
+            content=types.Content(role="model", parts=[part]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_chars // CHARS_PER_TOKEN,
+                candidates_token_count=len(part.text or "") // CHARS_PER_TOKEN,
+            ),
+        )
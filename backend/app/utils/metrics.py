@@ -0,0 +1,214 @@
+import json
+import time
+
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Optional
+
+from google.adk.plugins.base_plugin import BasePlugin
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_registry: list = []
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._values: dict[tuple, list] = {}
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        entry = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            entry[0][index] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_DURATION = Histogram("elfagent_request_duration_seconds",
+                             "End-to-end duration of API requests", ("endpoint", "status"))
+AGENT_DURATION = Histogram("elfagent_agent_duration_seconds",
+                           "Wall time spent in each agent run", ("agent",))
+TOOL_DURATION = Histogram("elfagent_tool_duration_seconds",
+                          "Wall time spent in each tool call", ("tool",))
+TOOL_PAYLOAD_BYTES = Histogram("elfagent_tool_payload_bytes",
+                               "Size of the tool results returned to the agents", ("tool",),
+                               buckets=SIZE_BUCKETS)
+UPSTREAM_HTTP_DURATION = Histogram("elfagent_upstream_http_duration_seconds",
+                                   "Duration of upstream HTTP requests", ("host", "status"))
+LLM_TOKENS = Counter("elfagent_llm_tokens_total",
+                     "Prompt and completion tokens consumed per agent", ("agent", "kind"))
+
+
+class RequestTimings:
+    """Per-request timing breakdown returned in QueryResponse.timings."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.agents: dict[str, float] = {}
+        self.tools: dict[str, dict] = {}
+        self.upstream_http: dict[str, dict] = {}
+        self.tokens: dict[str, dict] = {}
+        self.payload_bytes: dict[str, int] = {}
+
+    @staticmethod
+    def _add_call(bucket: dict, name: str, seconds: float):
+        entry = bucket.setdefault(name, {"calls": 0, "ms": 0.0})
+        entry["calls"] += 1
+        entry["ms"] += seconds * 1000
+
+    def add_agent(self, agent: str, seconds: float):
+        self.agents[agent] = self.agents.get(agent, 0.0) + seconds * 1000
+
+    def add_tool(self, tool: str, seconds: float, payload_bytes: int):
+        self._add_call(self.tools, tool, seconds)
+        self.payload_bytes[tool] = self.payload_bytes.get(tool, 0) + payload_bytes
+
+    def add_http(self, host: str, seconds: float):
+        self._add_call(self.upstream_http, host, seconds)
+
+    def add_tokens(self, agent: str, prompt: int, completion: int):
+        entry = self.tokens.setdefault(agent, {"prompt": 0, "completion": 0})
+        entry["prompt"] += prompt
+        entry["completion"] += completion
+
+    def to_dict(self) -> dict:
+        def rounded(bucket: dict) -> dict:
+            return {name: {"calls": entry["calls"], "ms": round(entry["ms"], 1)}
+                    for name, entry in bucket.items()}
+        return {
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "agents_ms": {name: round(ms, 1) for name, ms in self.agents.items()},
+            "tools": rounded(self.tools),
+            "upstream_http": rounded(self.upstream_http),
+            "tokens": self.tokens,
+            "payload_bytes": self.payload_bytes,
+        }
+
+
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("elf_request_timings", default=None)
+
+
+def record_http(host: str, status: str, seconds: float):
+    UPSTREAM_HTTP_DURATION.observe(seconds, host=host, status=status)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add_http(host, seconds)
+
+
+def _payload_size(result) -> int:
+    try:
+        return len(json.dumps(result, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+class MetricsPlugin(BasePlugin):
+    """Records agent, tool and model metrics for every (nested) agent run."""
+
+    def __init__(self):
+        super().__init__(name="elf_metrics")
+        self._agent_started: dict[tuple[str, str], float] = {}
+        self._tool_started: dict[str, float] = {}
+
+    async def before_agent_callback(self, *, agent, callback_context):
+        self._agent_started[(callback_context.invocation_id, agent.name)] = time.perf_counter()
+        return None
+
+    async def after_agent_callback(self, *, agent, callback_context):
+        started = self._agent_started.pop((callback_context.invocation_id, agent.name), None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            AGENT_DURATION.observe(elapsed, agent=agent.name)
+            timings = current_timings.get()
+            if timings is not None:
+                timings.add_agent(agent.name, elapsed)
+        return None
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        self._tool_started[tool_context.function_call_id] = time.perf_counter()
+        return None
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        started = self._tool_started.pop(tool_context.function_call_id, None)
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            size = _payload_size(result)
+            TOOL_DURATION.observe(elapsed, tool=tool.name)
+            TOOL_PAYLOAD_BYTES.observe(size, tool=tool.name)
+            timings = current_timings.get()
+            if timings is not None:
+                timings.add_tool(tool.name, elapsed, size)
+        return None
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        usage = llm_response.usage_metadata
+        if usage is None or llm_response.partial:
+            return None
+        prompt = usage.prompt_token_count or 0
+        completion = usage.candidates_token_count or 0
+        LLM_TOKENS.inc(prompt, agent=callback_context.agent_name, kind="prompt")
+        LLM_TOKENS.inc(completion, agent=callback_context.agent_name, kind="completion")
+        timings = current_timings.get()
+        if timings is not None:
+            timings.add_tokens(callback_context.agent_name, prompt, completion)
+        return None
@@ -0,0 +1,200 @@
+import logging
+import math
+import re
+import time
+import unicodedata
+import zlib
+import numpy as np
+
+from typing import Any, Optional
+from .const import QUERY_CACHE_THRESHOLD, QUERY_CACHE_TTL, QUERY_CACHE_MAX_ENTRIES, \
+    QUERY_CACHE_DIMENSIONS
+
+logger = logging.getLogger("uvicorn.error")
+
+STOPWORDS = frozenset("""
+a an the for to of and or with who that which is are my me i im i'm please find show give get
+some any best good cheap looking look want need buy gift gifts present presents christmas xmas
+un una il lo la per di da che con regalo regali natale
+""".split())
+
+_WORD = re.compile(r"[a-z0-9]+")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, strip accents and punctuation, drop filler words."""
+    text = unicodedata.normalize("NFKD", query.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(word for word in _WORD.findall(text) if word not in STOPWORDS)
+
+
+def query_numbers(query: str) -> frozenset[str]:
+    """Ages, prices and quantities must match exactly for a similar query to be reused."""
+    return frozenset(number.replace(",", ".") for number in _NUMBER.findall(query))
+
+
+def embed_query(normalized: str, dimensions: int = QUERY_CACHE_DIMENSIONS) -> dict[int, float]:
+    """Hashed bag of words and character trigrams, L2 normalized, as a sparse vector."""
+    features: dict[int, float] = {}
+    for word in normalized.split():
+        grams = [word] + [word[i:i + 3] for i in range(max(1, len(word) - 2))] if len(word) > 3 else [word]
+        for gram in grams:
+            # Whole words weigh more than their trigrams
+            weight = 1.0 if gram == word else 0.5
+            bucket = zlib.crc32(gram.encode()) % dimensions
+            features[bucket] = features.get(bucket, 0.0) + weight
+    norm = math.sqrt(sum(value * value for value in features.values())) or 1.0
+    return {bucket: value / norm for bucket, value in features.items()}
+
+
+class CacheEntry:
+    __slots__ = ("key", "normalized", "numbers", "vector", "response", "expires_at", "last_access", "slot")
+
+    def __init__(self, key: str, normalized: str, numbers: frozenset[str],
+                 vector: dict[int, float], response: Any, expires_at: float):
+        self.key = key
+        self.normalized = normalized
+        self.numbers = numbers
+        self.vector = vector
+        self.response = response
+        self.expires_at = expires_at
+        self.last_access = time.time()
+        self.slot = -1
+
+
+class SemanticQueryCache:
+    """Final answers keyed by normalized query, with cosine lookup for near-identical ones.
+
+    Exact normalized matches are a dict lookup. Otherwise the query vector is
+    compared with every cached vector in a single NumPy matrix product, and
+    the closest entry is reused when its similarity reaches threshold and
+    it mentions the same numbers. Entries expire after ttl, tied to the deal
+    cache TTLs since the answer is only as fresh as its deals, and the least
+    recently used entry is evicted past max_entries.
+    """
+
+    def __init__(self,
+                 threshold: float = QUERY_CACHE_THRESHOLD,
+                 ttl: float = QUERY_CACHE_TTL,
+                 max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+                 dimensions: int = QUERY_CACHE_DIMENSIONS):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.dimensions = dimensions
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: dict[str, CacheEntry] = {}
+        # Row i of the matrix holds the vector of _slots[i]
+        self._slots: list[Optional[CacheEntry]] = []
+        self._free: list[int] = []
+        self._matrix = np.zeros((0, dimensions), dtype=np.float32)
+
+    @staticmethod
+    def _key(namespace: str, normalized: str) -> str:
+        return f"{namespace}|{normalized}"
+
+    def _dense(self, vector: dict[int, float]):
+        row = np.zeros(self.dimensions, dtype=np.float32)
+        for bucket, value in vector.items():
+            row[bucket] = value
+        return row
+
+    def _best_match(self, namespace: str, vector: dict[int, float], numbers: frozenset[str],
+                    now: float) -> tuple[Optional[CacheEntry], float]:
+        if not self._slots:
+            return None, 0.0
+        scores = self._matrix[:len(self._slots)] @ self._dense(vector)
+        order = np.argsort(-scores)
+        for index in order:
+            entry, score = self._slots[index], float(scores[index])
+            if score < self.threshold:
+                break
+            if entry is not None and entry.key.startswith(f"{namespace}|") \
+                    and entry.numbers == numbers and entry.expires_at >= now:
+                return entry, score
+        return None, 0.0
+
+    def get(self, query: str, namespace: str = "") -> Optional[Any]:
+        normalized = normalize_query(query)
+        if not normalized:
+            return None
+        now = time.time()
+        entry = self._entries.get(self._key(namespace, normalized))
+        if entry is not None and entry.expires_at >= now:
+            entry.last_access = now
+            self.exact_hits += 1
+            return entry.response
+
+        entry, score = self._best_match(namespace, embed_query(normalized, self.dimensions),
+                                        query_numbers(query), now)
+        if entry is not None:
+            entry.last_access = now
+            self.semantic_hits += 1
+            logger.info(f"🎯 Query cache hit {query!r} ~ {entry.normalized!r} ({score:.2f})")
+            return entry.response
+        self.misses += 1
+        return None
+
+    def set(self, query: str, response: Any, namespace: str = ""):
+        normalized = normalize_query(query)
+        if not normalized:
+            return
+        key = self._key(namespace, normalized)
+        if key in self._entries:
+            self._remove(self._entries[key])
+        self._purge_expired()
+        while len(self._entries) >= self.max_entries:
+            oldest = min(self._entries.values(), key=lambda entry: entry.last_access)
+            self._remove(oldest)
+            self.evictions += 1
+        vector = embed_query(normalized, self.dimensions)
+        entry = CacheEntry(key, normalized, query_numbers(query), vector, response, time.time() + self.ttl)
+        self._entries[key] = entry
+        self._add_row(entry)
+
+    def _add_row(self, entry: CacheEntry):
+        if self._free:
+            entry.slot = self._free.pop()
+            self._slots[entry.slot] = entry
+            self._matrix[entry.slot] = self._dense(entry.vector)
+            return
+        if len(self._slots) == self._matrix.shape[0]:
+            grown = np.zeros((max(16, 2 * len(self._slots)), self.dimensions), dtype=np.float32)
+            grown[:len(self._slots)] = self._matrix[:len(self._slots)]
+            self._matrix = grown
+        entry.slot = len(self._slots)
+        self._matrix[entry.slot] = self._dense(entry.vector)
+        self._slots.append(entry)
+
+    def _remove(self, entry: CacheEntry):
+        del self._entries[entry.key]
+        if entry.slot >= 0:
+            self._slots[entry.slot] = None
+            self._matrix[entry.slot] = 0
+            self._free.append(entry.slot)
+
+    def _purge_expired(self):
+        now = time.time()
+        for entry in [entry for entry in self._entries.values() if entry.expires_at < now]:
+            self._remove(entry)
+
+    def clear(self):
+        for entry in list(self._entries.values()):
+            self._remove(entry)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions}
+
+
+query_cache = SemanticQueryCache()
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import time
+
+from typing import AsyncGenerator, Callable, Optional
+from pydantic import PrivateAttr
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+
+from .const import MODEL_ROUTING, MODEL_FIRST_RESPONSE_TIMEOUT, MODEL_COOLDOWN, MODEL_LATENCY_ALPHA
+from .metrics import Counter
+
+logger = logging.getLogger("uvicorn.error")
+
+# Provider answers meaning "try another provider": rate limited or unavailable
+FAILOVER_STATUS = (429, 500, 502, 503, 504)
+
+MODEL_FAILOVERS = Counter("elfagent_model_failovers_total",
+                          "Model calls moved to the next model of their tier", ("tier", "model", "reason"))
+
+
+def parse_tiers(spec: str) -> dict[str, list[str]]:
+    """Parse "search=gemini-2.0-flash;reasoning=openai/gpt-4o,gemini-2.5-pro"."""
+    tiers = {}
+    for item in spec.split(";"):
+        name, _, models = item.partition("=")
+        candidates = [model.strip() for model in models.split(",") if model.strip()]
+        if name.strip() and candidates:
+            tiers[name.strip()] = candidates
+    return tiers
+
+
+def parse_costs(spec: str) -> dict[str, float]:
+    """Parse "gemini-2.0-flash-lite=0.075,openai/gpt-4o-mini=0.15"."""
+    costs = {}
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            costs[name.strip()] = float(value)
+    return costs
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    """HTTP status of a provider error: google.genai errors have code, litellm ones status_code."""
+    for attribute in ("code", "status_code"):
+        status = getattr(error, attribute, None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def is_gemini_model(name: str) -> bool:
+    """Whether the model uses the Gemini client: bare gemini-* names, not LiteLLM ones like gemini/gemini-2.5-pro."""
+    return name.startswith("gemini") and "/" not in name
+
+
+def needs_gemini(llm_request: LlmRequest) -> bool:
+    """Whether the request carries Gemini built-in tools, such as google_search."""
+    tools = llm_request.config.tools if llm_request.config else None
+    return any(getattr(tool, "google_search", None) or getattr(tool, "google_search_retrieval", None)
+               for tool in tools or [])
+
+
+class ModelStats:
+    """Rolling latency and error estimates of one model."""
+
+    def __init__(self, alpha: float = MODEL_LATENCY_ALPHA):
+        self.alpha = alpha
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.errors = 0
+        self.cooldown_until = 0.0
+
+    def record(self, seconds: float, failed: bool, cooldown: float = 0.0):
+        """Seconds to the first response, or until the call was abandoned."""
+        self.calls += 1
+        self.errors += failed
+        self.latency = seconds if self.latency is None else (1 - self.alpha) * self.latency + self.alpha * seconds
+        self.error_rate = (1 - self.alpha) * self.error_rate + self.alpha * failed
+        if failed and cooldown:
+            self.cooldown_until = time.monotonic() + cooldown
+
+    def cooling_down(self) -> float:
+        return max(0.0, self.cooldown_until - time.monotonic())
+
+    def expected_latency(self) -> float:
+        """Expected seconds per successful call; unmeasured models first, so they get measured."""
+        if self.latency is None:
+            return 0.0
+        return self.latency / max(0.05, 1 - self.error_rate)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls,
+                "errors": self.errors,
+                "latency_s": round(self.latency, 3) if self.latency is not None else None,
+                "error_rate": round(self.error_rate, 3),
+                "cooldown_s": round(self.cooling_down(), 1)}
+
+
+class ModelRouter:
+    """Routes the calls of each tier to its cheapest or fastest model, failing over to the others.
+
+    Models are tried in routing order: cooling down models last, then by cost
+    (cost) or by expected latency per successful call (latency), ties keeping
+    the tier order. A model answering 429/5xx, or without a first response
+    within first_response_timeout, cools down and the call moves on to the next
+    model; the last one is never abandoned for being slow. Once a model
+    started answering, the call stays on it.
+    """
+
+    def __init__(self,
+                 tiers: dict[str, list[str]],
+                 provider: Callable[[str], BaseLlm],
+                 costs: Optional[dict[str, float]] = None,
+                 strategy: str = MODEL_ROUTING,
+                 first_response_timeout: float = MODEL_FIRST_RESPONSE_TIMEOUT,
+                 cooldown: float = MODEL_COOLDOWN):
+        self.tiers = tiers
+        self.costs = costs or {}
+        self.strategy = strategy
+        self.first_response_timeout = first_response_timeout
+        self.cooldown = cooldown
+        self._provider = provider
+        self._models: dict[str, BaseLlm] = {}
+        self._stats: dict[str, ModelStats] = {}
+        self._routed: dict[str, "RoutedModel"] = {}
+
+    def provider(self, name: str) -> BaseLlm:
+        model = self._models.get(name)
+        if model is None:
+            model = self._models[name] = self._provider(name)
+        return model
+
+    def model_names(self) -> list[str]:
+        return list(dict.fromkeys(name for candidates in self.tiers.values() for name in candidates))
+
+    def has_alternates(self, name: str) -> bool:
+        return any(name in candidates and len(candidates) > 1 for candidates in self.tiers.values())
+
+    def model(self, tier: str) -> "RoutedModel":
+        """The model agents of the tier are given, one per tier."""
+        if tier not in self.tiers:
+            raise ValueError(f"Unknown model tier {tier!r}, configured: {', '.join(self.tiers)}")
+        routed = self._routed.get(tier)
+        if routed is None:
+            routed = self._routed[tier] = RoutedModel(self, model=self.tiers[tier][0], tier=tier)
+        return routed
+
+    def _model_stats(self, name: str) -> ModelStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = ModelStats()
+        return stats
+
+    def order(self, tier: str, gemini_only: bool = False) -> list[str]:
+        candidates = self.tiers[tier]
+        if gemini_only:
+            candidates = [name for name in candidates if is_gemini_model(name)] or candidates
+
+        def key(item: tuple[int, str]):
+            index, name = item
+            stats = self._model_stats(name)
+            rank = stats.expected_latency() if self.strategy == "latency" else self.costs.get(name, float("inf"))
+            return stats.cooling_down() > 0, rank, index
+
+        return [name for _, name in sorted(enumerate(candidates), key=key)]
+
+    async def generate(self, tier: str, llm_request: LlmRequest,
+                       stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        names = self.order(tier, needs_gemini(llm_request))
+        for position, name in enumerate(names):
+            last = position == len(names) - 1
+            stats = self._model_stats(name)
+            request = llm_request.model_copy(update={"model": name})
+            responses = self.provider(name).generate_content_async(request, stream)
+            timeout = None if last or not self.first_response_timeout else self.first_response_timeout
+            started = time.perf_counter()
+            try:
+                first = await asyncio.wait_for(anext(responses), timeout)
+            except StopAsyncIteration:
+                stats.record(time.perf_counter() - started, failed=False)
+                return
+            except asyncio.TimeoutError:
+                await responses.aclose()
+                stats.record(time.perf_counter() - started, failed=True, cooldown=self.cooldown)
+                self._fail_over(tier, name, "slow", names[position + 1])
+                continue
+            except Exception as e:
+                status = error_status(e)
+                if status not in FAILOVER_STATUS:
+                    raise
+                stats.record(time.perf_counter() - started, failed=True, cooldown=self.cooldown)
+                if last:
+                    raise
+                self._fail_over(tier, name, str(status), names[position + 1])
+                continue
+            stats.record(time.perf_counter() - started, failed=False)
+            yield first
+            async for response in responses:
+                yield response
+            return
+
+    def _fail_over(self, tier: str, name: str, reason: str, next_name: str):
+        MODEL_FAILOVERS.inc(tier=tier, model=name, reason=reason)
+        logger.warning(f"⚠️ Model {name} ({tier}) {reason}, failing over to {next_name}")
+
+    def stats(self) -> dict:
+        return {"strategy": self.strategy,
+                "tiers": {tier: self.order(tier) for tier in self.tiers},
+                "models": {name: stats.stats() for name, stats in self._stats.items()}}
+
+
+class RoutedModel(BaseLlm):
+    """Model of an agent tier: every call goes through the router."""
+
+    tier: str
+    _router: ModelRouter = PrivateAttr()
+
+    def __init__(self, router: ModelRouter, **data):
+        super().__init__(**data)
+        self._router = router
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        async for response in self._router.generate(self.tier, llm_request, stream):
+            yield response
+
+    def connect(self, llm_request):
+        return self._router.provider(self._router.order(self.tier)[0]).connect(llm_request)
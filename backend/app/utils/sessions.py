@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+
+from abc import ABC, abstractmethod
+from typing import Optional
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import OperationalError
+
+from google.adk.sessions import BaseSessionService, InMemorySessionService, DatabaseSessionService
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.adk.sessions.database_session_service import StorageEvent
+
+from .const import SESSION_BACKEND, SESSION_DB_URL, SESSION_TTL, SESSION_MAX_EVENTS
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class SessionRetention(ABC):
+    """TTL and max-events policy shared by the bounded session backends.
+
+    Sessions idle for longer than ttl are deleted and stored events beyond the
+    max_events most recent ones are dropped by sweep(), which runs periodically
+    in the background so the request path is never slowed down by compaction.
+    """
+
+    ttl: int
+    max_events: int
+
+    async def sweep(self, app_name: str) -> int:
+        expired = 0
+        if self.ttl:
+            cutoff = time.time() - self.ttl
+            response = await self.list_sessions(app_name=app_name)
+            for session in response.sessions:
+                if session.last_update_time < cutoff:
+                    await self.delete_session(app_name=app_name,
+                                              user_id=session.user_id,
+                                              session_id=session.id)
+                    expired += 1
+        if self.max_events:
+            await self.compact(app_name)
+        return expired
+
+    @abstractmethod
+    async def compact(self, app_name: str):
+        """Drop the stored events of app_name beyond the max_events most recent ones of each session."""
+
+
+class BoundedInMemorySessionService(SessionRetention, InMemorySessionService):
+    """Process-local sessions with TTL and max-events compaction."""
+
+    def __init__(self, ttl: int = SESSION_TTL, max_events: int = SESSION_MAX_EVENTS):
+        InMemorySessionService.__init__(self)
+        self.ttl = ttl
+        self.max_events = max_events
+
+    async def compact(self, app_name: str):
+        for user_sessions in self.sessions.get(app_name, {}).values():
+            for session in user_sessions.values():
+                if len(session.events) > self.max_events:
+                    del session.events[:-self.max_events]
+
+
+class BoundedDatabaseSessionService(SessionRetention, DatabaseSessionService):
+    """SQLAlchemy backed sessions (sqlite file or any database URL) shareable across workers."""
+
+    def __init__(self, db_url: str = SESSION_DB_URL, ttl: int = SESSION_TTL,
+                 max_events: int = SESSION_MAX_EVENTS, **kwargs):
+        try:
+            DatabaseSessionService.__init__(self, db_url, **kwargs)
+        except OperationalError:
+            # Another worker created the tables between the check and the CREATE TABLE
+            DatabaseSessionService.__init__(self, db_url, **kwargs)
+        self.ttl = ttl
+        self.max_events = max_events
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                          config: Optional[GetSessionConfig] = None):
+        if config is None and self.max_events:
+            config = GetSessionConfig(num_recent_events=self.max_events)
+        return await DatabaseSessionService.get_session(
+            self, app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+
+    async def compact(self, app_name: str):
+        with self.database_session_factory() as sql_session:
+            oversized = sql_session.execute(
+                select(StorageEvent.user_id, StorageEvent.session_id)
+                .where(StorageEvent.app_name == app_name)
+                .group_by(StorageEvent.user_id, StorageEvent.session_id)
+                .having(func.count() > self.max_events)).all()
+            for user_id, session_id in oversized:
+                keep = (select(StorageEvent.id)
+                        .where(StorageEvent.app_name == app_name,
+                               StorageEvent.user_id == user_id,
+                               StorageEvent.session_id == session_id)
+                        .order_by(StorageEvent.timestamp.desc())
+                        .limit(self.max_events))
+                sql_session.execute(
+                    delete(StorageEvent)
+                    .where(StorageEvent.app_name == app_name,
+                           StorageEvent.user_id == user_id,
+                           StorageEvent.session_id == session_id,
+                           StorageEvent.id.not_in(keep)))
+            sql_session.commit()
+
+
+def build_session_service(backend: str = SESSION_BACKEND) -> BaseSessionService:
+    """Create the configured session backend.
+
+    memory keeps sessions in the current process only; sqlite and database store
+    them at SESSION_DB_URL so several workers or processes share the same sessions.
+    """
+    if backend in ("sqlite", "database"):
+        logger.info(f"✅ Sessions stored in {SESSION_DB_URL.split('@')[-1]}")
+        return BoundedDatabaseSessionService(SESSION_DB_URL)
+    return BoundedInMemorySessionService()
+
+
+async def run_session_janitor(session_svc: BaseSessionService, app_name: str, interval: float):
+    """Periodically expire idle sessions and compact long ones."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            expired = await session_svc.sweep(app_name)
+            if expired:
+                logger.info(f"🧹 Expired {expired} idle sessions")
+        except Exception as e:
+            logger.error(f"❌ Error while sweeping sessions: {e}")
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import logging
+import time
+
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, Optional
+
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.runners import Runner
+from google.adk.sessions import BaseSessionService
+from google.genai import types
+
+from .const import STREAM_QUEUE_SIZE, STREAM_HEARTBEAT_INTERVAL
+from .utility import get_or_create_session
+
+logger = logging.getLogger("uvicorn.error")
+
+# Intermediate output_key results forwarded to streaming clients
+STREAMED_STATE_KEYS = ("google_results", "deals", "products")
+
+
+class EventStream:
+    """Bounded channel between a running agent pipeline and one streaming client.
+
+    publish() blocks when the client falls behind, which pauses the pipeline
+    instead of buffering an unbounded amount of events in memory.
+    """
+
+    def __init__(self, maxsize: int = STREAM_QUEUE_SIZE):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._state_sent: dict[str, str] = {}
+
+    async def publish(self, message: Optional[dict]):
+        await self.queue.put(message)
+
+    async def publish_state(self, key: str, value: Any):
+        # Nested AgentTool runs forward the same state delta to their parent
+        digest = json.dumps(value, sort_keys=True, default=str)
+        if self._state_sent.get(key) == digest:
+            return
+        self._state_sent[key] = digest
+        await self.publish({"type": "state", "key": key, "value": value})
+
+
+_current_stream: ContextVar[Optional[EventStream]] = ContextVar("elf_event_stream", default=None)
+
+
+class StreamingPlugin(BasePlugin):
+    """Forwards text, tool calls and state updates of every (nested) agent to the active stream."""
+
+    def __init__(self, state_keys: tuple[str, ...] = STREAMED_STATE_KEYS):
+        super().__init__(name="elf_streaming")
+        self.state_keys = state_keys
+        self._tool_started: dict[str, float] = {}
+
+    async def on_event_callback(self, *, invocation_context, event):
+        stream = _current_stream.get()
+        if stream is None:
+            return None
+        if event.content and event.content.parts:
+            text = "".join(part.text for part in event.content.parts if part.text)
+            if text and text != "None":
+                await stream.publish({
+                    "type": "text",
+                    "author": event.author,
+                    "partial": bool(event.partial),
+                    "content": text
+                })
+        for key, value in (event.actions.state_delta or {}).items():
+            if key in self.state_keys:
+                await stream.publish_state(key, value)
+        return None
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        stream = _current_stream.get()
+        if stream is None:
+            return None
+        self._tool_started[tool_context.function_call_id] = time.perf_counter()
+        await stream.publish({
+            "type": "tool_start",
+            "tool": tool.name,
+            "agent": tool_context.agent_name,
+            "args": tool_args
+        })
+        return None
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        stream = _current_stream.get()
+        if stream is None:
+            return None
+        started = self._tool_started.pop(tool_context.function_call_id, None)
+        await stream.publish({
+            "type": "tool_end",
+            "tool": tool.name,
+            "agent": tool_context.agent_name,
+            "duration_ms": round((time.perf_counter() - started) * 1000) if started else None
+        })
+        return None
+
+
+async def stream_session(runner: Runner,
+                         session_svc: BaseSessionService,
+                         user_id: str,
+                         query: str,
+                         session_name: str = "default",
+                         heartbeat: float = STREAM_HEARTBEAT_INTERVAL) -> AsyncGenerator[dict, None]:
+    """Run a query and yield progress messages as soon as the agents produce them.
+
+    Token-level text arrives as {"type": "text", "partial": true} deltas, followed by
+    the full message with "partial": false. The last message is either
+    {"type": "final"} or {"type": "error"}.
+    """
+    stream = EventStream()
+
+    async def produce():
+        _current_stream.set(stream)
+        try:
+            session = await get_or_create_session(runner.app_name, session_svc, user_id, session_name)
+            content = types.Content(role="user", parts=[types.Part(text=query)])
+            final_response = None
+            async for event in runner.run_async(
+                    user_id=user_id, session_id=session.id, new_message=content,
+                    run_config=RunConfig(streaming_mode=StreamingMode.SSE)):
+                if event.is_final_response() and event.content and event.content.parts:
+                    final_response = event.content.parts[0].text
+            await stream.publish({"type": "final", "content": final_response})
+        except Exception as e:
+            logger.error(f"❌ Error while streaming session {session_name}: {e}")
+            await stream.publish({"type": "error", "error": str(e)})
+        finally:
+            await stream.publish(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(stream.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield {"type": "heartbeat"}
+                continue
+            if message is None:
+                break
+            yield message
+    finally:
+        if not producer.done():
+            producer.cancel()
@@ -1,18 +1,24 @@
 import os
 import logging
+from typing import Callable, Optional
+from pydantic import PrivateAttr
+from google.adk.events import Event
+from google.adk.models.base_llm import BaseLlm
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
+from google.adk.sessions import BaseSessionService
 from google.genai import types
-from google.adk.models.lite_llm import LiteLlm
-from google.adk.models.google_llm import Gemini
+from .const import FAKE_LLM, FAKE_LLM_LATENCY, FAKE_LLM_PROFILES, MODEL_TIERS, MODEL_COSTS
+from .fakellm import FakeLlm
+from .admission import upstream_limits
+from .router import ModelRouter, parse_tiers, parse_costs, is_gemini_model
 
 logger = logging.getLogger("uvicorn.error")
 
 
 
-def configure_retry():
+def configure_retry(attempts: int = 5):
     retry_config = types.HttpRetryOptions(
-        attempts=5,            # Maximum number of retry attempts
+        attempts=attempts,     # Maximum number of retry attempts
         exp_base=7,            # Exponential backoff multiplier (delay grows: 1s, 7s, 49s...)
         initial_delay=1,       # Initial delay before first retry (in seconds)
         http_status_codes=[429, 500, 503, 504]  # Retry on these HTTP errors
@@ -20,25 +26,31 @@ def configure_retry():
     logger.info("✅ Retry configuration created")
     return retry_config
 
+async def get_or_create_session(app_name: str,
+                                session_svc: BaseSessionService,
+                                user_id: str,
+                                session_name: str):
+    session = await session_svc.get_session(
+        app_name=app_name,
+        user_id=user_id,
+        session_id=session_name
+    )
+    if session is None:
+        session = await session_svc.create_session(
+            app_name=app_name,
+            user_id=user_id,
+            session_id=session_name)
+    return session
+
 async def run_session(runner: Runner,
-                      session_svc: InMemorySessionService, 
+                      session_svc: BaseSessionService, 
                       user_id: str,
                       user_queries: list[str],
                       session_name: str="default"):
     logger.info(f"### SESSION: {session_name.upper()}")
     app_name = runner.app_name
     final_response = {"products": [], "message": "No products found"}
-    try:
-        session = await session_svc.create_session(
-            app_name=app_name,
-            user_id=user_id,
-            session_id=session_name)
-    except:
-        session = await session_svc.get_session(
-            app_name=app_name,
-            user_id=user_id,
-            session_id=session_name
-        )
+    session = await get_or_create_session(app_name, session_svc, user_id, session_name)
     for query in user_queries:
         logger.info(f"User > {query}")
 
@@ -52,19 +64,123 @@ async def run_session(runner: Runner,
                 if event.content.parts[0].text != "None" and \
                     event.content.parts[0].text:
                     logger.info(f"Agent > {event.content.parts[0].text}")
-            if event.is_final_response():
-                if event.content and event.content.parts:
-                    final_response = event.content.parts[0].text
+            # State-only events (e.g. a custom agent storing its results) are not the answer
+            if event.is_final_response() and event.content and event.content.parts:
+                final_response = event.content.parts[0].text
                 break
         return final_response
 
+async def record_turn(runner: Runner,
+                      session_svc: BaseSessionService,
+                      user_id: str,
+                      query: str,
+                      response: str,
+                      session_name: str="default"):
+    """Store a query answered without running the agents, so follow-ups keep their context."""
+    session = await get_or_create_session(runner.app_name, session_svc, user_id, session_name)
+    invocation_id = Event.new_id()
+    await session_svc.append_event(session, Event(
+        author="user", invocation_id=invocation_id,
+        content=types.Content(role="user", parts=[types.Part(text=query)])))
+    await session_svc.append_event(session, Event(
+        author=runner.agent.name, invocation_id=invocation_id,
+        content=types.Content(role="model", parts=[types.Part(text=response)])))
+    return session
 
-# gemini-1.5-pro FULL RESOURCES Used
-gemini_model = os.getenv("GOOGLE_MODEL", "")
-pro_model = os.getenv("LLM_MODEL", "")
-google_model = Gemini(model=gemini_model,
-                 retry_options=configure_retry())
 
-llm_model = LiteLlm(model=pro_model)
+class LazyModel(BaseLlm):
+    """Model whose provider client is built on first use, or by warm_up() in each worker.
+
+    Agents can be defined at import time without importing litellm or creating
+    the Gemini client. Calls share the concurrency budget of their upstream.
+    """
+
+    upstream: str
+    _factory: Callable[[], BaseLlm] = PrivateAttr()
+    _llm: Optional[BaseLlm] = PrivateAttr(default=None)
+
+    def __init__(self, factory: Callable[[], BaseLlm], **data):
+        super().__init__(**data)
+        self._factory = factory
+
+    def warm_up(self) -> BaseLlm:
+        if self._llm is None:
+            self._llm = self._factory()
+        return self._llm
 
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        llm = self.warm_up()
+        async with upstream_limits.slot(self.upstream):
+            async for response in llm.generate_content_async(llm_request, stream):
+                yield response
 
+    def connect(self, llm_request):
+        return self.warm_up().connect(llm_request)
+
+
+# Attempts of a model having an alternate in its tier: the router fails over instead of waiting
+FAILOVER_ATTEMPTS = 2
+
+
+def _build_gemini(model: str, attempts: int) -> BaseLlm:
+    from google.adk.models.google_llm import Gemini
+    gemini = Gemini(model=model, retry_options=configure_retry(attempts))
+    # The genai client is created lazily by ADK, create it now
+    gemini.api_client
+    return gemini
+
+
+def _build_litellm(model: str) -> BaseLlm:
+    from google.adk.models.lite_llm import LiteLlm
+    return LiteLlm(model=model)
+
+
+def _fake_profiles(spec: str) -> dict[str, tuple[float, float]]:
+    """Parse "gemini-fake-google=0.05:0,gemini-fake-llm=0.3:0.2" into (latency, error_rate)."""
+    profiles = {}
+    for item in spec.split(","):
+        name, _, profile = item.partition("=")
+        if name.strip() and profile.strip():
+            latency, _, error_rate = profile.partition(":")
+            profiles[name.strip()] = (float(latency or FAKE_LLM_LATENCY), float(error_rate or 0))
+    return profiles
+
+
+def build_provider_model(name: str) -> BaseLlm:
+    """Client of one model: Gemini for bare gemini-* names, LiteLlm for the others, the fake model with FAKE_LLM."""
+    if FAKE_LLM:
+        latency, error_rate = _fake_profiles(FAKE_LLM_PROFILES).get(name, (FAKE_LLM_LATENCY, 0.0))
+        return FakeLlm(model=name, latency=latency, error_rate=error_rate)
+    if is_gemini_model(name):
+        attempts = FAILOVER_ATTEMPTS if model_router.has_alternates(name) else 5
+        return LazyModel(lambda: _build_gemini(name, attempts), model=name, upstream="gemini")
+    return LazyModel(lambda: _build_litellm(name), model=name, upstream="litellm")
+
+
+def default_tiers(google: str, llm: str) -> dict[str, list[str]]:
+    """The models of the agents before the tiers: Gemini searches and extracts, LLM_MODEL reasons."""
+    tiers = {"search": [google], "extraction": [google, llm], "reasoning": [llm, google]}
+    return {tier: list(dict.fromkeys(name for name in models if name)) or models[:1] for tier, models in tiers.items()}
+
+
+def model_for(tier: str) -> BaseLlm:
+    """Model of the agents of a tier (search, extraction, reasoning), routed across its candidates."""
+    return model_router.model(tier)
+
+
+def warm_up_models():
+    """Build the model clients of this process ahead of the first request."""
+    for name in model_router.model_names():
+        model = model_router.provider(name)
+        if isinstance(model, LazyModel):
+            model.warm_up()
+
+
+# gemini-1.5-pro FULL RESOURCES Used
+gemini_model = os.getenv("GOOGLE_MODEL", "")
+pro_model = os.getenv("LLM_MODEL", "")
+if FAKE_LLM:
+    logger.info("⚠️ FAKE_LLM enabled: agents run on the deterministic fake model")
+    gemini_model, pro_model = "gemini-fake-google", "gemini-fake-llm"
+model_router = ModelRouter(parse_tiers(MODEL_TIERS) or default_tiers(gemini_model, pro_model),
+                           build_provider_model, parse_costs(MODEL_COSTS))
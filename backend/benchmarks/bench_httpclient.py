@@ -0,0 +1,58 @@
+"""Compare a fresh aiohttp.ClientSession per call with the shared HTTP pool.
+
+Usage:
+    uv run python -m benchmarks.bench_httpclient --requests 500 --concurrency 20
+"""
+import asyncio
+import argparse
+import time
+
+import aiohttp
+
+from benchmarks.stub_server import start_stub_server
+from app.tools.httpclient import HttpClientPool
+
+
+async def per_call_session(url: str):
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            await response.read()
+
+
+async def pooled_session(pool: HttpClientPool, url: str):
+    async with pool.session(url).get(url) as response:
+        await response.read()
+
+
+async def run(label: str, call, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<18} {requests} requests in {elapsed:.3f}s -> {requests / elapsed:.1f} req/s")
+
+
+async def main(requests: int, concurrency: int, latency: float):
+    runner, base_url = await start_stub_server(latency=latency)
+    url = f"{base_url}/search"
+    pool = HttpClientPool()
+    try:
+        await run("per-call session", lambda: per_call_session(url), requests, concurrency)
+        await run("pooled session", lambda: pooled_session(pool, url), requests, concurrency)
+    finally:
+        await pool.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency, args.latency))
@@ -0,0 +1,67 @@
+"""Import-time profile of the backend, summarized from python -X importtime.
+
+The module is imported in a fresh interpreter; the report lists the slowest
+modules by cumulative and by self time, and the self time summed per package
+so a new eager import of a heavy dependency stands out.
+
+Usage:
+    uv run python -m benchmarks.importtime
+    uv run python -m benchmarks.importtime --module app.tools --top 15 --depth 2
+"""
+import argparse
+import subprocess
+import sys
+
+from typing import NamedTuple
+
+
+class ImportTime(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    level: int
+
+
+def profile_imports(module: str) -> list[ImportTime]:
+    """Import module in a fresh interpreter and parse its -X importtime report."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        imports.append(ImportTime(module=name.strip(),
+                                  self_us=int(self_us),
+                                  cumulative_us=int(cumulative_us),
+                                  level=(len(name) - len(name.lstrip()) - 1) // 2))
+    return imports
+
+
+def package_totals(imports: list[ImportTime], depth: int = 1) -> dict[str, int]:
+    """Self time summed per package, the package being the first depth components of the module name."""
+    totals: dict[str, int] = {}
+    for entry in imports:
+        package = ".".join(entry.module.split(".")[:depth])
+        totals[package] = totals.get(package, 0) + entry.self_us
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def print_report(module: str, imports: list[ImportTime], top: int, depth: int):
+    total = sum(entry.self_us for entry in imports)
+    print(f"import {module}: {total / 1e6:.2f}s, {len(imports)} modules")
+    print(f"\n{'cumulative ms':>14} {'self ms':>9}  slowest modules")
+    for entry in sorted(imports, key=lambda entry: entry.cumulative_us, reverse=True)[:top]:
+        print(f"{entry.cumulative_us / 1000:>14.1f} {entry.self_us / 1000:>9.1f}  {'  ' * entry.level}{entry.module}")
+    print(f"\n{'self ms':>14} {'share':>9}  packages")
+    for package, self_us in list(package_totals(imports, depth).items())[:top]:
+        print(f"{self_us / 1000:>14.1f} {self_us / total:>9.1%}  {package}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize python -X importtime for a backend module")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=25, help="Rows per table")
+    parser.add_argument("--depth", type=int, default=2, help="Module name components grouped as a package")
+    args = parser.parse_args()
+    print_report(args.module, profile_imports(args.module), args.top, args.depth)
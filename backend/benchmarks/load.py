@@ -0,0 +1,148 @@
+"""Load driver for /api/query, fully offline by default.
+
+Without --url the ElfAgent app runs in-process on the deterministic fake model
+(FAKE_LLM) against the marketplace stub server, so the numbers measure the
+orchestration overhead and the upstream latency you configure.
+
+Usage:
+    uv run python -m benchmarks.load --concurrency 1 4 16 --requests 32 --upstream-latency 0.2
+    uv run python -m benchmarks.load --url http://localhost:8000 --concurrency 1 2 4
+    uv run python -m benchmarks.load --mode fast
+"""
+import asyncio
+import argparse
+import os
+import statistics
+import time
+
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import httpx
+
+from benchmarks.stub_server import start_stub_server
+
+QUERIES = [
+    "LEGO Technic set under 60 euro",
+    "A creative building toy for my nephew, budget 30 euro",
+    "Technic car kit as a christmas present",
+    "nintendo switch under 300€",
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+@asynccontextmanager
+async def in_process_client(stub_url: str, llm_latency: float, query_cache: bool = False,
+                            director: str = "sequential"):
+    """Yield an httpx client bound to the app running in-process on the fake model."""
+    os.environ.update({
+        "DIRECTOR_MODE": director,
+        "FAKE_LLM": "true",
+        "FAKE_LLM_LATENCY": str(llm_latency),
+        "AMAZON_API_URL": stub_url,
+        "ALIBABA_API_URL": stub_url,
+        # Off by default: repeated benchmark queries would all be answered from the cache
+        "QUERY_CACHE_ENABLED": str(query_cache).lower(),
+    })
+    for name in ("GOOGLE_API_KEY", "OPENAI_API_KEY", "LLM_MODEL", "RAPIDAPI_KEY"):
+        os.environ.setdefault(name, "offline-benchmark")
+
+    # Imported late so the environment above is seen by app.utils.const
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://elfagent",
+                                     timeout=None) as client:
+            yield client
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, requests: int, mode: str = "full") -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+    shed = 0
+
+    async def one(i: int):
+        nonlocal errors, shed
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/api/query", json={
+                "query": QUERIES[i % len(QUERIES)],
+                "user_id": f"bench_user_{i % concurrency}",
+                "mode": mode,
+            })
+            latencies.append(time.perf_counter() - started)
+            if response.status_code == 503:
+                shed += 1
+            elif response.status_code != 200 or response.json().get("status") != "completed":
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "shed": shed,
+        "rps": requests / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": statistics.fmean(latencies),
+    }
+
+
+def print_report(results: list[dict]):
+    print(f"{'conc':>5} {'reqs':>6} {'err':>5} {'503':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for r in results:
+        print(f"{r['concurrency']:>5} {r['requests']:>6} {r['errors']:>5} {r['shed']:>5} {r['rps']:>8.2f} "
+              f"{r['p50'] * 1000:>9.1f} {r['p95'] * 1000:>9.1f} {r['p99'] * 1000:>9.1f}")
+
+
+async def main(url: Optional[str], levels: list[int], requests: int, upstream_latency: float,
+               jitter: float, error_rate: float, llm_latency: float, mode: str = "full",
+               query_cache: bool = False, director: str = "sequential"):
+    results = []
+    if url:
+        async with httpx.AsyncClient(base_url=url, timeout=None) as client:
+            for concurrency in levels:
+                results.append(await run_level(client, concurrency, max(requests, concurrency), mode))
+    else:
+        stub, stub_url = await start_stub_server(latency=upstream_latency, jitter=jitter,
+                                                 error_rate=error_rate)
+        try:
+            async with in_process_client(stub_url, llm_latency, query_cache, director) as client:
+                # Warm-up request so imports and pools are not measured
+                await run_level(client, 1, 1, mode)
+                for concurrency in levels:
+                    results.append(await run_level(client, concurrency, max(requests, concurrency), mode))
+        finally:
+            await stub.cleanup()
+    print_report(results)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure /api/query latency percentiles and throughput")
+    parser.add_argument("--url", help="Benchmark a running server instead of the offline in-process app")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=32, help="Requests per concurrency level")
+    parser.add_argument("--upstream-latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds per fake model call")
+    parser.add_argument("--mode", choices=["full", "fast"], default="full")
+    parser.add_argument("--query-cache", action="store_true", help="Keep the semantic query cache enabled")
+    parser.add_argument("--director", choices=["sequential", "speculative"], default="sequential",
+                        help="DirectorAgent mode of the offline app")
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.concurrency, args.requests, args.upstream_latency,
+                     args.jitter, args.error_rate, args.llm_latency, args.mode,
+                     args.query_cache, args.director))
@@ -0,0 +1,75 @@
+"""Cold start benchmark: fresh interpreter to a warm, ready worker.
+
+Every run starts a new interpreter that imports app.main, enters the app
+lifespan and waits for the worker warm-up, all offline on the fake model
+(FAKE_LLM) unless --real-models is passed. With --max-ready the command
+exits with status 1 when the median time to ready exceeds it, so it can
+guard startup regressions in CI.
+
+Usage:
+    uv run python -m benchmarks.startup --runs 5
+    uv run python -m benchmarks.startup --runs 5 --max-ready 6
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PHASES = ("import_s", "lifespan_s", "ready_s")
+
+
+async def probe() -> dict:
+    """Time the startup phases of the app in this interpreter."""
+    started = time.perf_counter()
+    import app.main as main
+    imported = time.perf_counter()
+    async with main.app.router.lifespan_context(main.app):
+        entered = time.perf_counter()
+        await main.ready.wait()
+        ready = time.perf_counter()
+    return {"import_s": imported - started,
+            "lifespan_s": entered - imported,
+            "ready_s": ready - started,
+            "modules": len(sys.modules)}
+
+
+def run_once(real_models: bool) -> dict:
+    env = {**os.environ, "FAKE_LLM": str(not real_models).lower(), "DEAL_INDEX_CATEGORIES": ""}
+    for name in ("GOOGLE_API_KEY", "OPENAI_API_KEY", "LLM_MODEL", "RAPIDAPI_KEY"):
+        env.setdefault(name, "offline-benchmark")
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-m", "benchmarks.startup", "--probe"],
+                            capture_output=True, text=True, env=env, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["process_s"] = time.perf_counter() - started
+    return timings
+
+
+def print_report(runs: list[dict]):
+    print(f"{'phase':>12} {'median s':>9} {'min s':>7} {'max s':>7}")
+    for phase in (*PHASES, "process_s"):
+        values = [run[phase] for run in runs]
+        print(f"{phase:>12} {statistics.median(values):>9.3f} {min(values):>7.3f} {max(values):>7.3f}")
+    print(f"{'modules':>12} {runs[-1]['modules']:>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cold start of the API worker")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--real-models", action="store_true", help="Build the real model clients")
+    parser.add_argument("--max-ready", type=float, help="Fail when the median seconds to ready exceed it")
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.probe:
+        print(json.dumps(asyncio.run(probe())))
+        sys.exit(0)
+    runs = [run_once(args.real_models) for _ in range(args.runs)]
+    print_report(runs)
+    median_ready = statistics.median(run["ready_s"] for run in runs)
+    if args.max_ready is not None and median_ready > args.max_ready:
+        print(f"❌ Median time to ready {median_ready:.2f}s exceeds {args.max_ready:.2f}s")
+        sys.exit(1)
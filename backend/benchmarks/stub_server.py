@@ -0,0 +1,125 @@
+"""Stub of the RapidAPI marketplace endpoints replaying recorded responses.
+
+Usage:
+    uv run python -m benchmarks.stub_server --port 8090 --latency 0.2 --jitter 0.05 --error-rate 0.02
+"""
+import asyncio
+import argparse
+import base64
+import json
+import random
+
+from pathlib import Path
+from aiohttp import web
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+# route -> recorded response replayed for every request
+RECORDINGS = {
+    "/search": "amazon_search.json",
+    "/item_search_4": "alibaba_item_search_4.json",
+}
+
+
+def load_fixture(name: str) -> dict:
+    with open(FIXTURES_DIR / name, encoding="utf-8") as f:
+        return json.load(f)
+
+
+AMAZON_PAYLOAD = load_fixture(RECORDINGS["/search"])
+ALIBABA_PAYLOAD = load_fixture(RECORDINGS["/item_search_4"])
+# 1x1 GIF answered for every product photo under /images/
+PHOTO = base64.b64decode("R0lGODlhAQABAIAAAP///wAAACH5BAEAAAAALAAAAAABAAEAAAICRAEAOw==")
+
+
+def build_stub_app(latency: float = 0.0,
+                   jitter: float = 0.0,
+                   error_rate: float = 0.0,
+                   rate_limit_rate: float = 0.0,
+                   seed: int = 0,
+                   quota: int = 0) -> web.Application:
+    """Build an aiohttp app answering like the RapidAPI marketplace endpoints.
+
+    Every request waits latency ± jitter seconds, then fails with a 429 with
+    probability rate_limit_rate, with a 500 with probability error_rate, and
+    otherwise replays the recorded response for its route. With a monthly quota
+    the RapidAPI X-RateLimit-Requests-* headers are sent and requests past the
+    quota get a 429.
+    """
+    rng = random.Random(seed)
+    stats = {"requests": 0, "errors": 0, "rate_limited": 0, "photos": 0}
+
+    def make_handler(payload: dict):
+        body = json.dumps(payload).encode()
+
+        async def handler(request: web.Request):
+            stats["requests"] += 1
+            delay = max(0.0, latency + rng.uniform(-jitter, jitter))
+            if delay:
+                await asyncio.sleep(delay)
+            draw = rng.random()
+            headers = {}
+            if quota:
+                remaining = max(0, quota - stats["requests"])
+                headers = {"X-RateLimit-Requests-Limit": str(quota),
+                           "X-RateLimit-Requests-Remaining": str(remaining),
+                           "X-RateLimit-Requests-Reset": "86400"}
+                if stats["requests"] > quota:
+                    stats["rate_limited"] += 1
+                    return web.json_response({"message": "You have exceeded the MONTHLY quota"},
+                                             status=429, headers=headers)
+            if draw < rate_limit_rate:
+                stats["rate_limited"] += 1
+                return web.json_response({"message": "Too many requests"}, status=429,
+                                         headers={"Retry-After": "1"})
+            if draw < rate_limit_rate + error_rate:
+                stats["errors"] += 1
+                return web.json_response({"message": "Internal Server Error"}, status=500)
+            return web.Response(body=body, content_type="application/json", headers=headers)
+        return handler
+
+    async def get_photo(request: web.Request):
+        stats["photos"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        return web.Response(body=PHOTO, content_type="image/gif")
+
+    async def get_stats(request: web.Request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    for route, fixture in RECORDINGS.items():
+        app.router.add_get(route, make_handler(load_fixture(fixture)))
+    app.router.add_get("/images/{name}", get_photo)
+    app.router.add_get("/_stats", get_stats)
+    app["stats"] = stats
+    return app
+
+
+async def start_stub_server(host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, **options):
+    """Start the stub server and return (runner, base_url).
+
+    Extra options (jitter, error_rate, rate_limit_rate, seed, quota) go to build_stub_app.
+    """
+    runner = web.AppRunner(build_stub_app(latency, **options))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RapidAPI marketplace stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds of artificial latency per request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform ± jitter added to the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quota", type=int, default=0, help="Monthly quota announced in the rate limit headers")
+    args = parser.parse_args()
+    web.run_app(build_stub_app(args.latency, args.jitter, args.error_rate, args.rate_limit_rate, args.seed,
+                               args.quota),
+                host=args.host, port=args.port)
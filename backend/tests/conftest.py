@@ -0,0 +1,26 @@
+import pytest
+import app.tools.images as images
+
+from app.tools.dealindex import deal_index
+from app.tools.ratelimit import QuotaStore, rate_limiter
+
+
+@pytest.fixture(autouse=True)
+def quota_file(tmp_path, monkeypatch):
+    """Count the requests made by the tests in a throwaway quota file, not in the real monthly one"""
+    monkeypatch.setattr(rate_limiter, "quota", QuotaStore(str(tmp_path / "quota.json")))
+
+
+@pytest.fixture(autouse=True)
+def deal_index_file(tmp_path, monkeypatch):
+    """Open the shared deal index, if a test does, under tmp_path instead of the working directory"""
+    monkeypatch.setattr(deal_index, "path", str(tmp_path / "deals.db"))
+    yield
+    deal_index.close()
+
+
+@pytest.fixture(autouse=True)
+def image_cache_file(tmp_path, monkeypatch):
+    """Open the shared image cache, if a test does, under tmp_path instead of the working directory"""
+    monkeypatch.setattr(images, "IMAGE_CACHE_PATH", str(tmp_path / "images.db"))
+    monkeypatch.setattr(images.image_proxy, "_backend", None)
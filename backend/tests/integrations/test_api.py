@@ -35,3 +35,100 @@ async def test_query_endpoint():
             assert "session_id" in data
             assert "user_id" in data
             assert "response" in data
+            assert "gifts" in data
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    """Test Prometheus metrics endpoint"""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/metrics")
+        assert response.status_code == 200
+        assert "elfagent_agent_duration_seconds" in response.text
+
+@pytest.mark.asyncio
+async def test_health_reports_starting_until_warm(monkeypatch):
+    """Test /health answers 503 while the worker warms up"""
+    import asyncio
+    import app.main as main
+    monkeypatch.setattr(main, "ready", asyncio.Event())
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/health")
+        assert response.status_code == 503
+        assert response.json()["status"] == "starting"
+        main.ready.set()
+        response = await client.get("/health")
+        assert response.status_code == 200
+        assert response.json()["worker_pid"] > 0
+
+@pytest.mark.asyncio
+async def test_large_responses_are_compressed():
+    """Test responses above the compression threshold are sent gzipped, small ones as is"""
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/health", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.json()["status"] == "healthy"
+        response = await client.get("/", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+
+@pytest.mark.asyncio
+async def test_image_endpoint_serves_cacheable_photos(monkeypatch):
+    """Test proxied photos are sent with long-lived caching headers and revalidate with 304"""
+    import app.main as main
+    from app.tools.cache import MemoryCacheBackend
+    from app.tools.images import ImageProxy
+    from benchmarks.stub_server import PHOTO, start_stub_server
+    runner, base_url = await start_stub_server()
+    proxy = ImageProxy(MemoryCacheBackend(), allowed_hosts=("127.0.0.1",))
+    monkeypatch.setattr(main, "image_proxy", proxy)
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/api/images", params={"url": f"{base_url}/images/a.gif", "w": 100})
+            assert response.status_code == 200
+            assert response.content == PHOTO
+            assert "immutable" in response.headers["cache-control"]
+            etag = response.headers["etag"]
+            response = await client.get("/api/images", params={"url": f"{base_url}/images/a.gif", "w": 100},
+                                        headers={"If-None-Match": etag})
+            assert response.status_code == 304
+            response = await client.get("/api/images", params={"url": "https://example.com/a.gif"})
+            assert response.status_code == 403
+    finally:
+        await proxy.close()
+        await runner.cleanup()
+
+@pytest.mark.asyncio
+async def test_only_complete_answers_are_cached(monkeypatch):
+    """Test answers with a degraded marketplace are not cached, cache hits return their marketplace status"""
+    import time
+    import app.main as main
+    from app.utils.querycache import SemanticQueryCache
+    statuses = iter([{"Amazon": "ok", "Alibaba": "rate_limited"}, {"Amazon": "ok", "Alibaba": "ok"}])
+    runs = []
+
+    async def run_session(query_runner, session_svc, user_id, queries, session_id):
+        runs.append(queries)
+        return f"answer {len(runs)}"
+
+    async def get_marketplace_status(user_id, session_id):
+        return next(statuses)
+
+    async def no_history(user_id, session_id):
+        return False
+
+    async def record_turn(*args):
+        pass
+
+    monkeypatch.setattr(main, "QUERY_CACHE_ENABLED", True)
+    monkeypatch.setattr(main, "query_cache", SemanticQueryCache())
+    monkeypatch.setattr(main, "run_session", run_session)
+    monkeypatch.setattr(main, "get_marketplace_status", get_marketplace_status)
+    monkeypatch.setattr(main, "has_history", no_history)
+    monkeypatch.setattr(main, "record_turn", record_turn)
+    deadline = time.monotonic() + 10
+    for _ in range(2):
+        answer = await main.answer_query(None, "full", "user", "session", "lego under 50", deadline)
+        assert not answer["cached"]
+    hit = await main.answer_query(None, "full", "user", "session", "lego under 50", deadline)
+    assert len(runs) == 2
+    assert hit["cached"] and hit["response"] == "answer 2"
+    assert hit["marketplace_status"] == {"Amazon": "ok", "Alibaba": "ok"}
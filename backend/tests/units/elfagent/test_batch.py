@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+import app.tools.marketplaces as marketplaces
+
+from app.elfagent.batch import BatchJobs, Lookup, plan_lookups, run_batch
+from app.tools import MARKETPLACES
+from app.tools.cache import MemoryCacheBackend, ResponseCache
+from app.tools.httpclient import http_pool
+from app.utils.admission import AdmissionRejected
+from benchmarks.stub_server import start_stub_server
+
+QUERIES = [
+    "cheap LEGO Technic under 50€",
+    "lego technic below 50",
+    "Christmas gift ideas for my grandmother",
+    "nintendo switch",
+    "Nintendo  Switch for a christmas gift",
+]
+
+
+def test_plan_lookups_merges_equivalent_queries():
+    """Test differently worded queries for the same product and price share a lookup"""
+    plan = plan_lookups(QUERIES)
+    assert plan == {Lookup("lego technic", 50.0): [0, 1], Lookup("nintendo switch", None): [3, 4]}
+
+
+@pytest.mark.asyncio
+async def test_batch_searches_each_lookup_once(monkeypatch):
+    """Test the items of a batch share the marketplace searches of their product"""
+    runner, base_url = await start_stub_server(latency=0.05)
+    for adapter in MARKETPLACES.values():
+        monkeypatch.setattr(adapter, "base_url", base_url)
+    monkeypatch.setattr(marketplaces, "RAPIDAPI_API_KEY", "test-key")
+    monkeypatch.setattr(marketplaces, "deals_cache", ResponseCache(MemoryCacheBackend()))
+    monkeypatch.setattr(marketplaces, "stale_store", MemoryCacheBackend())
+    jobs = BatchJobs(store=MemoryCacheBackend())
+
+    async def answer(index: int, query: str) -> dict:
+        fast_query = plan_lookups([query])
+        for lookup in fast_query:
+            await asyncio.gather(*(adapter.search(lookup.product.title(), lookup.max_price)
+                                   for adapter in MARKETPLACES.values()))
+        return {"response": query.upper()}
+
+    job = jobs.create(len(QUERIES), "user", "fast")
+    try:
+        await run_batch(job, QUERIES, answer, concurrency=2, jobs=jobs)
+    finally:
+        await http_pool.close()
+        await runner.cleanup()
+    # 2 unique lookups x 2 marketplaces, whatever the number of items needing them
+    assert runner.app["stats"]["requests"] == 4
+    assert job.lookups == {"direct_items": 4, "unique": 2, "searches": 4}
+    assert job.status == "completed"
+    assert job.completed == len(QUERIES)
+
+
+@pytest.mark.asyncio
+async def test_batch_streams_results_and_can_be_polled():
+    """Test results stream as they complete, failures included, and the job stays pollable"""
+    jobs = BatchJobs(store=MemoryCacheBackend())
+    running = 0
+    peak = 0
+
+    async def answer(index: int, query: str) -> dict:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01 * (3 - index))
+        running -= 1
+        if index == 1:
+            raise AdmissionRejected("queue full", 2)
+        return {"response": f"gifts for {query}"}
+
+    queries = ["gift ideas for a dad", "gift ideas for a mum", "gift ideas for a teacher"]
+    job = jobs.create(len(queries), "user", "full")
+    job.task = asyncio.create_task(run_batch(job, queries, answer, concurrency=2, jobs=jobs))
+    streamed = [result async for result in job.updates()]
+    await job.task
+
+    assert peak == 2
+    assert [result["index"] for result in streamed] == [1, 0, 2]
+    assert streamed[0]["status"] == "failed"
+    assert streamed[0]["error"] == "Server busy: queue full"
+    snapshot = await jobs.get(job.id)
+    assert snapshot["status"] == "completed"
+    assert (snapshot["completed"], snapshot["failed"], snapshot["pending"]) == (2, 1, 0)
+    assert [result["index"] for result in snapshot["results"]] == [0, 1, 2]
+    assert "results" not in await jobs.get(job.id, include_results=False)
+    assert await jobs.get("unknown") is None
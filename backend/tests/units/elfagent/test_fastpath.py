@@ -0,0 +1,55 @@
+import json
+import pytest
+from google.adk.apps import App
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+
+from app.elfagent.fastpath import FastPathAgent, FastQuery, extract_fast_query
+from app.utils import run_session
+
+AMAZON_PAYLOAD = {"data": {"products": [
+    {"product_title": "Nintendo Switch OLED", "product_price": "289,99 €",
+     "product_original_price": "349,99 €", "product_star_rating": "4.8",
+     "product_url": "https://www.amazon.it/dp/B0SWITCH"},
+]}}
+
+
+def test_extract_fast_query_with_price_cap():
+    """Test product name and price cap are parsed from direct product queries"""
+    assert extract_fast_query("nintendo switch under 300€") == FastQuery("nintendo switch", 300.0)
+    assert extract_fast_query("Find me a LEGO Technic set max 59,90 euro") == FastQuery("LEGO Technic set", 59.9)
+    assert extract_fast_query("airpods pro as a christmas gift") == FastQuery("airpods pro", None)
+
+def test_extract_fast_query_rejects_open_questions():
+    """Test open gift questions are left to the full pipeline"""
+    assert extract_fast_query("What should I buy for my dad who loves fishing?") is None
+    assert extract_fast_query("gift ideas for a 10 year old under 50€") is None
+    assert extract_fast_query("under 50€") is None
+
+@pytest.mark.asyncio
+async def test_fast_path_agent_calls_marketplaces_directly():
+    """Test the fast path searches every marketplace in parallel and aggregates without LLM"""
+    calls = []
+
+    async def amazon_tool(item, max_price=None):
+        calls.append(("Amazon", item, max_price))
+        return AMAZON_PAYLOAD
+
+    async def broken_tool(item, max_price=None):
+        calls.append(("Alibaba", item, max_price))
+        raise RuntimeError("upstream down")
+
+    agent = FastPathAgent(name="FastPathAgent",
+                          marketplace_tools={"Amazon": amazon_tool, "Alibaba": broken_tool})
+    session_service = InMemorySessionService()
+    runner = Runner(app=App(name="elfagent", root_agent=agent), session_service=session_service)
+
+    response = await run_session(runner, session_service, "user", ["nintendo switch under 300€"], "session")
+
+    assert sorted(calls) == [("Alibaba", "nintendo switch", 300.0), ("Amazon", "nintendo switch", 300.0)]
+    gifts = json.loads(response)["gifts"]
+    assert [gift["name"] for gift in gifts] == ["Nintendo Switch OLED"]
+    assert gifts[0]["current_price"] == 289.99
+    session = await session_service.get_session(app_name="elfagent", user_id="user", session_id="session")
+    assert session.state["products"]["products"][0]["marketplace_source"] == "Amazon"
+    assert session.state["products"]["marketplace_status"] == {"Amazon": "ok", "Alibaba": "error"}
@@ -0,0 +1,20 @@
+from app.elfagent.gifts import extract_gifts
+
+
+def test_gifts_are_validated_into_typed_models():
+    """Test prices are parsed, invalid gifts dropped and the order kept"""
+    answer = 'Here are your gifts!\n```json\n{"gifts": [' \
+             '{"name": "LEGO Technic", "current_price": "49,99 €", "original_price": 79.99, "rating": "4.7"},' \
+             '{"description": "a gift without name"},' \
+             '{"name": "Nintendo Switch", "current_price": null, "rating": "N/A"}]}\n```'
+    gifts = extract_gifts(answer)
+    assert [gift.name for gift in gifts] == ["LEGO Technic", "Nintendo Switch"]
+    assert (gifts[0].current_price, gifts[0].original_price, gifts[0].rating) == (49.99, 79.99, 4.7)
+    assert gifts[1].rating is None
+
+
+def test_answers_without_gifts_are_not_structured():
+    """Test prose answers and other JSON documents give no gifts"""
+    assert extract_gifts("I could not find any deal, sorry!") is None
+    assert extract_gifts('{"products": []}') is None
+    assert extract_gifts('{"gifts": []}') == []
@@ -0,0 +1,61 @@
+import json
+import pytest
+
+from typing import AsyncGenerator
+from google.adk.agents import BaseAgent
+from google.adk.apps import App
+from google.adk.events import Event, EventActions
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+from app.elfagent.handoff import ProductHandoffPlugin
+from app.tools.catalog import store_products
+from app.utils import run_session
+
+
+def product(title: str, url: str) -> dict:
+    return {"product_title": title, "product_description": "", "product_price": 40.0,
+            "product_original_price": 50.0, "product_star_rating": 4.5, "product_url": url,
+            "product_image": f"{url}.jpg", "marketplace_source": "Amazon"}
+
+
+class IdsAgent(BaseAgent):
+    """Stores the products like the tools do, then answers with some of their ids"""
+
+    products: list = []
+    answer: str = ""
+
+    async def _run_async_impl(self, ctx) -> AsyncGenerator[Event, None]:
+        state_delta = {}
+        views = store_products(state_delta, self.products)
+        yield Event(author=self.name, invocation_id=ctx.invocation_id, branch=ctx.branch,
+                    actions=EventActions(state_delta=state_delta))
+        text = self.answer.format(*(view["id"] for view in views))
+        yield Event(author=self.name, invocation_id=ctx.invocation_id, branch=ctx.branch,
+                    content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+async def answer(agent: BaseAgent) -> str:
+    session_service = InMemorySessionService()
+    runner = Runner(app=App(name="elfagent", root_agent=agent, plugins=[ProductHandoffPlugin()]),
+                    session_service=session_service)
+    return await run_session(runner, session_service, "user", ["lego technic"], "session")
+
+
+@pytest.mark.asyncio
+async def test_final_gift_ids_are_expanded_into_the_gifts_json():
+    """Test the ids answered by ElfAgent become full gifts, in the answered order"""
+    agent = IdsAgent(name="ElfAgent", products=[product("Falcon", "https://a/1"), product("Box", "https://a/2")],
+                     answer='```json\n{{"gifts": ["{1}", "{0}", "p-9zzzzz"]}}\n```')
+    gifts = json.loads(await answer(agent))["gifts"]
+    assert [gift["name"] for gift in gifts] == ["Box", "Falcon"]
+    assert gifts[0]["order_url"] == "https://a/2" and gifts[0]["image_url"] == "https://a/2.jpg"
+
+
+@pytest.mark.asyncio
+async def test_other_agents_and_answers_without_ids_are_left_alone():
+    """Test only the final ranking agents are expanded"""
+    falcon = product("Falcon", "https://a/1")
+    ids = await answer(IdsAgent(name="MarketplaceAgent", products=[falcon], answer='{{"ids": ["{0}"]}}'))
+    assert ids.startswith('{"ids"')
+    assert await answer(IdsAgent(name="ElfAgent", products=[falcon], answer="No gifts found")) == "No gifts found"
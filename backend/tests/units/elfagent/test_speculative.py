@@ -0,0 +1,91 @@
+import asyncio
+import json
+import time
+import pytest
+import app.elfagent.speculative as speculative
+
+from typing import AsyncGenerator
+from google.adk.agents import BaseAgent
+from google.adk.apps import App
+from google.adk.events import Event, EventActions
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from app.elfagent.speculative import SpeculativeDirectorAgent, research_product_names
+from app.utils import run_session
+
+
+class StubAgent(BaseAgent):
+    """Writes its state after a delay, recording when it ran"""
+
+    state: dict = {}
+    delay: float = 0.0
+    runs: list = []
+
+    async def _run_async_impl(self, ctx) -> AsyncGenerator[Event, None]:
+        await asyncio.sleep(self.delay)
+        self.runs.append(time.monotonic())
+        yield Event(author=self.name, invocation_id=ctx.invocation_id, branch=ctx.branch,
+                    actions=EventActions(state_delta=self.state))
+
+
+def fake_search(searches: list):
+    async def search_payloads(products, max_price=None, marketplaces=None):
+        searches.append((time.monotonic(), list(products), max_price))
+        await asyncio.sleep(0.05)
+        return [("Amazon", {"data": {"products": [
+            {"product_title": f"{product} deluxe", "product_price": "40,00 €", "product_original_price": "50,00 €",
+             "product_star_rating": "4.5", "product_url": f"https://www.amazon.it/dp/{len(searches)}"}
+        ]}}) for product in products]
+    return search_payloads
+
+
+async def run_director(research: StubAgent, query: str):
+    marketplace_agent = StubAgent(name="MarketplaceAgent", state={"deals": "from the marketplace agent"}, runs=[])
+    director = SpeculativeDirectorAgent(name="DirectorAgent", sub_agents=[research, marketplace_agent])
+    session_service = InMemorySessionService()
+    runner = Runner(app=App(name="elfagent", root_agent=director), session_service=session_service)
+    await run_session(runner, session_service, "user", [query], "session")
+    session = await session_service.get_session(app_name="elfagent", user_id="user", session_id="session")
+    return session.state, marketplace_agent
+
+
+def test_research_product_names_tolerates_loose_json():
+    """Test product names are read from fenced, not quite valid JSON and deduplicated"""
+    research = '```json\n[{"product_name": "LEGO Technic Ferrari", "price": "349€",},\n' \
+               '{"product_name": "lego technic ferrari under 400€"}, {"product_name": "Nintendo Switch"}]\n```'
+    assert research_product_names(research) == ["LEGO Technic Ferrari", "Nintendo Switch"]
+    assert research_product_names(None) == []
+
+
+@pytest.mark.asyncio
+async def test_speculation_overlaps_research_and_reuses_matches(monkeypatch):
+    """Test the named product is searched during the research and only new products after it"""
+    searches = []
+    monkeypatch.setattr(speculative, "search_payloads", fake_search(searches))
+    research = StubAgent(name="ProductSearchAgent", delay=0.1, runs=[], state={"google_results": json.dumps(
+        [{"product_name": "Lego Technic Ferrari"}, {"product_name": "LEGO Technic Lamborghini"}])})
+
+    state, marketplace_agent = await run_director(research, "lego technic ferrari under 400€")
+
+    assert [(products, max_price) for _, products, max_price in searches] == [
+        (["lego technic ferrari"], 400.0), (["LEGO Technic Lamborghini"], 400.0)]
+    # The speculative search started before the research ended
+    assert searches[0][0] < research.runs[0]
+    assert not marketplace_agent.runs
+    titles = {product["product_title"] for product in state["deals"]["products"]}
+    assert titles == {"lego technic ferrari deluxe", "LEGO Technic Lamborghini deluxe"}
+    assert state["products"] == state["deals"]
+
+
+@pytest.mark.asyncio
+async def test_open_questions_fall_back_to_the_marketplace_agent(monkeypatch):
+    """Test without a named product nor research products the marketplace agent runs"""
+    searches = []
+    monkeypatch.setattr(speculative, "search_payloads", fake_search(searches))
+    research = StubAgent(name="ProductSearchAgent", runs=[], state={"google_results": "no idea"})
+
+    state, marketplace_agent = await run_director(research, "What should I buy for my dad?")
+
+    assert not searches
+    assert len(marketplace_agent.runs) == 1
+    assert state["deals"] == "from the marketplace agent"
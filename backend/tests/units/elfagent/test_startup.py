@@ -0,0 +1,39 @@
+from benchmarks.importtime import profile_imports, package_totals
+
+
+def test_app_import_defers_model_clients():
+    """Test importing app.main does not import litellm, the model clients are built on first use"""
+    imports = profile_imports("app.main")
+    modules = {entry.module for entry in imports}
+    assert "app.main" in modules
+    assert "litellm" not in modules
+    assert "google.adk.models.lite_llm" not in modules
+    assert "app" in package_totals(imports)
+
+
+def test_agent_graphs_are_built_once():
+    """Test root_agent is built on first access and reused"""
+    import app.elfagent as elfagent
+    assert elfagent.root_agent is elfagent.build_agents()["root_agent"]
+    assert elfagent.root_agent.name == "ElfAgent"
+    assert elfagent.fast_agent.name == "FastPathAgent"
+
+
+def test_serve_forks_workers_only_when_asked(monkeypatch):
+    """Test app.serve runs one worker on the default backends unless more workers are requested"""
+    import importlib
+    import os
+    import uvicorn
+    from app import serve
+    runs = []
+    monkeypatch.setattr(uvicorn, "run", lambda app, **options: runs.append(options["workers"]))
+    monkeypatch.setattr(os, "environ", {name: value for name, value in os.environ.items()
+                                        if name not in ("WEB_WORKERS", "CACHE_BACKEND", "SESSION_BACKEND")})
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    importlib.reload(serve)
+    serve.serve([])
+    assert runs == [1]
+    assert "CACHE_BACKEND" not in os.environ and "SESSION_BACKEND" not in os.environ
+    serve.serve(["--workers", "3"])
+    assert runs == [1, 3]
+    assert os.environ["CACHE_BACKEND"] == os.environ["SESSION_BACKEND"] == "sqlite"
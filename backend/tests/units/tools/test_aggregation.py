@@ -0,0 +1,75 @@
+import pytest
+from app.tools.aggregation import parse_price, aggregate_products
+
+AMAZON_PAYLOAD = {
+    "data": {
+        "products": [
+            {"product_title": "LEGO Star Wars Millennium Falcon 75257",
+             "product_price": "79,99 €", "product_original_price": "169,99 €",
+             "currency": "EUR", "product_star_rating": "4.8",
+             "product_url": "https://www.amazon.it/dp/B07Q2V8F8X",
+             "product_photo": "https://m.media-amazon.com/images/falcon.jpg"},
+            {"product_title": "LEGO Classic Creative Box",
+             "product_price": "19,99 €", "product_original_price": None,
+             "currency": "EUR", "product_star_rating": "4.7",
+             "product_url": "https://www.amazon.it/dp/B00NHQFA1I",
+             "product_photo": "https://m.media-amazon.com/images/box.jpg"},
+        ]
+    }
+}
+
+ALIBABA_PAYLOAD = {
+    "result": {
+        "resultList": [
+            {"item": {"title": "Lego Star Wars Millennium Falcon 75257",
+                      "itemUrl": "//www.aliexpress.com/item/1.html",
+                      "image": "//ae01.alicdn.com/kf/falcon.jpg",
+                      "averageStarRate": "4.5",
+                      "sku": {"def": {"price": "120.00", "promotionPrice": "60.00"}}}},
+            {"item": {"title": "Building Blocks Christmas Tree",
+                      "itemUrl": "//www.aliexpress.com/item/2.html",
+                      "image": "//ae01.alicdn.com/kf/tree.jpg",
+                      "sku": {"def": {"price": "10.00", "promotionPrice": "4.00"}}}},
+        ]
+    }
+}
+
+@pytest.mark.parametrize("raw, expected", [
+    ("19,99 €", (19.99, "EUR")),
+    ("€1.299,00", (1299.0, "EUR")),
+    ("$1,299.00", (1299.0, "USD")),
+    ("12.50", (12.5, "EUR")),
+    (7, (7.0, "EUR")),
+    ("n/a", (None, "EUR")),
+])
+def test_parse_price(raw, expected):
+    """Test price strings in the marketplace formats"""
+    assert parse_price(raw) == expected
+
+def test_aggregate_products_dedups_and_ranks_by_discount():
+    """Test Amazon and Alibaba payloads are merged into the products schema"""
+    result = aggregate_products([("Amazon", AMAZON_PAYLOAD), ("Alibaba", ALIBABA_PAYLOAD)])
+    products = result["products"]
+    titles = [product["product_title"] for product in products]
+    assert len(products) == 3
+    # The cheaper Alibaba Falcon wins the duplicate group
+    assert titles[0] == "Building Blocks Christmas Tree"
+    assert titles[1] == "Lego Star Wars Millennium Falcon 75257"
+    assert products[1]["marketplace_source"] == "Alibaba"
+    assert products[1]["product_url"] == "https://www.aliexpress.com/item/1.html"
+    assert titles[2] == "LEGO Classic Creative Box"
+    assert products[2]["product_original_price"] == 19.99
+
+def test_aggregate_products_ignores_error_payloads():
+    """Test failed tool results do not break the aggregation"""
+    result = aggregate_products([("Amazon", {"msg": "No deals has been found for lego"}),
+                                 ("Alibaba", {})])
+    assert result == {"products": [], "marketplace_status": {"Amazon": "error", "Alibaba": "error"}}
+
+def test_aggregate_products_reports_partial_results():
+    """Test marketplace_status flags the sources that missed their deadline or never answered"""
+    result = aggregate_products([("Amazon", AMAZON_PAYLOAD),
+                                 ("Alibaba", {"error": "deadline_exceeded", "msg": "too slow"})],
+                                marketplaces=["Amazon", "Alibaba", "Ebay"])
+    assert len(result["products"]) == 2
+    assert result["marketplace_status"] == {"Amazon": "ok", "Alibaba": "deadline_exceeded", "Ebay": "missing"}
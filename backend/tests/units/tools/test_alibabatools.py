@@ -0,0 +1,43 @@
+import pytest
+import app.tools.alibabatools as alibabatools
+import app.tools.marketplaces as marketplaces
+
+from app.tools.cache import MemoryCacheBackend, ResponseCache
+from app.tools.httpclient import http_pool
+from benchmarks.stub_server import start_stub_server
+
+
+async def search_on_stub(monkeypatch, item: str, **options):
+    runner, base_url = await start_stub_server(**options)
+    monkeypatch.setattr(alibabatools.alibaba_marketplace, "base_url", base_url)
+    monkeypatch.setattr(marketplaces, "RAPIDAPI_API_KEY", "test-key")
+    monkeypatch.setattr(marketplaces, "deals_cache", ResponseCache(MemoryCacheBackend()))
+    monkeypatch.setattr(marketplaces, "stale_store", MemoryCacheBackend())
+    try:
+        return await alibabatools.get_alibaba_deals_by_product(item, max_price=60)
+    finally:
+        await http_pool.close()
+        await runner.cleanup()
+
+@pytest.mark.asyncio
+async def test_get_alibaba_deals_from_recorded_response(monkeypatch):
+    """Test the Alibaba tool against the recorded item_search_4 response"""
+    result = await search_on_stub(monkeypatch, "lego")
+    items = result["result"]["resultList"]
+    assert len(items) == 5
+    assert items[0]["item"]["sku"]["def"]["promotionPrice"] == "9.90"
+    # Fields the agents never read are pruned away
+    assert "delivery" not in items[0]
+
+@pytest.mark.asyncio
+async def test_get_alibaba_deals_upstream_error(monkeypatch):
+    """Test an upstream 500 ends up in the no deals message"""
+    result = await search_on_stub(monkeypatch, "lego", error_rate=1.0)
+    assert result == {"msg": "No deals has been found for lego"}
+
+@pytest.mark.asyncio
+async def test_get_alibaba_deals_upstream_rate_limited(monkeypatch):
+    """Test an upstream 429 returns the structured rate limited result"""
+    result = await search_on_stub(monkeypatch, "lego", rate_limit_rate=1.0)
+    assert result["error"] == "rate_limited"
+    assert result["retry_after"] == 1
@@ -0,0 +1,31 @@
+import time
+
+from app.tools.breaker import CircuitBreaker, CLOSED, HALF_OPEN, OPEN
+
+
+def test_breaker_opens_after_consecutive_failures():
+    """Test the breaker trips on the threshold and then fails fast"""
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=30)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == CLOSED
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+def test_breaker_half_open_probe_closes_or_reopens():
+    """Test a single probe goes through after the recovery timeout"""
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.01, half_open_calls=1)
+    breaker.record(False)
+    time.sleep(0.02)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert breaker.trips == 2
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
@@ -0,0 +1,74 @@
+import asyncio
+import pytest
+from app.tools.cache import ResponseCache, MemoryCacheBackend, SqliteCacheBackend, make_cache_key
+
+def test_cache_key_normalizes_query():
+    """Test equivalent searches share the same cache key"""
+    assert make_cache_key("amazon", "  LEGO   Star Wars ", 50, "relevance") == \
+        make_cache_key("Amazon", "lego star wars", 50.0, "RELEVANCE")
+    assert make_cache_key("amazon", "lego", 50) != make_cache_key("amazon", "lego", 60)
+
+@pytest.mark.asyncio
+async def test_memory_backend_evicts_least_recently_used():
+    """Test the memory backend stays within its byte budget"""
+    backend = MemoryCacheBackend(max_bytes=10)
+    await backend.set("a", b"12345", ttl=60)
+    await backend.set("b", b"12345", ttl=60)
+    await backend.get("a")
+    await backend.set("c", b"12345", ttl=60)
+    assert await backend.get("b") is None
+    assert await backend.get("a") == b"12345"
+    assert backend.stats()["evictions"] == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_are_coalesced():
+    """Test identical concurrent misses trigger a single upstream call"""
+    cache = ResponseCache(MemoryCacheBackend())
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"data": {"products": [calls]}}
+
+    results = await asyncio.gather(*(cache.get_or_fetch("k", 60, fetch) for _ in range(5)))
+    assert calls == 1
+    assert all(result == {"data": {"products": [1]}} for result in results)
+    assert await cache.get_or_fetch("k", 60, fetch) == {"data": {"products": [1]}}
+    assert cache.stats()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_waiters_refetch_when_the_leader_is_cancelled():
+    """Test requests coalesced on a cancelled fetch get a result instead of the cancellation"""
+    cache = ResponseCache(MemoryCacheBackend())
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"data": calls}
+
+    leader = asyncio.create_task(cache.get_or_fetch("k", 60, fetch))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(cache.get_or_fetch("k", 60, fetch)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    results = await asyncio.gather(*waiters)
+    assert leader.cancelled()
+    assert results == [{"data": 2}, {"data": 2}]
+    assert calls == 2
+
+@pytest.mark.asyncio
+async def test_failed_results_are_not_cached(tmp_path):
+    """Test error payloads are not stored in the sqlite backend"""
+    cache = ResponseCache(SqliteCacheBackend(str(tmp_path / "cache.db")))
+
+    async def fetch():
+        return {"msg": "No deals has been found for lego"}
+
+    await cache.get_or_fetch("k", 60, fetch)
+    await cache.get_or_fetch("k", 60, fetch)
+    assert cache.stats()["misses"] == 2
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,32 @@
+from app.tools.catalog import product_id, store_products, load_products, parse_product_ids
+
+FALCON = {"product_title": "LEGO Star Wars Millennium Falcon 75257", "product_price": 79.99,
+          "product_original_price": 169.99, "product_star_rating": 4.8, "marketplace_source": "Amazon",
+          "product_url": "https://www.amazon.it/dp/B07Q2V8F8X", "product_image": "", "product_description": ""}
+BOX = {**FALCON, "product_title": "LEGO Classic Creative Box", "product_url": "https://www.amazon.it/dp/B00NHQFA1I"}
+
+
+def test_product_ids_are_compact_and_stable():
+    """Test the id of a product depends only on its url and has the compact form"""
+    assert product_id(FALCON) == product_id({**FALCON, "product_price": 59.99})
+    assert product_id(FALCON) != product_id(BOX)
+    assert parse_product_ids(product_id(FALCON)) == [product_id(FALCON)]
+
+
+def test_records_are_stored_once_per_id_and_loaded_in_answer_order():
+    """Test agents get compact views and their ids are expanded back, unknown ids skipped"""
+    state = {}
+    views = store_products(state, [FALCON, BOX])
+    assert views[0] == {"id": product_id(FALCON), "title": FALCON["product_title"], "price": 79.99,
+                        "original_price": 169.99, "rating": 4.8, "marketplace": "Amazon"}
+    assert len(state) == 2
+
+    answer = f'{{"gifts": ["{views[1]["id"]}", "p-9zzzzz", "{views[1]["id"]}", "{views[0]["id"]}"]}}'
+    assert load_products(state, parse_product_ids(answer)) == [BOX, FALCON]
+
+
+def test_prose_is_not_parsed_as_product_ids():
+    """Test words and hyphenated terms next to the ids are not taken for ids"""
+    text = "This perfect present is a popular product, p-values aside: p-4k3x9a and p-0000ab."
+    assert parse_product_ids(text) == ["p-4k3x9a", "p-0000ab"]
+    assert parse_product_ids("A perfect, popular present for a product lover") == []
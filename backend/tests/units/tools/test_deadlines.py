@@ -0,0 +1,47 @@
+import asyncio
+import time
+import pytest
+
+from app.tools.deadlines import MarketplaceLatency, hedged, with_deadline
+from app.utils.admission import current_deadline
+
+
+@pytest.mark.asyncio
+async def test_with_deadline_returns_partial_result():
+    """Test a marketplace missing its budget answers with a deadline result"""
+    finished = asyncio.Event()
+
+    async def slow_search():
+        await asyncio.sleep(0.3)
+        finished.set()
+        return {"data": {"products": []}}
+
+    token = current_deadline.set(time.monotonic() + 0.2)
+    try:
+        result = await with_deadline("Amazon", "lego", slow_search)
+    finally:
+        current_deadline.reset(token)
+    assert result["error"] == "deadline_exceeded"
+    assert result["marketplace"] == "Amazon"
+    # The late answer is not cancelled, so it can still fill the cache
+    await asyncio.wait_for(finished.wait(), 1)
+
+@pytest.mark.asyncio
+async def test_hedged_second_request_wins(monkeypatch):
+    """Test a hedge is sent after the p95 and the faster answer is used"""
+    latency = MarketplaceLatency(min_samples=1)
+    latency.observe("Amazon", 0.05)
+    monkeypatch.setattr("app.tools.deadlines.marketplace_latency", latency)
+    calls = []
+
+    async def search():
+        calls.append(time.monotonic())
+        await asyncio.sleep(1 if len(calls) == 1 else 0.01)
+        return {"call": len(calls)}
+
+    started = time.monotonic()
+    result = await hedged("Amazon", search, enabled=True)
+    assert result == {"call": 2}
+    assert time.monotonic() - started < 0.5
+    assert latency.hedges["Amazon"] == 1
+    assert latency.hedge_wins["Amazon"] == 1
@@ -0,0 +1,61 @@
+import pytest
+import app.tools.marketplaces as marketplaces
+
+from app.tools import MARKETPLACES
+from app.tools.cache import MemoryCacheBackend, ResponseCache
+from app.tools.dealindex import DealIndex, parse_categories, refresh_category
+from app.tools.httpclient import http_pool
+from benchmarks.stub_server import start_stub_server
+
+
+def make_product(title: str, price: float, original: float) -> dict:
+    return {"product_title": title, "product_description": "", "product_original_price": original,
+            "product_price": price, "product_star_rating": 4.5, "product_url": f"https://shop/{title}",
+            "product_image": "", "marketplace_source": "Amazon"}
+
+def test_deal_index_filters_by_price_and_sorts_by_discount(tmp_path):
+    """Test lookups match the words, apply the price cap and put the best discount first"""
+    index = DealIndex(str(tmp_path / "deals.db"))
+    index.replace_category("lego", [make_product("LEGO Technic Car", 80, 100),
+                                    make_product("LEGO Technic Crane", 50, 100),
+                                    make_product("LEGO City Police", 20, 25)])
+    titles = [product["product_title"] for product in index.search("lego technic")]
+    assert titles == ["LEGO Technic Crane", "LEGO Technic Car"]
+    assert [product["product_title"] for product in index.search("lego", max_price=30)] == ["LEGO City Police"]
+    # A refresh replaces the category instead of piling up deals
+    index.replace_category("lego", [make_product("LEGO Star Wars", 40, 60)])
+    assert index.search("technic") == []
+    assert index.stats()["deals"] == 1
+    index.close()
+
+def test_stats_do_not_create_the_index(tmp_path):
+    """Test a health probe on an index not opened yet leaves no file behind"""
+    index = DealIndex(str(tmp_path / "deals.db"))
+    assert index.stats()["deals"] == 0
+    assert list(tmp_path.iterdir()) == []
+    index.open()
+    assert (tmp_path / "deals.db").exists()
+    index.close()
+
+def test_parse_categories():
+    """Test the category list is normalized and deduplicated"""
+    assert parse_categories(" Lego, nintendo  switch,,lego ") == ["lego", "nintendo switch"]
+
+@pytest.mark.asyncio
+async def test_refresh_category_from_marketplaces(monkeypatch, tmp_path):
+    """Test a refresh pulls the deals through the marketplace adapters"""
+    runner, base_url = await start_stub_server()
+    for adapter in MARKETPLACES.values():
+        monkeypatch.setattr(adapter, "base_url", base_url)
+    monkeypatch.setattr(marketplaces, "RAPIDAPI_API_KEY", "test-key")
+    monkeypatch.setattr(marketplaces, "deals_cache", ResponseCache(MemoryCacheBackend()))
+    monkeypatch.setattr(marketplaces, "stale_store", MemoryCacheBackend())
+    index = DealIndex(str(tmp_path / "deals.db"))
+    try:
+        indexed = await refresh_category(index, "lego")
+    finally:
+        await http_pool.close()
+        await runner.cleanup()
+    assert indexed > 0
+    assert {product["marketplace_source"] for product in index.search("lego")} == {"Amazon", "Alibaba"}
+    index.close()
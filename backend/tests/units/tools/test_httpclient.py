@@ -0,0 +1,77 @@
+import asyncio
+import threading
+import pytest
+from app.tools.httpclient import HttpClientPool
+from benchmarks.stub_server import start_stub_server
+
+@pytest.mark.asyncio
+async def test_pool_reuses_session_per_host():
+    """Test the same host gets the same keep-alive session"""
+    pool = HttpClientPool()
+    first = pool.session("https://real-time-amazon-data.p.rapidapi.com")
+    second = pool.session("https://real-time-amazon-data.p.rapidapi.com/search")
+    other = pool.session("https://aliexpress-datahub.p.rapidapi.com")
+    assert first is second
+    assert first is not other
+    await pool.close()
+    assert first.closed and other.closed
+
+@pytest.mark.asyncio
+async def test_pool_applies_connector_limits():
+    """Test per-host limit and DNS cache are configured on the connector"""
+    pool = HttpClientPool(limit_per_host=3, dns_cache_ttl=42)
+    session = pool.session("https://example.com")
+    assert session.connector.limit_per_host == 3
+    assert session.connector.use_dns_cache
+    await pool.close()
+
+@pytest.mark.asyncio
+async def test_pool_closes_sessions_of_other_loops():
+    """Test a session replaced because it belongs to another event loop is closed, not leaked"""
+    pool = HttpClientPool()
+
+    async def open_session():
+        return pool.session("https://example.com")
+
+    # A loop still running in another thread closes its own session
+    other = asyncio.new_event_loop()
+    thread = threading.Thread(target=other.run_forever, daemon=True)
+    thread.start()
+    running = asyncio.run_coroutine_threadsafe(open_session(), other).result()
+    replaced = pool.session("https://example.com")
+    await asyncio.sleep(0.05)
+    assert running.closed and replaced is not running
+
+    # The session of a loop that is already closed is closed from this one
+    stale = asyncio.run_coroutine_threadsafe(open_session(), other).result()
+    other.call_soon_threadsafe(other.stop)
+    thread.join()
+    other.close()
+    assert pool.session("https://example.com") is not stale
+    await asyncio.sleep(0)
+    assert stale.closed
+    await pool.close()
+
+@pytest.mark.asyncio
+async def test_pool_closes_keep_alive_sessions_of_stopped_loops():
+    """Test a session of a loop that never runs again is closed with its open connection"""
+    runner, base_url = await start_stub_server()
+    pool = HttpClientPool()
+
+    async def fetch():
+        session = pool.session(base_url)
+        async with session.get(f"{base_url}/images/a.gif") as response:
+            await response.read()
+        return session
+
+    stopped = asyncio.new_event_loop()
+    try:
+        stale = await asyncio.to_thread(stopped.run_until_complete, fetch())
+        assert stale.connector._conns
+        assert pool.session(base_url) is not stale
+        await asyncio.sleep(0.05)
+        assert stale.closed
+    finally:
+        await pool.close()
+        await runner.cleanup()
+        stopped.close()
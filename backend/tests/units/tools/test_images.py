@@ -0,0 +1,170 @@
+import asyncio
+import io
+import os
+import subprocess
+import sys
+import pytest
+
+from aiohttp import web
+from PIL import Image
+from app.tools.cache import MemoryCacheBackend
+from app.tools.httpclient import http_pool
+from app.tools.images import ImageProxy, ImageProxyError
+from benchmarks.stub_server import PHOTO, start_stub_server
+
+
+def test_proxy_url_rewrites_allowed_hosts_only():
+    """Test CDN photos get a proxy URL at the next configured width, other URLs are kept"""
+    proxy = ImageProxy(MemoryCacheBackend(), allowed_hosts=("media-amazon.com",), widths=(160, 320), default_width=320)
+    assert proxy.proxy_url("https://m.media-amazon.com/images/I/a.jpg?x=1&y=2", width=200) == \
+        "/api/images?w=320&url=https://m.media-amazon.com/images/I/a.jpg%3Fx%3D1%26y%3D2"
+    assert proxy.proxy_url("https://evil-media-amazon.com/a.jpg") == "https://evil-media-amazon.com/a.jpg"
+    assert proxy.proxy_url("") == ""
+    assert proxy.width(4000) == 320
+
+
+def test_importing_the_tools_opens_no_image_cache(tmp_path):
+    """Test the on-disk image cache is only created on first use"""
+    env = {**os.environ, "PYTHONPATH": os.getcwd(), "IMAGE_CACHE_BACKEND": "sqlite"}
+    subprocess.run([sys.executable, "-c", "import app.tools.aggregation"], cwd=tmp_path, env=env, check=True)
+    assert not (tmp_path / "elfagent_images.db").exists()
+
+
+@pytest.mark.asyncio
+async def test_photo_is_fetched_once_and_served_from_the_cache():
+    """Test concurrent requests share one fetch, later ones are cache hits with the same ETag"""
+    runner, base_url = await start_stub_server(latency=0.05)
+    proxy = ImageProxy(MemoryCacheBackend(), allowed_hosts=("127.0.0.1",), widths=(160,))
+    try:
+        first, second = await asyncio.gather(proxy.get(f"{base_url}/images/a.gif", 160),
+                                             proxy.get(f"{base_url}/images/a.gif", 160))
+        again = await proxy.get(f"{base_url}/images/a.gif", 160)
+        # Same photo behind another URL: fetched, stored under the same content hash
+        other = await proxy.get(f"{base_url}/images/b.gif", 160)
+    finally:
+        await proxy.close()
+        await runner.cleanup()
+    assert first.data == second.data == again.data == PHOTO
+    assert again.content_type == "image/gif"
+    assert first.etag == again.etag == other.etag
+    assert runner.app["stats"]["photos"] == 2
+    assert (proxy.misses, proxy.coalesced, proxy.hits) == (2, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_disallowed_and_missing_photos_raise():
+    """Test other hosts are refused and upstream errors are reported"""
+    runner, base_url = await start_stub_server()
+    proxy = ImageProxy(MemoryCacheBackend(), allowed_hosts=("127.0.0.1",))
+    try:
+        with pytest.raises(ImageProxyError) as refused:
+            await proxy.get("https://example.com/a.jpg", 320)
+        with pytest.raises(ImageProxyError) as missing:
+            await proxy.get(f"{base_url}/nothing.jpg", 320)
+    finally:
+        await proxy.close()
+        await runner.cleanup()
+    assert refused.value.status == 403
+    assert missing.value.status == 404
+
+
+async def start_photo_server(**routes) -> tuple[web.AppRunner, str]:
+    app = web.Application()
+    for path, handler in routes.items():
+        app.router.add_get(f"/{path}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+
+@pytest.mark.asyncio
+async def test_photo_is_scaled_down_to_the_served_width():
+    """Test a large JPEG comes back as a thumbnail of the served width, keeping its aspect ratio"""
+    original = io.BytesIO()
+    Image.new("RGB", (1200, 900), (200, 30, 30)).save(original, "JPEG")
+
+    async def photo(request: web.Request):
+        return web.Response(body=original.getvalue(), content_type="image/jpeg")
+
+    runner, base_url = await start_photo_server(photo=photo)
+    proxy = ImageProxy(MemoryCacheBackend(), allowed_hosts=("127.0.0.1",), widths=(160, 320))
+    try:
+        image = await proxy.get(f"{base_url}/photo", proxy.width(300))
+    finally:
+        await proxy.close()
+        await runner.cleanup()
+    assert image.content_type == "image/jpeg"
+    assert Image.open(io.BytesIO(image.data)).size == (320, 240)
+    assert len(image.data) < len(original.getvalue())
+    assert proxy.resized == 1
+
+
+@pytest.mark.asyncio
+async def test_redirects_are_followed_to_allowed_hosts_only():
+    """Test a redirect within the allowed hosts is followed, one elsewhere refused, a slow upstream a 504"""
+    async def photo(request: web.Request):
+        return web.Response(body=PHOTO, content_type="image/gif")
+
+    async def moved(request: web.Request):
+        raise web.HTTPFound("/photo")
+
+    async def bounce(request: web.Request):
+        raise web.HTTPFound(f"http://localhost:{request.url.port}/photo")
+
+    async def slow(request: web.Request):
+        await asyncio.sleep(1)
+        return web.Response(body=PHOTO, content_type="image/gif")
+
+    runner, base_url = await start_photo_server(photo=photo, moved=moved, bounce=bounce, slow=slow)
+    proxy = ImageProxy(MemoryCacheBackend(), allowed_hosts=("127.0.0.1",), fetch_timeout=0.2)
+    try:
+        assert (await proxy.get(f"{base_url}/moved", 320)).data == PHOTO
+        with pytest.raises(ImageProxyError) as refused:
+            await proxy.get(f"{base_url}/bounce", 320)
+        with pytest.raises(ImageProxyError) as timed_out:
+            await proxy.get(f"{base_url}/slow", 320)
+    finally:
+        await proxy.close()
+        await runner.cleanup()
+    assert "not allowed" in str(refused.value) and refused.value.status == 502
+    assert timed_out.value.status == 504
+
+
+@pytest.mark.asyncio
+async def test_waiters_refetch_when_the_leading_request_is_cancelled():
+    """Test a request coalesced on a cancelled fetch still gets the photo"""
+    runner, base_url = await start_stub_server(latency=0.05)
+    proxy = ImageProxy(MemoryCacheBackend(), allowed_hosts=("127.0.0.1",))
+    try:
+        leader = asyncio.create_task(proxy.get(f"{base_url}/images/a.gif", 320))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(proxy.get(f"{base_url}/images/a.gif", 320))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        image = await waiter
+    finally:
+        await proxy.close()
+        await runner.cleanup()
+    assert leader.cancelled()
+    assert image.data == PHOTO
+
+
+@pytest.mark.asyncio
+async def test_photos_of_every_host_share_one_dedicated_session():
+    """Test photos are downloaded through one session with its own limits, never through the API pool"""
+    runner, base_url = await start_stub_server()
+    other_host = base_url.replace("127.0.0.1", "localhost")
+    proxy = ImageProxy(MemoryCacheBackend(), allowed_hosts=("127.0.0.1", "localhost"), max_connections=4)
+    try:
+        await proxy.get(f"{base_url}/images/a.gif", 320)
+        session = proxy.session()
+        await proxy.get(f"{other_host}/images/b.gif", 320)
+        assert proxy.session() is session
+        assert session.connector.limit == 4
+        assert not {"127.0.0.1", "localhost"} & {host.split(":")[0] for host in http_pool.stats()["hosts"]}
+    finally:
+        await proxy.close()
+        await runner.cleanup()
+    assert session.closed
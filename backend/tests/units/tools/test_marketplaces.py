@@ -0,0 +1,68 @@
+import pytest
+import app.tools.marketplaces as marketplaces
+
+from app.tools import MARKETPLACES, MarketplaceAdapter, search_marketplaces
+from app.tools.cache import MemoryCacheBackend, ResponseCache
+from app.tools.httpclient import http_pool
+from app.tools.ratelimit import rate_limiter
+from app.utils.admission import upstream_limits
+from benchmarks.stub_server import start_stub_server
+
+
+@pytest.mark.asyncio
+async def test_search_marketplaces_fans_out_in_one_call(monkeypatch):
+    """Test N products x M marketplaces are searched at once and merged"""
+    runner, base_url = await start_stub_server()
+    for adapter in MARKETPLACES.values():
+        monkeypatch.setattr(adapter, "base_url", base_url)
+    monkeypatch.setattr(marketplaces, "RAPIDAPI_API_KEY", "test-key")
+    monkeypatch.setattr(marketplaces, "deals_cache", ResponseCache(MemoryCacheBackend()))
+    monkeypatch.setattr(marketplaces, "stale_store", MemoryCacheBackend())
+    try:
+        result = await search_marketplaces(["lego", "nintendo switch", "Lego "], max_price=300)
+    finally:
+        await http_pool.close()
+        await runner.cleanup()
+    # The repeated product is searched once: 2 products x 2 marketplaces
+    assert runner.app["stats"]["requests"] == 4
+    assert result["marketplace_status"] == {"Amazon": "ok", "Alibaba": "ok"}
+    assert {product["marketplace_source"] for product in result["products"]} == {"Amazon", "Alibaba"}
+
+def test_registered_adapters_declare_their_limits():
+    """Test the adapters feed the upstream budgets and the host rate limits"""
+    amazon = MARKETPLACES["Amazon"]
+    assert amazon.tool.__name__ == "get_amazon_deals_by_product"
+    assert upstream_limits.budgets[amazon.host] == amazon.concurrency
+    assert rate_limiter.rates[amazon.host] == amazon.rate
+
+def test_adapter_without_normalize_cannot_be_instantiated():
+    """Test a half-written adapter fails when it is created, not in the middle of a search"""
+    class HalfMarketplace(MarketplaceAdapter):
+        name = "Half"
+
+        def build_params(self, item, max_price, sortby):
+            return {"query": item}
+
+    with pytest.raises(TypeError):
+        HalfMarketplace()
+
+@pytest.mark.asyncio
+async def test_search_serves_stale_deals_when_upstream_fails(monkeypatch):
+    """Test the last known good deals are served, marked stale, once the upstream fails"""
+    alibaba = MARKETPLACES["Alibaba"]
+    monkeypatch.setattr(marketplaces, "RAPIDAPI_API_KEY", "test-key")
+    monkeypatch.setattr(marketplaces, "stale_store", MemoryCacheBackend())
+    results = []
+    for options in ({}, {"error_rate": 1.0}):
+        runner, base_url = await start_stub_server(**options)
+        monkeypatch.setattr(alibaba, "base_url", base_url)
+        monkeypatch.setattr(marketplaces, "deals_cache", ResponseCache(MemoryCacheBackend()))
+        try:
+            results.append(await alibaba.search("lego", 60))
+        finally:
+            await http_pool.close()
+            await runner.cleanup()
+    fresh, stale = results
+    assert "stale" not in fresh
+    assert stale["stale"] is True
+    assert stale["result"]["resultList"] == fresh["result"]["resultList"]
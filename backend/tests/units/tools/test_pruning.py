@@ -0,0 +1,38 @@
+from app.tools.pruning import prune_payload, to_columnar, from_columnar
+
+ALIBABA_PAYLOAD = {
+    "result": {
+        "status": {"code": 200, "data": "success"},
+        "settings": {"q": "lego", "currency": "EUR"},
+        "resultList": [
+            {"item": {"itemId": str(i), "title": f"Blocks {i}", "itemUrl": f"//a.com/{i}.html",
+                      "image": f"//a.com/{i}.jpg", "sales": 100, "type": "natural",
+                      "sku": {"def": {"price": "10.00", "promotionPrice": "5.00",
+                                      "quantity": 5}}},
+             "delivery": {"freeShipping": True}, "trace": {"long": "x" * 200}}
+            for i in range(30)
+        ]
+    }
+}
+
+def test_prune_payload_keeps_top_n_whitelisted_fields():
+    """Test only the fields used by the agents survive pruning"""
+    pruned = prune_payload("alibaba", ALIBABA_PAYLOAD, top_n=5)
+    items = pruned["result"]["resultList"]
+    assert len(items) == 5
+    assert items[0] == {"item": {"itemId": "0", "title": "Blocks 0", "itemUrl": "//a.com/0.html",
+                                 "image": "//a.com/0.jpg",
+                                 "sku": {"def": {"price": "10.00", "promotionPrice": "5.00"}}}}
+
+def test_columnar_round_trip():
+    """Test the columnar encoding can be expanded back to the nested shape"""
+    pruned = prune_payload("alibaba", ALIBABA_PAYLOAD, top_n=3)
+    columnar = to_columnar("alibaba", pruned)
+    assert columnar["columns"][1] == "item.title"
+    assert len(columnar["rows"]) == 3
+    assert from_columnar("alibaba", columnar) == pruned
+
+def test_unknown_payload_is_left_untouched():
+    """Test error payloads pass through unchanged"""
+    error = {"msg": "No deals has been found for lego"}
+    assert prune_payload("amazon", error) is error
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import time
+import pytest
+
+from app.tools.ratelimit import QuotaStore, RateLimiter, TokenBucket, run_quota_flusher
+
+HOST_URL = "https://real-time-amazon-data.p.rapidapi.com"
+HOST = "real-time-amazon-data.p.rapidapi.com"
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_for_refill():
+    """Test requests beyond the burst wait for a token instead of failing"""
+    bucket = TokenBucket(rate=20, capacity=1)
+    started = time.monotonic()
+    assert await bucket.acquire(max_wait=1) is None
+    assert await bucket.acquire(max_wait=1) is None
+    assert time.monotonic() - started >= 0.04
+
+@pytest.mark.asyncio
+async def test_rate_limited_result_when_wait_is_too_long(tmp_path):
+    """Test a structured rate limited result replaces a doomed request"""
+    limiter = RateLimiter(rates={HOST: 0.1}, max_wait=0.01,
+                          quota=QuotaStore(str(tmp_path / "quota.json"), limits={}))
+    assert await limiter.acquire(HOST_URL, "lego") is None
+    result = await limiter.acquire(HOST_URL, "lego")
+    assert result["error"] == "rate_limited"
+    assert result["reason"] == "requests per second"
+    assert result["retry_after"] > 0
+    assert "msg" in result
+
+@pytest.mark.asyncio
+async def test_headers_and_429_update_limits(tmp_path):
+    """Test the RapidAPI headers sync the quota and a 429 pauses the host"""
+    limiter = RateLimiter(rates={}, default_rate=100, quota=QuotaStore(str(tmp_path / "quota.json"), limits={}))
+    assert limiter.update(HOST_URL, 200, {"X-RateLimit-Requests-Limit": "100",
+                                          "X-RateLimit-Requests-Remaining": "0",
+                                          "X-RateLimit-Requests-Reset": "3600"}) is None
+    result = await limiter.acquire(HOST_URL, "lego")
+    assert result["reason"] == "monthly quota exhausted"
+    assert 3500 < result["retry_after"] <= 3600
+
+    other = "https://aliexpress-datahub.p.rapidapi.com"
+    result = limiter.update(other, 429, {"Retry-After": "30"}, "lego")
+    assert result["reason"] == "upstream returned 429"
+    assert limiter.bucket("aliexpress-datahub.p.rapidapi.com").wait_time() > 29
+
+def test_quota_counter_is_persisted(tmp_path):
+    """Test the monthly counter survives a restart"""
+    path = str(tmp_path / "quota.json")
+    store = QuotaStore(path, limits={HOST: 2})
+    store.record(HOST)
+    store.record(HOST)
+    store.flush(force=True)
+
+    restored = QuotaStore(path, limits={HOST: 2})
+    assert restored.state[HOST]["used"] == 2
+    assert restored.exhausted_for(HOST) > 0
+
+def test_quota_counters_of_workers_add_up(tmp_path):
+    """Test workers sharing the quota file add their requests instead of overwriting them"""
+    path = str(tmp_path / "quota.json")
+    first = QuotaStore(path, limits={HOST: 10})
+    second = QuotaStore(path, limits={HOST: 10})
+    first.record(HOST)
+    first.flush(force=True)
+    second.record(HOST)
+    second.record(HOST)
+    second.flush(force=True)
+    first.record(HOST)
+    first.flush(force=True)
+
+    assert QuotaStore(path, limits={HOST: 10}).state[HOST]["used"] == 4
+    assert first.state[HOST]["used"] == 4
+
+def test_rates_are_split_between_workers(tmp_path):
+    """Test every worker gets its share of the host rate"""
+    limiter = RateLimiter(rates={HOST: 8}, quota=QuotaStore(str(tmp_path / "quota.json"), limits={}), workers=4)
+    assert limiter.bucket(HOST).rate == 2
+
+@pytest.mark.asyncio
+async def test_quota_file_is_written_off_the_request_path(tmp_path):
+    """Test counting a request leaves the file alone, the background flusher writes it"""
+    path = str(tmp_path / "quota.json")
+    store = QuotaStore(path, limits={HOST: 10})
+    store.record(HOST)
+    assert not os.path.exists(path)
+
+    flusher = asyncio.create_task(run_quota_flusher(store, interval=0.01))
+    await asyncio.sleep(0.1)
+    flusher.cancel()
+    assert QuotaStore(path, limits={HOST: 10}).state[HOST]["used"] == 1
+
+    # Requests counted while the file is being written are kept for the next flush
+    store.record(HOST)
+    flushing = asyncio.create_task(store.flush_async())
+    await asyncio.sleep(0)
+    store.record(HOST)
+    await flushing
+    assert store.state[HOST]["used"] == 3
+    store.flush(force=True)
+    assert QuotaStore(path, limits={HOST: 10}).state[HOST]["used"] == 3
+
+def test_counters_of_past_months_are_dropped(tmp_path):
+    """Test the quota file keeps only the hosts used this month"""
+    path = str(tmp_path / "quota.json")
+    with open(path, "w") as f:
+        json.dump({"127.0.0.1:41234": {"month": "2020-01", "used": 3}}, f)
+    store = QuotaStore(path, limits={})
+    store.record(HOST)
+    store.flush(force=True)
+    assert set(QuotaStore(path, limits={}).state) == {HOST}
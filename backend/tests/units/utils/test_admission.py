@@ -0,0 +1,78 @@
+import asyncio
+import time
+import pytest
+
+from app.utils.admission import AdmissionController, AdmissionRejected, UpstreamLimits, parse_budgets
+
+
+@pytest.mark.asyncio
+async def test_queue_is_fair_between_users():
+    """Test slots are handed out round-robin across users"""
+    controller = AdmissionController(max_in_flight=1, max_queue=10)
+    await controller.acquire("holder")
+    order = []
+
+    async def request(user_id: str, label: str):
+        await controller.acquire(user_id)
+        order.append(label)
+        controller.release(0.01)
+
+    tasks = [asyncio.create_task(request("greedy", f"greedy-{i}")) for i in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(request("polite", "polite-0")))
+    await asyncio.sleep(0)
+    controller.release(0.01)
+    await asyncio.gather(*tasks)
+
+    assert order == ["greedy-0", "polite-0", "greedy-1", "greedy-2"]
+    assert controller.in_flight == 0 and controller.queued == 0
+
+@pytest.mark.asyncio
+async def test_full_queue_is_shed_with_retry_after():
+    """Test requests beyond the queue bound are rejected immediately"""
+    controller = AdmissionController(max_in_flight=1, max_queue=1)
+    await controller.acquire("a")
+    waiting = asyncio.create_task(controller.acquire("b"))
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire("c")
+    assert rejected.value.reason == "queue full"
+    assert rejected.value.retry_after >= 1
+    controller.release()
+    await waiting
+    assert controller.stats()["shed"] == 1
+
+@pytest.mark.asyncio
+async def test_deadline_aware_shedding():
+    """Test a request that cannot start before its deadline is shed instead of hanging"""
+    controller = AdmissionController(max_in_flight=1, max_queue=10)
+    controller.service_time = 5.0
+    await controller.acquire("a")
+    with pytest.raises(AdmissionRejected, match="deadline cannot be met"):
+        await controller.acquire("b", deadline=time.monotonic() + 1)
+
+    controller.service_time = 0.0
+    with pytest.raises(AdmissionRejected, match="deadline expired in queue"):
+        await controller.acquire("b", deadline=time.monotonic() + 0.05)
+    assert controller.queued == 0
+    controller.release()
+    assert controller.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_upstream_limits_bound_concurrency_per_host():
+    """Test each upstream gets its own concurrency budget"""
+    limits = UpstreamLimits(parse_budgets("gemini=2, real-time-amazon-data.p.rapidapi.com=1"), default=3)
+    running = {"gemini": 0, "amazon": 0}
+    peak = {"gemini": 0, "amazon": 0}
+
+    async def call(name: str, upstream: str):
+        async with limits.slot(upstream):
+            running[name] += 1
+            peak[name] = max(peak[name], running[name])
+            await asyncio.sleep(0.01)
+            running[name] -= 1
+
+    await asyncio.gather(*[call("gemini", "gemini") for _ in range(5)],
+                         *[call("amazon", "https://real-time-amazon-data.p.rapidapi.com") for _ in range(5)])
+    assert peak == {"gemini": 2, "amazon": 1}
+    assert limits.stats()["real-time-amazon-data.p.rapidapi.com"] == {"limit": 1, "in_use": 0, "waiting": 0}
@@ -0,0 +1,51 @@
+import json
+
+from google.genai import types
+
+from app.utils.budget import cap_injected_state, compact_value, prune_turns
+
+
+def user_text(text: str) -> types.Content:
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+def model_text(text: str) -> types.Content:
+    return types.Content(role="model", parts=[types.Part(text=text)])
+
+def test_compact_value_keeps_the_first_entries_whole():
+    """Test JSON text in code fences is compacted by halving its longest list"""
+    products = [{"product_title": f"Lego set {i}", "product_price": i} for i in range(100)]
+    value = f"```json\n{json.dumps({'products': products}, indent=2)}\n```"
+    compacted = compact_value(value, 500)
+    assert len(compacted) <= 500
+    kept = json.loads(compacted)["products"]
+    assert kept == products[:len(kept)]
+
+def test_compact_value_truncates_plain_text():
+    """Test text that is not JSON is cut with a marker"""
+    compacted = compact_value("great gift " * 100, 100)
+    assert compacted.startswith("great gift")
+    assert "truncated" in compacted
+
+def test_cap_injected_state_only_touches_long_values():
+    """Test only the injected values over the budget are replaced"""
+    deals = {"products": [{"product_title": f"Deal {i}"} for i in range(200)]}
+    instruction = f"The user asked: lego. Deals: {deals}"
+    capped_instruction, capped = cap_injected_state(
+        instruction, {"deals": deals, "fast_query": "lego", "unused": "x" * 5000}, 1000)
+    assert capped == ["deals"]
+    assert capped_instruction.startswith("The user asked: lego. Deals: {")
+    assert len(capped_instruction) < 1100
+
+def test_prune_turns_keeps_recent_turns():
+    """Test old turns are dropped while replayed agent events do not count as turns"""
+    contents = []
+    for turn in range(5):
+        contents += [user_text(f"query {turn}"),
+                     types.Content(role="user", parts=[types.Part(text="For context:"),
+                                                       types.Part(text="[agent] said: ...")]),
+                     model_text(f"answer {turn}")]
+    pruned, dropped = prune_turns(contents, max_turns=2)
+    assert dropped == 2
+    assert pruned[0].parts[0].text == "query 2"
+    assert len(pruned) == 9
+    assert prune_turns(contents, max_turns=0) == (contents, 0)
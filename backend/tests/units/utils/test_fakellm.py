@@ -0,0 +1,64 @@
+import json
+import pytest
+
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+from app.utils.fakellm import FakeLlm
+
+
+def build_request(*contents: types.Content) -> LlmRequest:
+    request = LlmRequest(contents=list(contents), config=types.GenerateContentConfig())
+    request.config.tools = [types.Tool(function_declarations=[types.FunctionDeclaration(
+        name="search_tool",
+        parameters=types.Schema(type="OBJECT", properties={
+            "item": types.Schema(type="STRING"),
+            "max_price": types.Schema(type="NUMBER")}))])]
+    return request
+
+async def generate(request: LlmRequest):
+    return [response async for response in FakeLlm(model="gemini-fake").generate_content_async(request)]
+
+@pytest.mark.asyncio
+async def test_fake_llm_calls_the_tool_first():
+    """Test the fake model calls its tool with the user request"""
+    request = build_request(types.Content(role="user", parts=[types.Part(text="lego")]))
+    [response] = await generate(request)
+    call = response.content.parts[0].function_call
+    assert call.name == "search_tool"
+    assert call.args == {"item": "lego"}
+    assert response.usage_metadata.prompt_token_count >= 0
+
+@pytest.mark.asyncio
+async def test_fake_llm_answers_with_gifts_from_tool_response():
+    """Test the fake model turns the tool products into gifts"""
+    products = {"products": [{"product_title": "LEGO Classic", "product_price": 19.99,
+                              "marketplace_source": "Amazon"}]}
+    request = build_request(
+        types.Content(role="user", parts=[types.Part(text="lego")]),
+        types.Content(role="model", parts=[types.Part(
+            function_call=types.FunctionCall(name="search_tool", args={"item": "lego"}))]),
+        types.Content(role="user", parts=[types.Part(
+            function_response=types.FunctionResponse(name="search_tool", response=products))]))
+    [response] = await generate(request)
+    gifts = json.loads(response.content.parts[0].text)["gifts"]
+    assert gifts == [{"name": "LEGO Classic", "description": None, "original_price": None,
+                      "current_price": 19.99, "marketplace": "Amazon", "rating": None,
+                      "order_url": None, "image_url": None}]
+
+@pytest.mark.asyncio
+async def test_lazy_model_builds_its_client_once():
+    """Test the model client is built by warm_up or the first call, only once"""
+    from app.utils.utility import LazyModel
+    built = []
+
+    def factory():
+        built.append(FakeLlm(model="gemini-fake"))
+        return built[-1]
+
+    model = LazyModel(factory, model="gemini-fake", upstream="gemini")
+    assert not built
+    request = build_request(types.Content(role="user", parts=[types.Part(text="lego")]))
+    [response] = [response async for response in model.generate_content_async(request)]
+    assert response.content.parts[0].function_call.name == "search_tool"
+    assert model.warm_up() is built[0]
+    assert len(built) == 1
@@ -0,0 +1,46 @@
+import pytest
+from google.adk.agents import BaseAgent
+from google.adk.apps import App
+from google.adk.events import Event
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from app.utils.metrics import Histogram, MetricsPlugin, RequestTimings, current_timings, render_metrics
+
+
+class EchoAgent(BaseAgent):
+    async def _run_async_impl(self, ctx):
+        yield Event(author=self.name, invocation_id=ctx.invocation_id,
+                    content=types.Content(role="model", parts=[types.Part(text="done")]))
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Test the Prometheus text format of a histogram"""
+    histogram = Histogram("test_duration_seconds", "Test histogram", ("stage",), buckets=(0.1, 1))
+    histogram.observe(0.05, stage="search")
+    histogram.observe(0.5, stage="search")
+    histogram.observe(5, stage="search")
+    lines = histogram.render()
+    assert 'test_duration_seconds_bucket{stage="search",le="0.1"} 1' in lines
+    assert 'test_duration_seconds_bucket{stage="search",le="1"} 2' in lines
+    assert 'test_duration_seconds_bucket{stage="search",le="+Inf"} 3' in lines
+    assert 'test_duration_seconds_count{stage="search"} 3' in lines
+
+
+@pytest.mark.asyncio
+async def test_metrics_plugin_records_agent_time_per_request():
+    """Test agent wall time lands in the request breakdown and in /metrics"""
+    app = App(name="elfagent", root_agent=EchoAgent(name="ElfAgent"), plugins=[MetricsPlugin()])
+    session_service = InMemorySessionService()
+    runner = Runner(app=app, session_service=session_service)
+    session = await session_service.create_session(app_name="elfagent", user_id="u")
+
+    timings = RequestTimings()
+    current_timings.set(timings)
+    async for _ in runner.run_async(user_id="u", session_id=session.id,
+                                    new_message=types.Content(role="user", parts=[types.Part(text="lego")])):
+        pass
+
+    assert "ElfAgent" in timings.to_dict()["agents_ms"]
+    assert 'elfagent_agent_duration_seconds_count{agent="ElfAgent"}' in render_metrics()
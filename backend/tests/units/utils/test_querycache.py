@@ -0,0 +1,56 @@
+import time
+
+from app.utils.querycache import SemanticQueryCache, normalize_query
+
+
+def test_normalize_query_drops_filler_and_punctuation():
+    """Test near-identical phrasings share the normalized key"""
+    assert normalize_query("Gift for a 10-year-old who loves Science!") == "10 year old loves science"
+    assert normalize_query("Christmas gift for a 10 year old that loves science") == "10 year old loves science"
+
+def test_semantic_hit_requires_threshold_and_same_numbers():
+    """Test similar queries hit while different ages or budgets miss"""
+    cache = SemanticQueryCache(threshold=0.8)
+    cache.set("gift for a 10 year old who loves science", "science gifts")
+    assert cache.get("gift for a 10 year old who loves sciences") == "science gifts"
+    assert cache.get("gift for a 12 year old who loves science") is None
+    assert cache.get("lego under 50") is None
+    assert cache.stats()["semantic_hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+def test_namespaces_are_isolated():
+    """Test fast and full answers are cached separately"""
+    cache = SemanticQueryCache()
+    cache.set("nintendo switch under 300", "fast answer", namespace="fast")
+    assert cache.get("nintendo switch under 300", namespace="full") is None
+    assert cache.get("nintendo switch under 300", namespace="fast") == "fast answer"
+
+def test_entries_expire_and_lru_is_evicted():
+    """Test TTL expiry and eviction of the least recently used entry"""
+    cache = SemanticQueryCache(ttl=0.01)
+    cache.set("lego classic", "lego")
+    time.sleep(0.02)
+    assert cache.get("lego classic") is None
+
+    cache = SemanticQueryCache(max_entries=2)
+    cache.set("lego classic", "lego")
+    cache.set("barbie dreamhouse", "barbie")
+    cache.get("lego classic")
+    cache.set("nintendo switch", "switch")
+    assert cache.get("barbie dreamhouse") is None
+    assert cache.get("lego classic") == "lego"
+    assert cache.stats()["evictions"] == 1
+
+def test_evicted_rows_are_reused_by_the_matrix_lookup():
+    """Test a new entry takes the matrix row of the evicted one and is found by cosine lookup"""
+    cache = SemanticQueryCache(threshold=0.8, max_entries=2)
+    cache.set("gift for a 10 year old who loves science", "science")
+    cache.set("barbie dreamhouse", "barbie")
+    cache.get("barbie dreamhouse")
+    cache.set("wooden train set for a toddler", "train")
+    assert len(cache._slots) == 2 and cache._free == []
+    assert cache._slots[0].response == "train"
+    assert cache.get("wooden train sets for toddler") == "train"
+    assert cache.get("gift for a 10 year old who loves sciences") is None
+    assert cache.get("barbie dreamhouse") == "barbie"
+    assert cache.stats()["semantic_hits"] == 1
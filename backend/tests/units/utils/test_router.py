@@ -0,0 +1,82 @@
+import pytest
+
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+from app.utils import utility
+from app.utils.fakellm import FakeLlm, FakeLlmError
+from app.utils.router import ModelRouter, parse_tiers
+
+
+def build_router(models: dict[str, FakeLlm], tiers: str, **options) -> ModelRouter:
+    return ModelRouter(parse_tiers(tiers), lambda name: models[name], **options)
+
+
+async def answer(router: ModelRouter, tier: str, tools: list = None) -> str:
+    request = LlmRequest(contents=[types.Content(role="user", parts=[types.Part(text="lego")])],
+                         config=types.GenerateContentConfig(tools=tools))
+    [response] = [response async for response in router.model(tier).generate_content_async(request)]
+    return response.model_version
+
+
+def test_parse_tiers():
+    """Test tiers are parsed in order, empty entries skipped"""
+    assert parse_tiers("search=gemini-a; reasoning=gpt-b, gemini-a ;empty=") == \
+        {"search": ["gemini-a"], "reasoning": ["gpt-b", "gemini-a"]}
+
+
+@pytest.mark.asyncio
+async def test_unavailable_model_fails_over_and_cools_down():
+    """Test a 503 moves the call to the alternate, then the failing model is tried last"""
+    models = {"gemini-a": FakeLlm(model="gemini-a", error_rate=1.0), "gpt-b": FakeLlm(model="gpt-b")}
+    router = build_router(models, "reasoning=gemini-a,gpt-b", cooldown=30)
+    assert await answer(router, "reasoning") == "gpt-b"
+    assert router.order("reasoning") == ["gpt-b", "gemini-a"]
+    assert await answer(router, "reasoning") == "gpt-b"
+    assert router.stats()["models"]["gemini-a"]["calls"] == 1
+
+
+@pytest.mark.asyncio
+async def test_last_model_errors_are_raised():
+    """Test the error of the last model reaches the agent, other errors are not failed over"""
+    router = build_router({"gemini-a": FakeLlm(model="gemini-a", error_rate=1.0, error_code=429)}, "reasoning=gemini-a")
+    with pytest.raises(FakeLlmError):
+        await answer(router, "reasoning")
+    router = build_router({"gemini-a": FakeLlm(model="gemini-a", error_rate=1.0, error_code=400), "gpt-b": FakeLlm(model="gpt-b")},
+                          "reasoning=gemini-a,gpt-b")
+    with pytest.raises(FakeLlmError):
+        await answer(router, "reasoning")
+
+
+@pytest.mark.asyncio
+async def test_slow_model_is_abandoned_and_latency_routing_prefers_the_fastest():
+    """Test a model without a first response in time fails over, and the fastest model is then first"""
+    models = {"gemini-slow": FakeLlm(model="gemini-slow", latency=0.3), "gpt-fast": FakeLlm(model="gpt-fast", latency=0.01)}
+    router = build_router(models, "extraction=gemini-slow,gpt-fast", strategy="latency",
+                          first_response_timeout=0.05, cooldown=0)
+    assert await answer(router, "extraction") == "gpt-fast"
+    assert router.order("extraction") == ["gpt-fast", "gemini-slow"]
+
+
+@pytest.mark.asyncio
+async def test_cost_routing_and_gemini_builtin_tools():
+    """Test the cheapest model answers, unless the request needs a Gemini built-in tool"""
+    models = {"gemini-pro": FakeLlm(model="gemini-pro"), "gpt-mini": FakeLlm(model="gpt-mini")}
+    router = build_router(models, "search=gemini-pro,gpt-mini", costs={"gemini-pro": 1.25, "gpt-mini": 0.15})
+    assert await answer(router, "search") == "gpt-mini"
+    assert await answer(router, "search", tools=[types.Tool(google_search=types.GoogleSearch())]) == "gemini-pro"
+
+
+def test_litellm_provider_names_stay_on_litellm(monkeypatch):
+    """Test only bare gemini-* names get the Gemini client, gemini/... goes through LiteLlm"""
+    monkeypatch.setattr(utility, "FAKE_LLM", False)
+    assert utility.build_provider_model("gemini-2.0-flash").upstream == "gemini"
+    assert utility.build_provider_model("gemini/gemini-2.5-pro").upstream == "litellm"
+    assert utility.build_provider_model("openai/gpt-4o").upstream == "litellm"
+
+
+@pytest.mark.asyncio
+async def test_builtin_tools_skip_litellm_gemini_models():
+    """Test a google_search request goes to the Gemini client model, not to a LiteLLM gemini/ one"""
+    models = {"gemini/gemini-2.5-pro": FakeLlm(model="gemini/gemini-2.5-pro"), "gemini-pro": FakeLlm(model="gemini-pro")}
+    router = build_router(models, "search=gemini/gemini-2.5-pro,gemini-pro")
+    assert await answer(router, "search", tools=[types.Tool(google_search=types.GoogleSearch())]) == "gemini-pro"
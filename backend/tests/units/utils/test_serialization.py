@@ -0,0 +1,38 @@
+import zlib
+
+from datetime import datetime
+from websockets.frames import Frame, OP_TEXT
+from app.utils.compression import ThresholdPerMessageDeflate
+from app.utils.serialization import parse_json_document, dumps, loads
+
+
+def test_json_document_is_found_in_model_prose():
+    """Test fenced, prefixed and trailed JSON answers are parsed"""
+    assert parse_json_document('{"gifts": []}') == {"gifts": []}
+    assert parse_json_document('Here are the deals:\n```json\n{"gifts": [{"name": "Lego"}]}\n```\nEnjoy!') == \
+        {"gifts": [{"name": "Lego"}]}
+    assert parse_json_document('Sure! {"gifts": [1]} Let me know {if} you need more') == {"gifts": [1]}
+    assert parse_json_document("No deals found {sorry}") is None
+
+
+def test_dumps_round_trips_and_stringifies_unknown_types():
+    """Test the fast serializer writes unknown values with str()"""
+    assert loads(dumps({"price": 19.99, "when": zlib})) == {"price": 19.99, "when": str(zlib)}
+
+
+def test_dumps_writes_compact_orjson():
+    """Test the orjson output: compact, UTF-8, ISO dates and non-string keys"""
+    assert dumps({"at": datetime(2025, 12, 24, 18, 0), 3: "Bücher"}) == \
+        '{"at":"2025-12-24T18:00:00","3":"Bücher"}'.encode()
+
+
+def test_small_websocket_frames_are_not_compressed():
+    """Test frames below the threshold go out as is and large ones deflated"""
+    extension = ThresholdPerMessageDeflate(False, False, 15, 15, min_size=100)
+    small = extension.encode(Frame(OP_TEXT, b'{"type": "heartbeat"}'))
+    assert not small.rsv1 and small.data == b'{"type": "heartbeat"}'
+
+    payload = b'{"type": "text", "content": "' + b"LEGO Technic " * 100 + b'"}'
+    large = extension.encode(Frame(OP_TEXT, payload))
+    assert large.rsv1 and len(large.data) < len(payload) / 10
+    assert zlib.decompressobj(wbits=-15).decompress(large.data + b"\x00\x00\xff\xff") == payload
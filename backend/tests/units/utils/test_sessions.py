@@ -0,0 +1,52 @@
+import time
+import pytest
+from google.adk.events import Event
+from google.genai import types
+from google.adk.sessions import InMemorySessionService
+
+from app.utils.sessions import SessionRetention, BoundedInMemorySessionService, BoundedDatabaseSessionService
+
+
+def user_event(text: str) -> Event:
+    return Event(author="user", invocation_id="inv",
+                 content=types.Content(role="user", parts=[types.Part(text=text)]))
+
+
+@pytest.mark.asyncio
+async def test_sweep_expires_idle_sessions():
+    """Test sessions idle for longer than the TTL are deleted"""
+    service = BoundedInMemorySessionService(ttl=60, max_events=0)
+    await service.create_session(app_name="elfagent", user_id="u", session_id="old")
+    await service.create_session(app_name="elfagent", user_id="u", session_id="new")
+    service.sessions["elfagent"]["u"]["old"].last_update_time = time.time() - 120
+
+    assert await service.sweep("elfagent") == 1
+    assert await service.get_session(app_name="elfagent", user_id="u", session_id="old") is None
+    assert await service.get_session(app_name="elfagent", user_id="u", session_id="new")
+
+
+@pytest.mark.asyncio
+async def test_sqlite_sessions_are_shared_and_compacted(tmp_path):
+    """Test two services on the same sqlite file see the same compacted session"""
+    db_url = f"sqlite:///{tmp_path / 'sessions.db'}"
+    writer = BoundedDatabaseSessionService(db_url, ttl=0, max_events=3)
+    session = await writer.create_session(app_name="elfagent", user_id="u", session_id="s")
+    for i in range(5):
+        await writer.append_event(session, user_event(f"query {i}"))
+
+    reader = BoundedDatabaseSessionService(db_url, ttl=0, max_events=3)
+    loaded = await reader.get_session(app_name="elfagent", user_id="u", session_id="s")
+    assert [e.content.parts[0].text for e in loaded.events] == ["query 2", "query 3", "query 4"]
+
+    await reader.sweep("elfagent")
+    reader.max_events = 0
+    loaded = await reader.get_session(app_name="elfagent", user_id="u", session_id="s")
+    assert len(loaded.events) == 3
+
+def test_retention_backend_must_implement_compaction():
+    """Test a session backend without compaction fails when built, not on the first sweep"""
+    class UncompactedSessionService(SessionRetention, InMemorySessionService):
+        pass
+
+    with pytest.raises(TypeError):
+        UncompactedSessionService()
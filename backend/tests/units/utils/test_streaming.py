@@ -0,0 +1,36 @@
+import pytest
+from google.adk.agents import BaseAgent
+from google.adk.apps import App
+from google.adk.events import Event, EventActions
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from app.utils.streaming import StreamingPlugin, stream_session
+
+
+class ScriptedAgent(BaseAgent):
+    """Emits an intermediate state update and a final answer."""
+
+    async def _run_async_impl(self, ctx):
+        yield Event(author=self.name, invocation_id=ctx.invocation_id,
+                    actions=EventActions(state_delta={"google_results": {"product_name": "lego"}}))
+        yield Event(author=self.name, invocation_id=ctx.invocation_id,
+                    content=types.Content(role="model", parts=[types.Part(text='{"gifts": []}')]))
+
+
+@pytest.mark.asyncio
+async def test_stream_session_forwards_state_and_final_response():
+    """Test intermediate output_key results arrive before the final answer"""
+    app = App(name="elfagent", root_agent=ScriptedAgent(name="ElfAgent"), plugins=[StreamingPlugin()])
+    session_service = InMemorySessionService()
+    runner = Runner(app=app, session_service=session_service)
+
+    messages = [message async for message in
+                stream_session(runner, session_service, "user", "lego", "session")]
+
+    types_seen = [message["type"] for message in messages]
+    assert types_seen == ["state", "text", "final"]
+    assert messages[0] == {"type": "state", "key": "google_results", "value": {"product_name": "lego"}}
+    assert messages[-1]["content"] == '{"gifts": []}'
+    assert await session_service.get_session(app_name="elfagent", user_id="user", session_id="session")
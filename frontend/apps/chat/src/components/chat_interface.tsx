@@ -28,6 +28,10 @@ export function ChatInterface() {
     scrollToBottom();
   }, [messages]);
 
+  // Product photos served by the API image proxy come as paths of the API
+  const resolveImageUrl = (url: string): string =>
+    url.startsWith('/') ? `${config.apiUrl}${url}` : url;
+
   const parseGiftsFromResponse = (json: any): Gift[] => {
     try {
       if('gifts' in json){
@@ -38,7 +42,7 @@ export function ChatInterface() {
           current_price: parseFloat(gift.current_price),
           original_price: gift.original_price ? parseFloat(gift.original_price) : undefined,
           rating: parseFloat(gift.rating || gift.product_star_rating || 0),
-          image_url: gift.image_url || gift.product_image || gift.product_photo || '',
+          image_url: resolveImageUrl(gift.image_url || gift.product_image || gift.product_photo || ''),
           order_url: gift.order_url || gift.product_url || '#',
           availability: true,
         }));
@@ -77,10 +81,8 @@ export function ChatInterface() {
       // Store session info for future requests
       setSessionId(data.session_id);
       setUserId(data.user_id)
-      // Parse gifts from the response
-      const json = JSON.parse(data.response);
-      console.log(json);
-      const gifts = parseGiftsFromResponse(JSON.parse(data.response));
+      // Gifts already extracted and validated by the backend, otherwise parse them from the response
+      const gifts = parseGiftsFromResponse(data.gifts ? { gifts: data.gifts } : JSON.parse(data.response));
       console.log(`FOUND ${gifts.length} gifts`)
       if(gifts.length == 0){
         return {
@@ -32,6 +32,7 @@ export interface ApiResponse {
   session_id: string;
   user_id: string;
   response: string;
+  gifts?: Partial<Gift>[] | null;
   status: string;
 }
 